@@ -21,4 +21,103 @@ class Settings(BaseSettings):
     # Fallback to local SQLite if not provided
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./dev.db")
 
+    # Streaming
+    # Frame format for workflow streams: "sse" (default) or "ndjson"
+    STREAM_FRAME_FORMAT: str = os.getenv("STREAM_FRAME_FORMAT", "sse")
+    # Status events: "full" (all routing steps), "minimal" (processing only) or "off"
+    STREAM_STATUS_EVENTS: str = os.getenv("STREAM_STATUS_EVENTS", "full")
+    # Coalesce model tokens into one frame per window / byte budget (0 disables)
+    STREAM_COALESCE_MS: int = int(os.getenv("STREAM_COALESCE_MS", "30"))
+    STREAM_MAX_FRAME_BYTES: int = int(os.getenv("STREAM_MAX_FRAME_BYTES", "1024"))
+
+    # LLM rate limiting (shared by all LLM call sites, 0 disables)
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "0"))
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+
+    # Persona router speculative execution (hybrid method only; per-router `intents.speculative` overrides)
+    PERSONA_ROUTER_SPECULATION: bool = os.getenv("PERSONA_ROUTER_SPECULATION", "false").lower() == "true"
+    # Minimum keyword confidence for a speculative candidate
+    PERSONA_ROUTER_SPECULATION_MIN_CONFIDENCE: float = float(os.getenv("PERSONA_ROUTER_SPECULATION_MIN_CONFIDENCE", "0.3"))
+
+    # Persona router vector similarity routing (hybrid and "vector" methods; per-router `intents.vectorRouting` overrides)
+    PERSONA_ROUTER_VECTOR: bool = os.getenv("PERSONA_ROUTER_VECTOR", "true").lower() == "true"
+    # Call the LLM router when (top - second) / top similarity is below this, or the top similarity is below the minimum
+    VECTOR_ROUTER_MIN_MARGIN: float = float(os.getenv("VECTOR_ROUTER_MIN_MARGIN", "0.25"))
+    VECTOR_ROUTER_MIN_SCORE: float = float(os.getenv("VECTOR_ROUTER_MIN_SCORE", "0.05"))
+    VECTOR_ROUTER_INDEX_TTL_SECONDS: int = int(os.getenv("VECTOR_ROUTER_INDEX_TTL_SECONDS", "600"))
+
+    # Routing latency budget: past the deadline a confident keyword/vector answer is used (0 disables)
+    ROUTING_DEADLINE_MS: int = int(os.getenv("ROUTING_DEADLINE_MS", "400"))
+    ROUTING_DEADLINE_MIN_CONFIDENCE: float = float(os.getenv("ROUTING_DEADLINE_MIN_CONFIDENCE", "0.5"))
+    ROUTING_DEADLINE_VECTOR_MIN_MARGIN: float = float(os.getenv("ROUTING_DEADLINE_VECTOR_MIN_MARGIN", "0.1"))
+    # Hard timeout for router LLM calls (previously unbounded)
+    ROUTING_LLM_TIMEOUT_SECONDS: float = float(os.getenv("ROUTING_LLM_TIMEOUT_SECONDS", "10"))
+
+    # Background routing-summary generation (concurrent LLM calls)
+    ROUTING_SUMMARY_CONCURRENCY: int = int(os.getenv("ROUTING_SUMMARY_CONCURRENCY", "2"))
+
+    # Routing / intent decision cache (stable keys, bounded entry count)
+    ROUTING_CACHE_MAX_ENTRIES: int = int(os.getenv("ROUTING_CACHE_MAX_ENTRIES", "5000"))
+    ROUTING_CACHE_TTL_SECONDS: int = int(os.getenv("ROUTING_CACHE_TTL_SECONDS", "600"))
+
+    # In-memory per-session routing state: continuation turns stay on the current agent
+    # (opt-in; routers can also enable it with intents.sessionRouting)
+    SESSION_ROUTING_STICKY: bool = os.getenv("SESSION_ROUTING_STICKY", "false").lower() == "true"
+    SESSION_ROUTING_TTL_SECONDS: int = int(os.getenv("SESSION_ROUTING_TTL_SECONDS", "1800"))
+    SESSION_ROUTING_MAX_SESSIONS: int = int(os.getenv("SESSION_ROUTING_MAX_SESSIONS", "10000"))
+
+    # Shared memory write-behind: chat turns queue their messages and handoffs, a background
+    # worker batch-inserts them in one transaction per flush (false writes inline)
+    SHARED_MEMORY_WRITE_BEHIND: bool = os.getenv("SHARED_MEMORY_WRITE_BEHIND", "true").lower() == "true"
+    SHARED_MEMORY_FLUSH_INTERVAL_MS: int = int(os.getenv("SHARED_MEMORY_FLUSH_INTERVAL_MS", "50"))
+    SHARED_MEMORY_BATCH_SIZE: int = int(os.getenv("SHARED_MEMORY_BATCH_SIZE", "200"))
+    SHARED_MEMORY_QUEUE_LIMIT: int = int(os.getenv("SHARED_MEMORY_QUEUE_LIMIT", "10000"))
+    # In-process session context (recent messages, handoffs, facts) for handoff context and summaries
+    SESSION_CONTEXT_CACHE_TTL_SECONDS: int = int(os.getenv("SESSION_CONTEXT_CACHE_TTL_SECONDS", "300"))
+    SESSION_CONTEXT_CACHE_MAX_SESSIONS: int = int(os.getenv("SESSION_CONTEXT_CACHE_MAX_SESSIONS", "5000"))
+
+    # Compiled routing rules of the active orchestrator config (also dropped on config edits)
+    ORCHESTRATOR_RULES_TTL_SECONDS: int = int(os.getenv("ORCHESTRATOR_RULES_TTL_SECONDS", "600"))
+
+    # Most recent conversation messages loaded for run_agent pipelines
+    RUN_AGENT_HISTORY_LIMIT: int = int(os.getenv("RUN_AGENT_HISTORY_LIMIT", "20"))
+
+    # Batch workflow execution
+    BATCH_DEFAULT_CONCURRENCY: int = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "4"))
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+    # How long batch checkpoints are kept for resuming
+    BATCH_CHECKPOINT_TTL_SECONDS: int = int(os.getenv("BATCH_CHECKPOINT_TTL_SECONDS", "86400"))
+
+    # Idempotency-Key deduplication of chat/workflow requests
+    IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+    IDEMPOTENCY_MAX_KEYS: int = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "1000"))
+
+    # In-memory cache bounds (LRU eviction) and background expiry sweep interval
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+    CACHE_MAX_BYTES: int = int(os.getenv("CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+    CACHE_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("CACHE_SWEEP_INTERVAL_SECONDS", "60"))
+    # Cache tier shared by worker processes on this host: "sqlite" (WAL mode) or "" to disable
+    CACHE_L2_BACKEND: str = os.getenv("CACHE_L2_BACKEND", "sqlite")
+    # Defaults to this deployment's own data directory; the directory must belong to the service user
+    # and not be writable by others (the tier is disabled otherwise)
+    CACHE_L2_PATH: str = os.getenv(
+        "CACHE_L2_PATH",
+        os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "cache.sqlite3")
+    )
+    CACHE_L2_MAX_ENTRIES: int = int(os.getenv("CACHE_L2_MAX_ENTRIES", "100000"))
+    # How long a process trusts its near-cache copy of a shared entry
+    CACHE_L1_TTL_SECONDS: int = int(os.getenv("CACHE_L1_TTL_SECONDS", "5"))
+    # Namespaces kept out of the shared tier, so secrets are not written to disk by default:
+    # Key Vault secrets, and saved LLM configs (api_key_secret_ref may hold a raw API key)
+    CACHE_L2_EXCLUDED_NAMESPACES: str = os.getenv("CACHE_L2_EXCLUDED_NAMESPACES", "keyvault,keyvault_sync,llm_config")
+    # get_or_set_async: serve stale values this long past the TTL while one refresh runs,
+    # start refreshes early with probability scaled by load time (XFetch beta, 0 disables),
+    # and remember failed loads briefly instead of retrying on every call
+    CACHE_STALE_TTL_SECONDS: int = int(os.getenv("CACHE_STALE_TTL_SECONDS", "300"))
+    CACHE_XFETCH_BETA: float = float(os.getenv("CACHE_XFETCH_BETA", "1.0"))
+    CACHE_NEGATIVE_TTL_SECONDS: int = int(os.getenv("CACHE_NEGATIVE_TTL_SECONDS", "30"))
+    # Saved LLM configs used by the persona router ("llm_config" cache namespace)
+    LLM_CONFIG_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CONFIG_CACHE_TTL_SECONDS", "300"))
+
 settings = Settings()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Enum, ForeignKey, Table, JSON, DateTime, Integer, Boolean
+from sqlalchemy import Column, String, Text, Enum, ForeignKey, Table, JSON, DateTime, Integer, Boolean, Index, Float
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 import enum
@@ -139,6 +139,12 @@ class Message(Base):
     agent_name = Column(String, nullable=True)  # Agent name for easier querying
     shared_session_id = Column(UUID(as_uuid=True), ForeignKey("shared_sessions.id"), nullable=True)
 
+    # Most-recent-N history reads walk these backwards (see scripts/add_message_history_indexes.py)
+    __table_args__ = (
+        Index("ix_messages_shared_session_id_created_at", "shared_session_id", "created_at"),
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+    )
+
 
 class SharedSession(Base):
     """Session-level memory management for multi-agent conversations"""
@@ -151,11 +157,11 @@ class SharedSession(Base):
     
     # Session-level context
     current_task = Column(Text, nullable=True)  # What the user is currently trying to achieve
-    session_facts = Column(JSON, default=list)  # Key facts accumulated during conversation
+    session_facts = Column(JSON, default=list)  # Legacy: facts now live in session_facts rows (SessionFact)
     global_context = Column(JSON, default=dict)  # Shared context available to all agents
     
     # Agent routing history
-    agent_routing_history = Column(JSON, default=list)  # History of agent selections
+    agent_routing_history = Column(JSON, default=list)  # Legacy: routing history is read from agent_handoffs
     current_agent_id = Column(UUID(as_uuid=True), nullable=True)  # Currently active agent
     
     # Memory configuration
@@ -179,6 +185,45 @@ class AgentHandoff(Base):
     preserved_context = Column(JSON, default=dict)  # Context passed to next agent
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        Index("ix_agent_handoffs_shared_session_id_created_at", "shared_session_id", "created_at"),
+    )
+
+
+class SessionFact(Base):
+    """Key fact accumulated during a session (append-only, unique per session)"""
+    __tablename__ = "session_facts"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    shared_session_id = Column(UUID(as_uuid=True), ForeignKey("shared_sessions.id"), nullable=False)
+    fact = Column(Text, nullable=False)
+    fact_hash = Column(String(32), nullable=False)  # Digest of the fact text, for the uniqueness check
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ux_session_facts_shared_session_id_fact_hash", "shared_session_id", "fact_hash", unique=True),
+        Index("ix_session_facts_shared_session_id_created_at", "shared_session_id", "created_at"),
+    )
+
+
+class RoutingDecision(Base):
+    """One persona router decision (append-only; also serves as the session's task history)"""
+    __tablename__ = "routing_decisions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    shared_session_id = Column(UUID(as_uuid=True), ForeignKey("shared_sessions.id"), nullable=False)
+    user_input = Column(Text)
+    selected_agent_id = Column(String)
+    selected_agent_name = Column(String)
+    confidence = Column(Float)
+    available_agents = Column(JSON, default=list)
+    routing_reason = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_routing_decisions_shared_session_id_created_at", "shared_session_id", "created_at"),
+    )
+
 
 class PersonaRouterMemory(Base):
     """Memory specifically for persona router decisions and learning"""
@@ -186,9 +231,9 @@ class PersonaRouterMemory(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     shared_session_id = Column(UUID(as_uuid=True), ForeignKey("shared_sessions.id"), nullable=False)
-    routing_decisions = Column(JSON, default=list)  # History of routing decisions with outcomes
+    routing_decisions = Column(JSON, default=list)  # Legacy: decisions now live in routing_decisions rows
     user_preferences = Column(JSON, default=dict)  # Learned user preferences for routing
-    task_history = Column(JSON, default=list)  # History of tasks and which agents handled them
+    task_history = Column(JSON, default=list)  # Legacy: derived from routing_decisions rows
     agent_performance_tracking = Column(JSON, default=dict)  # Track which agents work best for which tasks
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -312,6 +357,23 @@ class WorkflowExecution(Base):
     workflow = relationship("Workflow", back_populates="executions")
 
 
+class BatchItemResult(Base):
+    """Result of one completed item of a workflow batch (the batch's resume checkpoint)"""
+    __tablename__ = "batch_item_results"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    batch_id = Column(String, nullable=False)
+    item_index = Column(Integer, nullable=False)
+    total = Column(Integer, nullable=False)  # Batch size the item belongs to; a resume with other inputs starts over
+    result = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ux_batch_item_results_batch_id_item_index", "batch_id", "item_index", unique=True),
+        Index("ix_batch_item_results_created_at", "created_at"),
+    )
+
+
 class WorkflowTemplate(Base):
     __tablename__ = "workflow_templates"
     
@@ -4,7 +4,9 @@ from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from .db.database import engine
 from .db import models
-from .routers import agents, capabilities, chat, files, llm_configs, rag_indexes, orchestrator, workflows, agent_builder, tools, mcp_servers
+from .services.agent_profile_index import agent_profile_index
+from .services.shared_memory import shared_memory_service
+from .routers import agents, capabilities, chat, files, llm_configs, rag_indexes, orchestrator, workflows, agent_builder, tools, mcp_servers, metrics
 import os
 import logging
 
@@ -52,6 +54,7 @@ app.include_router(workflows.router)
 app.include_router(agent_builder.router)
 app.include_router(tools.router)
 app.include_router(mcp_servers.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 async def root():
@@ -61,4 +64,13 @@ async def root():
 @app.on_event("startup")
 def on_startup():
     # Create DB tables if they don't exist
-    models.Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    models.Base.metadata.create_all(bind=engine)
+    
+    # Load agent routing profiles and queue any missing routing summaries
+    agent_profile_index.warm()
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    # Queued shared memory writes must reach the database before the process exits
+    shared_memory_service.close()
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session, joinedload
 from ..db.database import get_db
 from ..db import models
-from ..services.prompt_processor import generate_agent_routing_summary
+from ..services.agent_profile_index import agent_profile_index
+from ..services.routing_cache import invalidate_routing_cache
+from ..services.cache_service import cache_service
 import uuid
 
 router = APIRouter(prefix="/agents", tags=["Agents"])
@@ -46,17 +48,6 @@ def create_agent(payload: dict, db: Session = Depends(get_db)):
         status=payload.get("status", "active")
     )
     
-    # Generate routing summary for persona router
-    system_prompt = payload.get("system_prompt", "")
-    if system_prompt and system_prompt.strip():
-        try:
-            routing_summary = generate_agent_routing_summary(system_prompt, payload["name"])
-            if routing_summary:
-                agent.routing_summary = routing_summary
-                print(f"✅ Generated routing summary for agent '{payload['name']}'")
-        except Exception as e:
-            print(f"⚠️ Failed to generate routing summary for agent '{payload['name']}': {e}")
-    
     db.add(agent)
     db.commit()
     db.refresh(agent)
@@ -85,6 +76,9 @@ def create_agent(payload: dict, db: Session = Depends(get_db)):
         joinedload(models.Agent.rag_indexes)
     ).filter(models.Agent.id == agent.id).first()
     
+    # Routing summary for the persona router is generated in the background
+    cache_service.bump_version("agent", agent.id)
+    agent_profile_index.refresh(agent, prompt_changed=bool((agent.system_prompt or "").strip()))
     return agent
 
 @router.put("/{agent_id}")
@@ -98,20 +92,13 @@ def update_agent(agent_id: str, payload: dict, db: Session = Depends(get_db)):
         agent.name = payload["name"]
     if "description" in payload:
         agent.description = payload["description"]
+    prompt_changed = False
     if "system_prompt" in payload:
-        agent.system_prompt = payload["system_prompt"]
-        
-        # Regenerate routing summary when system prompt changes
+        # Routing summary is regenerated in the background when the prompt changes
         system_prompt = payload["system_prompt"]
-        if system_prompt and system_prompt.strip():
-            try:
-                routing_summary = generate_agent_routing_summary(system_prompt, agent.name)
-                if routing_summary:
-                    agent.routing_summary = routing_summary
-                    print(f"✅ Updated routing summary for agent '{agent.name}'")
-            except Exception as e:
-                print(f"⚠️ Failed to update routing summary for agent '{agent.name}': {e}")
-        else:
+        prompt_changed = bool(system_prompt and system_prompt.strip()) and system_prompt != agent.system_prompt
+        agent.system_prompt = system_prompt
+        if not (system_prompt and system_prompt.strip()):
             # Clear routing summary if system prompt is removed
             agent.routing_summary = None
             
@@ -143,6 +130,9 @@ def update_agent(agent_id: str, payload: dict, db: Session = Depends(get_db)):
     
     db.commit()
     db.refresh(agent)
+    cache_service.bump_version("agent", agent_id)
+    agent_profile_index.refresh(agent, prompt_changed=prompt_changed)
+    invalidate_routing_cache(f"agent {agent_id} updated")
     return agent
 
 @router.delete("/{agent_id}")
@@ -153,6 +143,9 @@ def delete_agent(agent_id: str, db: Session = Depends(get_db)):
     
     db.delete(agent)
     db.commit()
+    agent_profile_index.remove(agent_id)
+    invalidate_routing_cache(f"agent {agent_id} deleted")
+    cache_service.bump_version("agent", agent_id)
     return {"message": "Agent deleted successfully"}
 
 @router.post("/{agent_id}/duplicate")
@@ -181,18 +174,9 @@ def duplicate_agent(agent_id: str, payload: dict, db: Session = Depends(get_db))
         llm_config_id=original.llm_config_id
     )
     
-    # Generate routing summary for duplicated agent
-    if original.system_prompt and original.system_prompt.strip():
-        try:
-            routing_summary = generate_agent_routing_summary(original.system_prompt, payload["name"])
-            if routing_summary:
-                duplicate.routing_summary = routing_summary
-                print(f"✅ Generated routing summary for duplicated agent '{payload['name']}'")
-        except Exception as e:
-            print(f"⚠️ Failed to generate routing summary for duplicated agent '{payload['name']}': {e}")
-    elif original.routing_summary:
-        # If original has routing summary but no system prompt, copy the routing summary
-        duplicate.routing_summary = original.routing_summary
+    # Start from the original's routing summary (same prompt); a summary for the
+    # new name is generated in the background
+    duplicate.routing_summary = original.routing_summary
     
     db.add(duplicate)
     db.commit()
@@ -217,4 +201,6 @@ def duplicate_agent(agent_id: str, payload: dict, db: Session = Depends(get_db))
         joinedload(models.Agent.rag_indexes)
     ).filter(models.Agent.id == duplicate.id).first()
     
+    cache_service.bump_version("agent", duplicate.id)
+    agent_profile_index.refresh(duplicate, prompt_changed=bool((duplicate.system_prompt or "").strip()))
     return duplicate
\ No newline at end of file
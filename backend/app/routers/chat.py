@@ -1,20 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from ..db.database import get_db
 from ..db import models
 from ..schemas.chat import ChatRequest, ChatResponse
-from ..services.orchestrator import run_agent, run_orchestrator_agent
+from ..services.orchestrator import run_agent, run_orchestrator_agent, run_orchestrator_agent_stream
 from ..services.tool_loader import create_tool_loader, get_tools_description_for_llm
 from ..services.shared_memory import shared_memory_service
+from ..services.stream_writer import StreamWriter
+from ..services.request_timer import RequestTimer
+from ..services.speculative_routing import start_speculation
+from ..services.idempotency import idempotency_registry, IdempotencyConflict
+from ..services.lookups import get_llm_config, get_file_info, detached_llm_config
+from ..services.workflow_batch import CompiledWorkflow, WorkflowCompileError, load_batch_inputs, run_batch, get_batch_checkpoint
+from ..config import settings
 import json
 import asyncio
 import uuid
+from typing import Optional
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+def _build_llm_config(llm_node: dict, db: Session) -> models.LLMConfig:
+    """LLM config for a workflow LLM node: a detached copy of its saved config, or one built from the node data"""
+    saved_config_id = llm_node.get("data", {}).get("savedConfigId")
+    if saved_config_id:
+        saved_llm_config = get_llm_config(db, saved_config_id)
+        if not saved_llm_config:
+            raise HTTPException(status_code=400, detail=f"Saved LLM config {saved_config_id} not found")
+        # Detached, so streaming code can read it after the request session closes
+        return detached_llm_config(saved_llm_config)
+    
+    return models.LLMConfig(
+        id=uuid.uuid4(),
+        provider=llm_node.get("data", {}).get("provider", "Azure OpenAI"),
+        model_name=llm_node.get("data", {}).get("model", "gpt-4"),
+        temperature=str(llm_node.get("data", {}).get("temperature", 0.7)),
+        max_tokens=str(llm_node.get("data", {}).get("maxTokens", 4000)),
+        api_base=llm_node.get("data", {}).get("apiBase", ""),
+        api_key_secret_ref=llm_node.get("data", {}).get("apiKeySecretRef", "")
+    )
+
+def _build_agent_for_node(agent_node: dict, nodes: list, connections: list, db: Session) -> models.Agent:
+    """Temporary agent (with a detached LLM config) for a workflow agent node"""
+    llm_node = next(
+        (n for c in connections if c.get("source") == agent_node.get("id")
+         for n in nodes if n.get("id") == c.get("target") and n.get("type") == "llm"),
+        None
+    )
+    if not llm_node:
+        raise HTTPException(status_code=400, detail="No LLM node connected to agent")
+    llm_config = _build_llm_config(llm_node, db)
+    
+    agent = models.Agent(
+        id=uuid.uuid4(),
+        name=agent_node.get('data', {}).get('name', 'Selected Agent'),
+        description=agent_node.get('data', {}).get('description', 'Agent selected by persona router'),
+        system_prompt=agent_node.get('data', {}).get('systemPrompt', 'You are a helpful AI assistant.'),
+        status=models.AgentStatus.active
+    )
+    agent.llm_config = llm_config
+    return agent
+
 @router.post("/workflow")
-async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session = Depends(get_db)):
+async def execute_workflow(
+    payload: dict,
+    auto_stream: bool = False,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Execute a workflow. Requests repeating an `Idempotency-Key` wait for (or
+    replay) the first request's result instead of executing again.
+    """
+    if not idempotency_key:
+        return await _execute_workflow(payload, auto_stream, db)
+
+    try:
+        execution, created = idempotency_registry.reserve(
+            "workflow", idempotency_key, {"payload": payload, "auto_stream": auto_stream}
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if created:
+        execution.run(_execute_workflow(payload, auto_stream, db))
+    return await execution.result()
+
+async def _execute_workflow(payload: dict, auto_stream: bool, db: Session):
     """
     Execute a workflow defined in the visual editor
     Payload should contain:
@@ -32,6 +105,7 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
         session_id = payload.get("session_id", str(uuid.uuid4()))
         conversation_history = payload.get("conversation_history", [])
         attached_files = payload.get("files", [])
+        timer = RequestTimer()
         
         if not nodes:
             raise HTTPException(status_code=400, detail="No nodes provided in workflow")
@@ -42,6 +116,7 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
         # Process attached files and make them universally available
         file_context = {}
         if attached_files:
+            timer.start("file_processing")
             print(f"\n📎 WORKFLOW: Processing {len(attached_files)} attached file(s)")
             from ..services.file_processor import file_processor
             
@@ -49,17 +124,10 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
             files_data = []
             for file_id in attached_files:
                 try:
-                    file_record = db.query(models.File).filter(models.File.id == file_id).first()
-                    if file_record:
-                        files_data.append({
-                            "id": str(file_record.id),
-                            "filename": file_record.filename,
-                            "url": file_record.url,
-                            "path": file_record.url,  # For compatibility
-                            "content_type": file_record.content_type,
-                            "size": file_record.size
-                        })
-                        print(f"📄 Found file: {file_record.filename}")
+                    file_info = get_file_info(db, file_id)
+                    if file_info:
+                        files_data.append(file_info)
+                        print(f"📄 Found file: {file_info['filename']}")
                     else:
                         print(f"❌ File not found in database: {file_id}")
                 except Exception as e:
@@ -69,6 +137,7 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
             if files_data:
                 file_context = file_processor.process_files_for_workflow(files_data)
                 print(f"✅ WORKFLOW: File processing complete - {file_context['file_count']} files ready")
+            timer.stop("file_processing")
         
         # Find the starting point - prioritize persona_router over regular agents
         agent_node = None
@@ -103,7 +172,7 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
         
         # Handle persona router orchestrator pattern
         if persona_router_node:
-            from ..services.persona_router import route_to_agent
+            from ..services.persona_router import route_to_agent_async
             
             try:
                 # Find all connected agents (connections FROM persona router TO agents)
@@ -132,7 +201,8 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
                 if llm_node_for_router:
                     router_config["_llm_node"] = llm_node_for_router  # Pass LLM node for intelligent routing
                 
-                routing_result = route_to_agent(user_input, router_config, connected_agents, nodes, connections, session_id)
+                with timer.stage("persona_routing"):
+                    routing_result = await route_to_agent_async(user_input, router_config, connected_agents, nodes, connections, session_id)
                 selected_agent = routing_result["agent"]
                 
                 print("\n" + "="*60)
@@ -215,30 +285,11 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
                 status=models.AgentStatus.active
             )
         
-        # Create LLM config - check for saved config first
-        saved_config_id = llm_node.get("data", {}).get("savedConfigId")
-        if saved_config_id:
-            # Use saved LLM config from database
-            temp_llm_config = db.query(models.LLMConfig).filter(models.LLMConfig.id == saved_config_id).first()
-            if not temp_llm_config:
-                raise HTTPException(status_code=400, detail=f"Saved LLM config {saved_config_id} not found")
-        else:
-            # Create a temporary LLM config from the workflow node data
-            temp_llm_config = models.LLMConfig(
-                id=uuid.uuid4(),
-                provider=llm_node.get("data", {}).get("provider", "Azure OpenAI"),
-                model_name=llm_node.get("data", {}).get("model", "gpt-4"),
-                temperature=str(llm_node.get("data", {}).get("temperature", 0.7)),
-                max_tokens=str(llm_node.get("data", {}).get("maxTokens", 4000)),
-                api_base=llm_node.get("data", {}).get("apiBase", ""),
-                api_key_secret_ref=llm_node.get("data", {}).get("apiKeySecretRef", "")
-            )
-        
-        # Link the agent to the LLM config
-        temp_agent.llm_config = temp_llm_config
+        # Link the agent to its LLM config (saved config first)
+        temp_agent.llm_config = _build_llm_config(llm_node, db)
         
         # Always provide conversation context to the agent (built-in feature)
-        prev_output = {"attachments": [], "response": ""}
+        prev_output = {"attachments": [], "response": "", "request_timer": timer}
         
         # Add file context to make attachments universally available to all agents/sub-agents/tools
         if file_context.get("files_available"):
@@ -294,8 +345,9 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
         print(f"=== END WORKFLOW DEBUG ===")
         
         # Load tools for the workflow
-        tool_loader = create_tool_loader(db)
-        workflow_tools = await tool_loader.get_tools_for_workflow(nodes)
+        with timer.stage("tool_loading"):
+            tool_loader = create_tool_loader(db)
+            workflow_tools = await tool_loader.get_tools_for_workflow(nodes)
         
         # Add tool information to prev_output for agent execution
         if workflow_tools:
@@ -373,8 +425,8 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
             "session_id": session_id,
             "workflow_execution": {
                 "agent_name": temp_agent.name,
-                "llm_model": temp_llm_config.model_name,
-                "provider": temp_llm_config.provider,
+                "llm_model": temp_agent.llm_config.model_name,
+                "provider": temp_agent.llm_config.provider,
                 "memory_used": memory_node is not None
             }
         }
@@ -387,13 +439,54 @@ async def execute_workflow(payload: dict, auto_stream: bool = False, db: Session
             response_with_agent_info["workflow_execution"]["routing_method"] = agent_node.get("data", {}).get("routingResult", {}).get("method", "unknown")
             response_with_agent_info["workflow_execution"]["routing_confidence"] = agent_node.get("data", {}).get("routingResult", {}).get("confidence", 0)
         
+        response_with_agent_info["workflow_execution"]["timings"] = timer.finish()
+        
         return response_with_agent_info
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Workflow execution failed: {str(e)}")
 
 @router.post("/workflow/stream")
-async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
+async def execute_workflow_stream(
+    payload: dict,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Execute a workflow with streaming response. Requests repeating an
+    `Idempotency-Key` attach to the first request's stream (replayed from the
+    start) instead of executing the workflow again.
+    """
+    if not idempotency_key:
+        return await _execute_workflow_stream(payload, db)
+
+    try:
+        writer = StreamWriter.from_options(payload.get("stream_options"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        execution, created = idempotency_registry.reserve("workflow_stream", idempotency_key, payload)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if created:
+        try:
+            response = await _execute_workflow_stream(payload, db)
+        except HTTPException as e:
+            # Duplicates that attached meanwhile get the error; the key is released for retries
+            execution.fail(writer.frame({'error': e.detail}))
+            raise
+        # The execution outlives this client: a disconnect does not cancel it
+        execution.start(response.body_iterator)
+
+    return StreamingResponse(
+        execution.subscribe(),
+        media_type=writer.media_type,
+        headers={**writer.headers, "Idempotent-Replayed": "false" if created else "true"}
+    )
+
+async def _execute_workflow_stream(payload: dict, db: Session):
     """
     Execute a workflow with streaming response
     """
@@ -404,6 +497,13 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
         session_id = payload.get("session_id", str(uuid.uuid4()))
         conversation_history = payload.get("conversation_history", [])
         attached_files = payload.get("files", [])
+        timer = RequestTimer()
+        
+        # Frame format, status events and token coalescing (defaults from settings)
+        try:
+            writer = StreamWriter.from_options(payload.get("stream_options"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         print(f"🔑 CHAT ROUTER STREAM: Received session_id: {session_id}")
         print(f"📚 CHAT ROUTER STREAM: Received conversation_history: {len(conversation_history)} messages")
@@ -413,28 +513,23 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
         # Process attached files (same logic as non-streaming)
         file_context = {}
         if attached_files:
+            timer.start("file_processing")
             print(f"\n📎 WORKFLOW STREAM: Processing {len(attached_files)} attached file(s)")
             from ..services.file_processor import file_processor
             
             files_data = []
             for file_id in attached_files:
                 try:
-                    file_record = db.query(models.File).filter(models.File.id == file_id).first()
-                    if file_record:
-                        files_data.append({
-                            "id": str(file_record.id),
-                            "filename": file_record.filename,
-                            "url": file_record.url,
-                            "path": file_record.url,
-                            "content_type": file_record.content_type,
-                            "size": file_record.size
-                        })
+                    file_info = get_file_info(db, file_id)
+                    if file_info:
+                        files_data.append(file_info)
                 except Exception as e:
                     print(f"❌ Error retrieving file {file_id}: {e}")
             
             if files_data:
                 file_context = file_processor.process_files_for_workflow(files_data)
                 print(f"✅ WORKFLOW STREAM: File processing complete - {file_context['file_count']} files ready")
+            timer.stop("file_processing")
         
         if not nodes:
             raise HTTPException(status_code=400, detail="No nodes provided in workflow")
@@ -475,10 +570,11 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
         
         # Store routing info for status updates
         routing_info = None
+        speculation = None
         
         # Handle persona router orchestrator pattern
         if persona_router_node:
-            from ..services.persona_router import route_to_agent
+            from ..services.persona_router import route_to_agent_async
             
             try:
                 # Find all connected agents (connections FROM persona router TO agents)
@@ -514,7 +610,15 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
                 if llm_node_for_router:
                     router_config["_llm_node"] = llm_node_for_router  # Pass LLM node for intelligent routing
                 
-                routing_result = route_to_agent(user_input, router_config, connected_agents, nodes, connections, session_id)
+                # Speculative mode: the router decides in the background while the
+                # keyword candidate is prepared (and started at the top of the stream)
+                speculation = start_speculation(user_input, router_config, connected_agents, nodes, connections, session_id)
+                if speculation:
+                    timer.start("persona_routing")
+                    routing_result = speculation.provisional_result
+                else:
+                    with timer.stage("persona_routing"):
+                        routing_result = await route_to_agent_async(user_input, router_config, connected_agents, nodes, connections, session_id)
                 selected_agent = routing_result["agent"]
                 
                 # Create a temporary agent using the selected agent's configuration
@@ -584,143 +688,159 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
                 status=models.AgentStatus.active
             )
         
-        # Create LLM config - check for saved config first (STREAMING VERSION)
-        saved_config_id = llm_node.get("data", {}).get("savedConfigId")
-        if saved_config_id:
-            # Use saved LLM config from database
-            db_llm_config = db.query(models.LLMConfig).filter(models.LLMConfig.id == saved_config_id).first()
-            if not db_llm_config:
-                raise HTTPException(status_code=400, detail=f"Saved LLM config {saved_config_id} not found")
-            
-            # Create a detached copy to avoid session issues in streaming
-            temp_llm_config = models.LLMConfig(
-                id=db_llm_config.id,
-                provider=db_llm_config.provider,
-                model_name=db_llm_config.model_name,
-                temperature=db_llm_config.temperature,
-                max_tokens=db_llm_config.max_tokens,
-                api_base=db_llm_config.api_base,
-                api_key_secret_ref=db_llm_config.api_key_secret_ref
-            )
-            print(f"🔧 STREAMING: Created detached LLM config copy: {temp_llm_config.model_name}")
-        else:
-            # Create a temporary LLM config from the workflow node data
-            temp_llm_config = models.LLMConfig(
-                id=uuid.uuid4(),
-                provider=llm_node.get("data", {}).get("provider", "Azure OpenAI"),
-                model_name=llm_node.get("data", {}).get("model", "gpt-4"),
-                temperature=str(llm_node.get("data", {}).get("temperature", 0.7)),
-                max_tokens=str(llm_node.get("data", {}).get("maxTokens", 4000)),
-                api_base=llm_node.get("data", {}).get("apiBase", ""),
-                api_key_secret_ref=llm_node.get("data", {}).get("apiKeySecretRef", "")
-            )
+        # Link the agent to its LLM config (saved config first, detached for streaming)
+        temp_agent.llm_config = _build_llm_config(llm_node, db)
         
-        # Link the agent to the LLM config
-        temp_agent.llm_config = temp_llm_config
-        
-        # Always provide conversation context (agent-level memory)
-        prev_output = {"attachments": [], "response": ""}
+        # Load tools for the workflow (streaming)
+        with timer.stage("tool_loading"):
+            tool_loader = create_tool_loader(db)
+            workflow_tools = await tool_loader.get_tools_for_workflow(nodes)
         
-        # Add file context to make attachments universally available (streaming)
-        if file_context.get("files_available"):
-            prev_output["file_context"] = file_context["file_context"]
-            prev_output["attached_files"] = file_context["file_summaries"]
-            prev_output["structured_file_data"] = file_context["structured_data"]
-            print(f"📎 WORKFLOW STREAM: File context added to agent execution")
+        if workflow_tools:
+            tools_description = get_tools_description_for_llm(workflow_tools)
+            print(f"\n🔧 TOOL LOADING (STREAMING)")
+            print(f"   • Available tools: {list(workflow_tools.keys())}")
+        else:
+            print(f"\n🔧 TOOL LOADING (STREAMING)")
+            print(f"   • No tools configured for this workflow")
         
-        # Use conversation history with priority to payload over shared session memory
-        if session_id and conversation_history:
-            # Frontend provides authoritative conversation history - use it first
-            max_conversations = agent_node.get("data", {}).get("maxConversations", 50)
-            include_system = agent_node.get("data", {}).get("includeSystemMessages", True)
+        async def build_prev_output(agent_data: dict) -> dict:
+            """Execution context for one agent; memory limits come from the agent node that runs"""
+            # Always provide conversation context (agent-level memory)
+            prev_output = {"attachments": [], "response": "", "request_timer": timer}
             
-            limited_history = conversation_history[-max_conversations:] if conversation_history else []
+            # Add file context to make attachments universally available (streaming)
+            if file_context.get("files_available"):
+                prev_output["file_context"] = file_context["file_context"]
+                prev_output["attached_files"] = file_context["file_summaries"]
+                prev_output["structured_file_data"] = file_context["structured_data"]
+                print(f"📎 WORKFLOW STREAM: File context added to agent execution")
             
-            if limited_history:
-                prev_output["conversation_history"] = limited_history
-                prev_output["include_system_messages"] = include_system
-                prev_output["memory_strategy"] = "payload_priority"
-                print(f"📚 Using payload conversation history (frontend priority): {len(limited_history)} messages")
-            else:
-                print(f"📝 No payload conversation history provided")
-        elif session_id:
-            # Fallback to shared session memory only if no payload conversation history
-            max_conversations = agent_node.get("data", {}).get("maxConversations", 50)
-            include_system = agent_node.get("data", {}).get("includeSystemMessages", True)
-            
-            # Get shared context from session
-            shared_context = shared_memory_service.get_context_for_agent_handoff(db, session_id)
-            shared_conversation_history = shared_context["conversation_history"]
-            
-            # Apply agent's memory limits to shared history
-            limited_shared_history = shared_conversation_history[-max_conversations:] if shared_conversation_history else []
-            
-            if limited_shared_history:
-                prev_output["conversation_history"] = limited_shared_history
-                prev_output["include_system_messages"] = include_system
-                prev_output["memory_strategy"] = "shared_session"
-                prev_output["session_context"] = {
-                    "current_task": shared_context["current_task"],
-                    "session_facts": shared_context["session_facts"],
-                    "global_context": shared_context["global_context"]
-                }
-                print(f"📚 Using shared session memory: {len(limited_shared_history)} messages from session")
-            elif conversation_history:
-                # Fallback to payload conversation history if shared session is empty
-                max_conversations = agent_node.get("data", {}).get("maxConversations", 10)
+            # Use conversation history with priority to payload over shared session memory
+            if session_id and conversation_history:
+                # Frontend provides authoritative conversation history - use it first
+                max_conversations = agent_data.get("maxConversations", 50)
+                include_system = agent_data.get("includeSystemMessages", True)
+                
                 limited_history = conversation_history[-max_conversations:] if conversation_history else []
                 
                 if limited_history:
                     prev_output["conversation_history"] = limited_history
                     prev_output["include_system_messages"] = include_system
-                    prev_output["memory_strategy"] = "payload_fallback"
-                    print(f"📚 Using payload conversation history as fallback: {len(limited_history)} messages")
+                    prev_output["memory_strategy"] = "payload_priority"
+                    print(f"📚 Using payload conversation history (frontend priority): {len(limited_history)} messages")
                 else:
-                    print(f"📝 No conversation history available (shared session empty and no payload history)")
-            else:
-                print(f"📝 No shared session history found for session: {session_id}")
-        elif conversation_history:
-            # Fallback to traditional conversation history if no session_id
-            max_conversations = agent_node.get("data", {}).get("maxConversations", 10)
-            include_system = agent_node.get("data", {}).get("includeSystemMessages", True)
-            
-            limited_history = conversation_history[-max_conversations:] if conversation_history else []
+                    print(f"📝 No payload conversation history provided")
+            elif session_id:
+                # Fallback to shared session memory only if no payload conversation history
+                max_conversations = agent_data.get("maxConversations", 50)
+                include_system = agent_data.get("includeSystemMessages", True)
+                
+                # Get shared context from session (may wait for the previous turn's queued writes)
+                with timer.stage("shared_memory"):
+                    shared_context = await asyncio.to_thread(shared_memory_service.get_context_for_agent_handoff, db, session_id)
+                shared_conversation_history = shared_context["conversation_history"]
+                
+                # Apply agent's memory limits to shared history
+                limited_shared_history = shared_conversation_history[-max_conversations:] if shared_conversation_history else []
+                
+                if limited_shared_history:
+                    prev_output["conversation_history"] = limited_shared_history
+                    prev_output["include_system_messages"] = include_system
+                    prev_output["memory_strategy"] = "shared_session"
+                    prev_output["session_context"] = {
+                        "current_task": shared_context["current_task"],
+                        "session_facts": shared_context["session_facts"],
+                        "global_context": shared_context["global_context"]
+                    }
+                    print(f"📚 Using shared session memory: {len(limited_shared_history)} messages from session")
+                elif conversation_history:
+                    # Fallback to payload conversation history if shared session is empty
+                    max_conversations = agent_data.get("maxConversations", 10)
+                    limited_history = conversation_history[-max_conversations:] if conversation_history else []
+                
+                    if limited_history:
+                        prev_output["conversation_history"] = limited_history
+                        prev_output["include_system_messages"] = include_system
+                        prev_output["memory_strategy"] = "payload_fallback"
+                        print(f"📚 Using payload conversation history as fallback: {len(limited_history)} messages")
+                    else:
+                        print(f"📝 No conversation history available (shared session empty and no payload history)")
+                else:
+                    print(f"📝 No shared session history found for session: {session_id}")
+            elif conversation_history:
+                # Fallback to traditional conversation history if no session_id
+                max_conversations = agent_data.get("maxConversations", 10)
+                include_system = agent_data.get("includeSystemMessages", True)
+                
+                limited_history = conversation_history[-max_conversations:] if conversation_history else []
+                
+                if limited_history:
+                    prev_output["conversation_history"] = limited_history
+                    prev_output["include_system_messages"] = include_system
+                    prev_output["memory_strategy"] = "sliding_window"
+                    print(f"📚 Using traditional conversation history: {len(limited_history)} messages")
             
-            if limited_history:
-                prev_output["conversation_history"] = limited_history
-                prev_output["include_system_messages"] = include_system
-                prev_output["memory_strategy"] = "sliding_window"
-                print(f"📚 Using traditional conversation history: {len(limited_history)} messages")
+            # Add tool information to prev_output for agent execution
+            if workflow_tools:
+                prev_output["available_tools"] = workflow_tools
+                prev_output["tools_description"] = tools_description
+            return prev_output
         
-        # Load tools for the workflow (streaming)
-        tool_loader = create_tool_loader(db)
-        workflow_tools = await tool_loader.get_tools_for_workflow(nodes)
+        # Router workflows run the routed agent, so its node holds the memory settings
+        prev_output = await build_prev_output((routing_result["agent"] if persona_router_node else agent_node).get("data", {}))
         
-        # Add tool information to prev_output for agent execution
-        if workflow_tools:
-            tools_description = get_tools_description_for_llm(workflow_tools)
-            prev_output["available_tools"] = workflow_tools
-            prev_output["tools_description"] = tools_description
-            print(f"\n🔧 TOOL LOADING (STREAMING)")
-            print(f"   • Available tools: {list(workflow_tools.keys())}")
-        else:
-            print(f"\n🔧 TOOL LOADING (STREAMING)")
-            print(f"   • No tools configured for this workflow")
+        from ..services.orchestrator import execute_single_agent_stream
         
         async def generate_stream():
+            nonlocal temp_agent, prev_output
             full_response = ""  # Collect full response for shared memory saving
             selected_agent_id = None
             selected_agent_name = None
+            agent_stream = None
+            # The turn's user message, handoff and response, written in one transaction
+            turn_writes = []
+            
+            async def save_turn():
+                if not turn_writes:
+                    return
+                writes = list(turn_writes)
+                turn_writes.clear()
+                with timer.stage("shared_memory"):
+                    await shared_memory_service.queue_writes_async(*writes)
             
             try:
-                # Send initial status update
+                if speculation:
+                    # Start the keyword candidate now; it is committed or cancelled once the router decides
+                    speculation.launch(lambda: execute_single_agent_stream(
+                        agent=temp_agent,
+                        message=user_input,
+                        files=attached_files,
+                        prev_output=prev_output
+                    ))
+                
+                # Send initial status updates (no artificial delays - frames go out as soon as they are ready)
                 if routing_info:
-                    yield f"data: {json.dumps({'status': f'Persona router analyzing request...', 'type': 'status'})}\n\n"
-                    await asyncio.sleep(0.1)  # Small delay for better UX
+                    frame = writer.status('Persona router analyzing request...')
+                    if frame:
+                        yield frame
                     
                     available_agents_text = ', '.join(routing_info['available_agents'])
-                    yield f"data: {json.dumps({'status': f'Considering best agent from: {available_agents_text}', 'type': 'status'})}\n\n"
-                    await asyncio.sleep(0.1)
+                    frame = writer.status(f'Considering best agent from: {available_agents_text}')
+                    if frame:
+                        yield frame
+                
+                if speculation:
+                    routing_result = await speculation.resolve()
+                    timer.stop("persona_routing")
+                    if routing_result['speculation'] == 'hit':
+                        agent_stream = speculation.stream.commit()
+                    else:
+                        # Drop the cancelled candidate's stage timings; the routed agent records its own
+                        timer.clear("prompt_building", "llm", "llm_ttft")
+                        temp_agent = _build_agent_for_node(routing_result['agent'], nodes, connections, db)
+                        # The candidate's context was built for (and used by) the cancelled stream
+                        prev_output = await build_prev_output(routing_result['agent'].get('data', {}))
                 
                 # Record agent handoff if using persona router
                 if persona_router_node and session_id:
@@ -728,28 +848,27 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
                     selected_agent_name = temp_agent.name
                     
                     # Send agent selection status
-                    yield f"data: {json.dumps({'status': f'Selected {selected_agent_name} for this task', 'type': 'status'})}\n\n"
-                    await asyncio.sleep(0.1)
-                    
-                    # Save user message to shared memory first
-                    shared_memory_service.add_message_to_shared_context(
-                        db=db,
-                        session_id=session_id,
-                        role="user",
-                        content=user_input,
-                        agent_id=selected_agent_id,
-                        agent_name=selected_agent_name
-                    )
+                    frame = writer.status(f'Selected {selected_agent_name} for this task')
+                    if frame:
+                        yield frame
                     
-                    # Record agent handoff in shared memory
-                    shared_memory_service.record_agent_handoff(
-                        db=db,
-                        session_id=session_id,
-                        to_agent_id=selected_agent_id,
-                        to_agent_name=selected_agent_name,
-                        handoff_reason=f"Persona router selected for input: '{user_input[:50]}{'...' if len(user_input) > 50 else ''}'",
-                        context_summary=f"User requesting: {user_input[:100]}{'...' if len(user_input) > 100 else ''}"
-                    )
+                    # User message and agent handoff, saved with the response once the stream ends
+                    turn_writes.extend([
+                        shared_memory_service.message_write(
+                            session_id=session_id,
+                            role="user",
+                            content=user_input,
+                            agent_id=selected_agent_id,
+                            agent_name=selected_agent_name
+                        ),
+                        shared_memory_service.handoff_write(
+                            session_id=session_id,
+                            to_agent_id=selected_agent_id,
+                            to_agent_name=selected_agent_name,
+                            handoff_reason=f"Persona router selected for input: '{user_input[:50]}{'...' if len(user_input) > 50 else ''}'",
+                            context_summary=f"User requesting: {user_input[:100]}{'...' if len(user_input) > 100 else ''}"
+                        )
+                    ])
                 
                 # Send agent information at the start of the stream if persona router was used
                 if persona_router_node:
@@ -758,58 +877,145 @@ async def execute_workflow_stream(payload: dict, db: Session = Depends(get_db)):
                         'router_used': True,
                         'agent_header': True  # Signal to frontend to show agent header, no content prefix
                     }
-                    yield f"data: {json.dumps(agent_info)}\n\n"
+                    if speculation:
+                        agent_info['speculation'] = routing_result['speculation']
+                    yield writer.frame(agent_info)
                 
                 # Send agent working status
                 agent_display_name = temp_agent.name if persona_router_node else primary_node.get('data', {}).get('name', 'Agent')
-                yield f"data: {json.dumps({'status': f'{agent_display_name} is processing your request...', 'type': 'status'})}\n\n"
-                await asyncio.sleep(0.1)
+                frame = writer.status(f'{agent_display_name} is processing your request...', essential=True)
+                if frame:
+                    yield frame
                 
                 # Execute the agent using existing streaming infrastructure
-                from ..services.orchestrator import execute_single_agent_stream
+                if agent_stream is None:
+                    agent_stream = execute_single_agent_stream(
+                        agent=temp_agent,
+                        message=user_input,
+                        files=attached_files,
+                        prev_output=prev_output
+                    )
                 
-                async for chunk in execute_single_agent_stream(
-                    agent=temp_agent,
-                    message=user_input,
-                    files=attached_files,
-                    prev_output=prev_output
-                ):
-                    full_response += chunk  # Accumulate response
-                    yield f"data: {json.dumps({'content': chunk})}\n\n"
+                async def collect_response():
+                    nonlocal full_response
+                    async for chunk in agent_stream:
+                        full_response += chunk  # Accumulate response
+                        yield chunk
                 
-                # Save assistant response to shared memory
+                # Coalesce tokens into frames by time window / byte size
+                async for frame in writer.coalesce(collect_response()):
+                    yield frame
+                
+                # Save the turn (with the assistant response) to shared memory before the client
+                # sees the end of the stream, so its next turn reads it
                 if session_id and full_response:
-                    shared_memory_service.add_message_to_shared_context(
-                        db=db,
+                    turn_writes.append(shared_memory_service.message_write(
                         session_id=session_id,
                         role="assistant",
                         content=full_response,
                         agent_id=selected_agent_id,
                         agent_name=selected_agent_name
-                    )
+                    ))
+                await save_turn()
                 
                 # Send completion signal with agent info
                 completion_data = {'done': True}
                 if persona_router_node:
                     completion_data['agent_name'] = temp_agent.name
-                yield f"data: {json.dumps(completion_data)}\n\n"
+                yield writer.frame(completion_data)
                 
             except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield writer.frame({'error': str(e)})
+            finally:
+                if speculation:
+                    await speculation.abort()
+                # Failed or disconnected turns still keep what was recorded before
+                await save_turn()
+            
+            # Per-stage timing breakdown is always the last event of the stream
+            yield writer.frame({'type': 'timings', 'timings': timer.finish()})
         
         return StreamingResponse(
             generate_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream",
-            }
+            media_type=writer.media_type,
+            headers=writer.headers
         )
         
+    except HTTPException:
+        # Request errors (e.g. invalid stream_options) keep their status
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Workflow streaming execution failed: {str(e)}")
 
+@router.post("/workflow/batch")
+async def execute_workflow_batch(payload: dict, db: Session = Depends(get_db)):
+    """
+    Execute one workflow over many inputs, streaming NDJSON results
+    Payload should contain:
+    - nodes, connections: the workflow definition (compiled once for the batch)
+    - inputs: list of input messages, or
+    - file_id + optional input_column: an uploaded CSV whose column supplies the inputs
+    - concurrency: optional number of items run in parallel (capped by BATCH_MAX_CONCURRENCY)
+    - batch_id: optional; reuse a previous batch_id to resume from its checkpoint
+    """
+    nodes = payload.get("nodes", [])
+    connections = payload.get("connections", [])
+    inputs = payload.get("inputs")
+    batch_id = payload.get("batch_id") or str(uuid.uuid4())
+
+    if not nodes:
+        raise HTTPException(status_code=400, detail="No nodes provided in workflow")
+
+    try:
+        concurrency = int(payload.get("concurrency") or settings.BATCH_DEFAULT_CONCURRENCY)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="'concurrency' must be an integer")
+    concurrency = max(1, min(concurrency, settings.BATCH_MAX_CONCURRENCY))
+
+    try:
+        if inputs is None and payload.get("file_id"):
+            inputs = await load_batch_inputs(db, payload["file_id"], payload.get("input_column"))
+        if not inputs or not isinstance(inputs, list):
+            raise HTTPException(status_code=400, detail="Provide a non-empty 'inputs' list or a CSV 'file_id'")
+        if len(inputs) > settings.BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"Batch has {len(inputs)} inputs, the limit is {settings.BATCH_MAX_ITEMS}")
+        inputs = [str(item) for item in inputs]
+
+        compiled = await CompiledWorkflow(nodes, connections).compile(db)
+    except WorkflowCompileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    writer = StreamWriter(frame_format="ndjson")
+
+    print(f"📦 BATCH {batch_id}: {len(inputs)} inputs, concurrency {concurrency}")
+
+    async def generate_results():
+        try:
+            async for event in run_batch(compiled, inputs, batch_id, concurrency):
+                yield writer.frame(event)
+        except Exception as e:
+            yield writer.frame({'type': 'error', 'batch_id': batch_id, 'error': str(e)})
+
+    return StreamingResponse(
+        generate_results(),
+        media_type=writer.media_type,
+        headers=writer.headers
+    )
+
+@router.get("/workflow/batch/{batch_id}")
+def get_workflow_batch_checkpoint(batch_id: str):
+    """Progress of a batch from its checkpoint (completed items survive for BATCH_CHECKPOINT_TTL_SECONDS)"""
+    checkpoint = get_batch_checkpoint(batch_id)
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="Batch checkpoint not found")
+    results = checkpoint["results"]
+    return {
+        "batch_id": batch_id,
+        "total": checkpoint["total"],
+        "completed": len(results),
+        "failed": sum(1 for item in results.values() if item.get("status") != "ok")
+    }
+
 @router.post("", response_model=ChatResponse)
 def chat_endpoint(payload: ChatRequest, db: Session = Depends(get_db)):
     if not payload.agent_id or payload.agent_id == "orchestrator":
@@ -837,36 +1043,28 @@ def chat_endpoint(payload: ChatRequest, db: Session = Depends(get_db)):
 async def chat_stream_endpoint(payload: ChatRequest, db: Session = Depends(get_db)):
     if not payload.agent_id or payload.agent_id == "orchestrator":
         # Use orchestrator agent for streaming
+        writer = StreamWriter()
+        
         async def generate_stream():
             try:
-                # For now, use the non-streaming orchestrator and stream the response
-                # In the future, we can implement true streaming for the orchestrator
-                result = run_orchestrator_agent(message=payload.message or "", files=payload.files or [], session_id=payload.session_id)
-                
-                if "error" in result:
-                    yield f"data: {json.dumps({'error': result['error']})}\n\n"
-                    return
-                
-                # Stream the response character by character for now
-                response = result.get("response", "")
-                for char in response:
-                    yield f"data: {json.dumps({'content': char})}\n\n"
-                    await asyncio.sleep(0.01)  # Small delay for streaming effect
+                # Stream the selected agent's real model tokens as they arrive
+                async for frame in writer.coalesce(run_orchestrator_agent_stream(
+                    message=payload.message or "",
+                    files=payload.files or [],
+                    session_id=payload.session_id
+                )):
+                    yield frame
                 
                 # Send completion signal
-                yield f"data: {json.dumps({'done': True})}\n\n"
+                yield writer.frame({'done': True})
                 
             except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                yield writer.frame({'error': str(e)})
         
         return StreamingResponse(
             generate_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Content-Type": "text/event-stream",
-            }
+            media_type=writer.media_type,
+            headers=writer.headers
         )
     else:
         # Use specific agent if specified (for admin/testing purposes)
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..db.database import get_db
 from ..db import models
+from ..services.cache_service import cache_service
 
 router = APIRouter(prefix="/llm-configs", tags=["LLM Configs"])
 
@@ -57,6 +58,7 @@ def update_llm_config(config_id: str, payload: dict, db: Session = Depends(get_d
     
     db.commit()
     db.refresh(config)
+    cache_service.bump_version("llm_config", config_id)
     return config
 
 @router.delete("/{config_id}")
@@ -67,6 +69,7 @@ def delete_llm_config(config_id: str, db: Session = Depends(get_db)):
     
     db.delete(config)
     db.commit()
+    cache_service.bump_version("llm_config", config_id)
     return {"message": "LLM config deleted successfully"}
 
 @router.post("/{llm_config_id}/duplicate")
@@ -13,6 +13,7 @@ import logging
 from ..db.database import get_db
 from ..db import models
 from ..services.mcp_manager import create_mcp_manager
+from ..services.cache_service import cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -200,6 +201,7 @@ async def update_mcp_server(
         server.updated_at = models.datetime.utcnow()
         db.commit()
         db.refresh(server)
+        cache_service.bump_version("mcp_server", server_id)
         
         logger.info(f"Updated MCP server: {server.name} ({server.id})")
         return MCPServerResponse.from_db_model(server)
@@ -225,6 +227,7 @@ async def delete_mcp_server(server_id: UUID, db: Session = Depends(get_db)):
         
         db.delete(server)
         db.commit()
+        cache_service.bump_version("mcp_server", server_id)
         
         logger.info(f"Deleted MCP server: {server.name} ({server.id})")
         return {"message": "MCP server deleted successfully"}
@@ -0,0 +1,68 @@
+from fastapi import APIRouter
+from ..services.request_timer import stage_histograms
+from ..services.llm_limiter import llm_rate_limiter
+from ..services.speculative_routing import speculation_stats
+from ..services.idempotency import idempotency_registry
+from ..services.routing_cache import routing_cache
+from ..services.persona_router import routing_deadline_stats
+from ..services.agent_profile_index import agent_profile_index
+from ..services.session_routing_state import session_routing_state
+from ..services.cache_service import cache_service
+from ..services.shared_memory import shared_memory_service
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+@router.get("/timings")
+def get_stage_timings():
+    """Rolling per-stage latency histograms for recent chat/workflow requests"""
+    return {"stages": stage_histograms.snapshot()}
+
+@router.delete("/timings")
+def reset_stage_timings():
+    stage_histograms.reset()
+    return {"message": "Stage timings reset"}
+
+@router.get("/llm")
+def get_llm_limiter_stats():
+    """Shared LLM rate limiter configuration and usage"""
+    return llm_rate_limiter.get_stats()
+
+@router.get("/speculation")
+def get_speculation_stats():
+    """Persona router speculative execution hit rate and wasted tokens"""
+    return speculation_stats.get_stats()
+
+@router.get("/idempotency")
+def get_idempotency_stats():
+    """Idempotency-Key executions, attached/replayed duplicates and conflicts"""
+    return idempotency_registry.get_stats()
+
+@router.get("/routing-cache")
+def get_routing_cache_stats():
+    """Routing/intent decision cache hit rate, size and invalidation generation"""
+    return routing_cache.get_stats()
+
+@router.get("/routing-deadline")
+def get_routing_deadline_stats():
+    """Persona routing latency against its deadline and how often fallbacks were used"""
+    return routing_deadline_stats.get_stats()
+
+@router.get("/agent-profiles")
+def get_agent_profile_stats():
+    """Agent profile index size and background routing-summary progress"""
+    return agent_profile_index.get_stats()
+
+@router.get("/session-routing")
+def get_session_routing_stats():
+    """Sticky session routing: live sessions, continuation hits and background persistence"""
+    return session_routing_state.get_stats()
+
+@router.get("/cache")
+def get_cache_stats():
+    """Cache size, evictions and hit/miss/expiry/load-latency counters per namespace"""
+    return cache_service.get_stats()
+
+@router.get("/shared-memory")
+def get_shared_memory_stats():
+    """Shared memory write-behind queue (pending, written, retried, dropped) and session context cache hit rate"""
+    return shared_memory_service.get_stats()
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from ..db.database import get_db
 from ..db import models
 from ..schemas.orchestrator import OrchestratorConfigCreate, OrchestratorConfigUpdate, OrchestratorConfigResponse
+from ..services.orchestrator_rules import OrchestratorRuleEngine, invalidate_orchestrator_rules
 import json
 from typing import List
 
@@ -28,7 +29,7 @@ def create_orchestrator_config(payload: OrchestratorConfigCreate, db: Session =
     config = models.OrchestratorConfig(
         name=payload.name,
         description=payload.description,
-        routing_rules=payload.routing_rules,
+        routing_rules=[rule.model_dump() for rule in payload.routing_rules],
         default_agent_id=payload.default_agent_id,
         orchestrator_llm_id=payload.orchestrator_llm_id,  # Add LLM configuration
         tool_coordination=payload.tool_coordination.model_dump(),
@@ -39,6 +40,7 @@ def create_orchestrator_config(payload: OrchestratorConfigCreate, db: Session =
     db.add(config)
     db.commit()
     db.refresh(config)
+    invalidate_orchestrator_rules()
     return config
 
 @router.put("/{config_id}", response_model=OrchestratorConfigResponse)
@@ -53,7 +55,7 @@ def update_orchestrator_config(config_id: str, payload: OrchestratorConfigUpdate
     if payload.description is not None:
         config.description = payload.description
     if payload.routing_rules is not None:
-        config.routing_rules = payload.routing_rules
+        config.routing_rules = [rule.model_dump() for rule in payload.routing_rules]
     if payload.default_agent_id is not None:
         config.default_agent_id = payload.default_agent_id
     if payload.orchestrator_llm_id is not None:
@@ -69,6 +71,7 @@ def update_orchestrator_config(config_id: str, payload: OrchestratorConfigUpdate
     
     db.commit()
     db.refresh(config)
+    invalidate_orchestrator_rules()
     return config
 
 @router.delete("/{config_id}")
@@ -80,6 +83,7 @@ def delete_orchestrator_config(config_id: str, db: Session = Depends(get_db)):
     
     db.delete(config)
     db.commit()
+    invalidate_orchestrator_rules()
     return {"message": "Orchestrator config deleted successfully"}
 
 @router.post("/{config_id}/duplicate")
@@ -107,6 +111,7 @@ def duplicate_orchestrator_config(config_id: str, payload: dict, db: Session = D
     db.add(duplicate)
     db.commit()
     db.refresh(duplicate)
+    invalidate_orchestrator_rules()
     
     return duplicate
 
@@ -119,47 +124,23 @@ def test_orchestrator_config(config_id: str, payload: dict, db: Session = Depend
     
     message = payload.get("message", "test message")
     
-    # Simulate routing logic
+    # Same compiled rule engine the orchestrator uses
     selected_agent = None
     routing_result = None
+    rule_match = None
     
-    # Check routing rules - handle both dict and Pydantic model formats
     if config.routing_rules:
-        # Sort rules by priority (higher priority first)
-        sorted_rules = sorted(
-            config.routing_rules, 
-            key=lambda x: x.get('priority', 1) if isinstance(x, dict) else getattr(x, 'priority', 1), 
-            reverse=True
-        )
-        
-        for rule in sorted_rules:
-            # Extract keywords and capabilities based on data type
-            if isinstance(rule, dict):
-                keywords = rule.get('keywords', [])
-                agent_capabilities = rule.get('agent_capabilities', [])
-            else:
-                keywords = getattr(rule, 'keywords', [])
-                agent_capabilities = getattr(rule, 'agent_capabilities', [])
-            
-            if any(keyword.lower() in message.lower() for keyword in keywords):
-                # Find suitable agent
-                agents = db.query(models.Agent).filter(models.Agent.status == "active").all()
-                suitable_agents = []
-                
-                for agent in agents:
-                    agent_caps = [cap.name for cap in agent.capabilities]
-                    if all(cap in agent_caps for cap in agent_capabilities):
-                        suitable_agents.append(agent)
-                
-                if suitable_agents:
-                    selected_agent = suitable_agents[0]
-                    routing_result = {
-                        "rule_matched": rule.get('name', 'Unknown') if isinstance(rule, dict) else getattr(rule, 'name', 'Unknown'),
-                        "agent_selected": selected_agent.name,
-                        "capabilities_required": agent_capabilities,
-                        "capabilities_found": [cap.name for cap in selected_agent.capabilities]
-                    }
-                    break
+        agents = db.query(models.Agent).filter(models.Agent.status == "active").all()
+        rule_match = OrchestratorRuleEngine.from_config(config).match(message, agents)
+    
+    if rule_match:
+        selected_agent, rule = rule_match
+        routing_result = {
+            "rule_matched": rule.name,
+            "agent_selected": selected_agent.name,
+            "capabilities_required": sorted(rule.capabilities),
+            "capabilities_found": [cap.name for cap in selected_agent.capabilities]
+        }
     
     return {
         "config_id": config_id,
@@ -5,6 +5,7 @@ from ..db.database import get_db
 from ..db import models
 from ..services.tools import TOOL_CATEGORIES, TOOL_METADATA
 from ..services.mcp_manager import MCPManager
+from ..services.lookups import get_active_mcp_servers
 
 router = APIRouter(prefix="/tools", tags=["Tools"])
 
@@ -19,9 +20,7 @@ async def list_tool_categories(db: Session = Depends(get_db)):
     try:
         mcp_manager = MCPManager(db)
         await mcp_manager.initialize()
-        active_servers = db.query(models.MCPServer).filter(
-            models.MCPServer.status == models.MCPServerStatus.active
-        ).all()
+        active_servers = get_active_mcp_servers(db)
         
         mcp_category = db.query(models.ToolCategory).filter(
             models.ToolCategory.name == "MCP Tools"
@@ -32,7 +31,7 @@ async def list_tool_categories(db: Session = Depends(get_db)):
         
         for server in active_servers:
             try:
-                mcp_tools = await mcp_manager.get_server_tools(server.id)
+                mcp_tools = await mcp_manager.get_server_tools(server['id'])
                 mcp_tool_count += len(mcp_tools)
             except Exception:
                 continue
@@ -151,9 +150,7 @@ async def list_tools(
             await mcp_manager.initialize()
             
             # Get active MCP servers
-            active_servers = db.query(models.MCPServer).filter(
-                models.MCPServer.status == models.MCPServerStatus.active
-            ).all()
+            active_servers = get_active_mcp_servers(db)
             
             # Get MCP category (create if doesn't exist)
             mcp_category = db.query(models.ToolCategory).filter(
@@ -174,7 +171,7 @@ async def list_tools(
             for server in active_servers:
                 try:
                     # Get tools from this MCP server
-                    mcp_tools = await mcp_manager.get_server_tools(server.id)
+                    mcp_tools = await mcp_manager.get_server_tools(server['id'])
                     
                     for tool_name, tool_info in mcp_tools.items():
                         # Apply search filter to MCP tools if specified
@@ -190,10 +187,10 @@ async def list_tools(
                         
                         # Convert MCP tool to standard format
                         mcp_tool = {
-                            "id": f"mcp_{server.id}_{tool_name}",
+                            "id": f"mcp_{server['id']}_{tool_name}",
                             "name": tool_name,
                             "display_name": tool_info.get('displayName', tool_name),
-                            "description": tool_info.get('description', f'Tool from {server.name} MCP server'),
+                            "description": tool_info.get('description', f"Tool from {server['name']} MCP server"),
                             "category": {
                                 "id": str(mcp_category.id),
                                 "name": mcp_category.name,
@@ -209,8 +206,8 @@ async def list_tools(
                             "success_rate": 0,
                             "avg_execution_time_ms": None,
                             "source": "mcp",
-                            "mcp_server_id": server.id,
-                            "mcp_server_name": server.name
+                            "mcp_server_id": server['id'],
+                            "mcp_server_name": server['name']
                         }
                         
                         tools_list.append(mcp_tool)
@@ -6,6 +6,8 @@ from datetime import datetime
 
 from ..db.database import get_db
 from ..db.models import Workflow, WorkflowExecution, WorkflowTemplate
+from ..services.routing_cache import invalidate_routing_cache
+from ..services.cache_service import cache_service
 from ..schemas.workflow import (
     WorkflowCreate, 
     WorkflowUpdate, 
@@ -242,6 +244,10 @@ async def update_workflow(
         db.commit()
         db.refresh(db_workflow)
         
+        # Connected agents/routers may have changed
+        invalidate_routing_cache(f"workflow {workflow_id} updated")
+        cache_service.bump_version("workflow", workflow_id)
+        
         return WorkflowResponse.from_orm(db_workflow)
         
     except HTTPException:
@@ -281,6 +287,8 @@ async def delete_workflow(
             db_workflow.updated_at = datetime.utcnow()
         
         db.commit()
+        invalidate_routing_cache(f"workflow {workflow_id} deleted")
+        cache_service.bump_version("workflow", workflow_id)
         
     except HTTPException:
         raise
@@ -11,6 +11,7 @@ class RoutingRule(BaseSchema):
     name: str
     description: str
     keywords: List[str] = Field(description="Keywords that trigger this rule")
+    patterns: List[str] = Field(default_factory=list, description="Regular expressions that trigger this rule")
     agent_capabilities: List[str] = Field(description="Required capabilities for the agent")
     priority: int = Field(default=1, description="Higher priority rules are checked first")
     fallback_agent_id: Optional[str] = Field(default=None, description="Fallback agent if no suitable agent found")
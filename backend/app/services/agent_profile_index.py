@@ -0,0 +1,214 @@
+"""
+Agent Profile Index
+
+In-memory routing profiles of saved agents, keyed by agent id: routing
+summary, capability (tool) list and term vector. The persona and vector
+routers read summaries from here instead of querying the database per
+request. The index is warmed at startup and refreshed by the agents router;
+routing summaries are generated by a bounded background worker whenever an
+agent's system prompt changes, so agent writes never wait on an LLM call.
+Summaries missing at startup are claimed in the shared cache first, so only
+one worker process generates each of them. Each profile remembers the agent's
+entity version from cache_service; agent writes (in any worker process) bump
+it, and a profile read with an outdated version is reloaded.
+"""
+
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import joinedload
+
+from ..config import settings
+from ..db import models
+from ..db.database import SessionLocal
+from .cache_service import cache_service
+from .llm_limiter import llm_rate_limiter
+from .prompt_processor import generate_agent_routing_summary
+from .routing_cache import invalidate_routing_cache, stable_digest
+from .vector_router import term_frequencies
+
+
+# A worker that claimed a missing summary has this long to store it before another worker retries
+SUMMARY_CLAIM_TTL_SECONDS = 600
+
+VERSION_ENTITY = "agent"
+
+
+class AgentProfileIndex:
+    """Agent id -> routing profile, with background routing-summary generation"""
+
+    def __init__(self, summary_concurrency: int = 2):
+        self._profiles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, summary_concurrency), thread_name_prefix="routing-summary"
+        )
+        # Agents with a summary job queued but not started yet
+        self._pending: set = set()
+        self._stats = {"summaries_generated": 0, "summaries_failed": 0, "summaries_stale": 0, "profiles_reloaded": 0}
+
+    def _build_profile(self, agent: models.Agent, version: str) -> Dict[str, Any]:
+        tools = [c.name for c in (agent.capabilities or [])]
+        return {
+            'id': str(agent.id),
+            'version': version,
+            'name': agent.name,
+            'system_prompt': agent.system_prompt or '',
+            'routing_summary': agent.routing_summary,
+            'tools': tools,
+            # Term vector of everything the vector router knows about the agent
+            'terms': term_frequencies('\n'.join([agent.routing_summary or '', agent.system_prompt or '', *tools]))
+        }
+
+    def warm(self):
+        """Load every agent (one query) and queue summaries that are missing"""
+        db = SessionLocal()
+        try:
+            agents = db.query(models.Agent).options(joinedload(models.Agent.capabilities)).all()
+            profiles = {
+                str(agent.id): self._build_profile(agent, cache_service.entity_version(VERSION_ENTITY, agent.id))
+                for agent in agents
+            }
+        except Exception as e:
+            print(f"⚠️ AGENT PROFILES: Failed to warm profile index: {e}")
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            self._profiles = profiles
+        missing = [p for p in profiles.values() if p['system_prompt'].strip() and not p['routing_summary']]
+        queued = 0
+        for profile in missing:
+            # Every worker warms at startup; the claim keeps them from generating the same summary
+            claim = f"routing_summary_claim:{profile['id']}:{stable_digest(profile['system_prompt'])}"
+            if cache_service.add(claim, os.getpid(), ttl_seconds=SUMMARY_CLAIM_TTL_SECONDS):
+                self.schedule_summary(profile['id'])
+                queued += 1
+        print(f"📇 AGENT PROFILES: Warmed {len(profiles)} agent profiles ({queued} of {len(missing)} missing routing summaries queued)")
+
+    def refresh(self, agent: models.Agent, prompt_changed: bool = False):
+        """
+        Update one agent's profile after a write (call after bumping the agent's
+        version); queue a new summary if its prompt changed
+        """
+        profile = self._build_profile(agent, cache_service.entity_version(VERSION_ENTITY, agent.id))
+        with self._lock:
+            self._profiles[profile['id']] = profile
+        if prompt_changed:
+            self.schedule_summary(profile['id'])
+
+    def remove(self, agent_id: str):
+        with self._lock:
+            self._profiles.pop(str(agent_id), None)
+
+    def get(self, agent_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not agent_id:
+            return None
+        agent_id = str(agent_id)
+        with self._lock:
+            profile = self._profiles.get(agent_id)
+        if profile is None:
+            return None
+        if profile['version'] == cache_service.entity_version(VERSION_ENTITY, agent_id):
+            return profile
+        # Written by another worker process since it was loaded
+        return self._reload(agent_id, profile)
+
+    def _reload(self, agent_id: str, stale: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        try:
+            database_id = uuid.UUID(agent_id)
+        except ValueError:
+            return stale
+        version = cache_service.entity_version(VERSION_ENTITY, agent_id)
+        db = SessionLocal()
+        try:
+            agent = db.query(models.Agent).options(joinedload(models.Agent.capabilities)).filter(
+                models.Agent.id == database_id
+            ).first()
+            profile = self._build_profile(agent, version) if agent else None
+        except Exception as e:
+            print(f"⚠️ AGENT PROFILES: Failed to reload profile of agent {agent_id}: {e}")
+            return stale
+        finally:
+            db.close()
+
+        with self._lock:
+            if profile is None:
+                self._profiles.pop(agent_id, None)
+            else:
+                self._profiles[agent_id] = profile
+        self._count("profiles_reloaded")
+        return profile
+
+    def get_summary(self, agent_id: Optional[str]) -> Optional[str]:
+        profile = self.get(agent_id)
+        return profile['routing_summary'] if profile else None
+
+    def schedule_summary(self, agent_id: str):
+        """Queue routing-summary generation (deduplicated per agent)"""
+        agent_id = str(agent_id)
+        with self._lock:
+            if agent_id in self._pending:
+                return
+            self._pending.add(agent_id)
+        self._executor.submit(self._generate_summary, agent_id)
+
+    def _generate_summary(self, agent_id: str):
+        db = SessionLocal()
+        try:
+            agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
+            with self._lock:
+                # The prompt is read now: later prompt changes queue a new job
+                self._pending.discard(agent_id)
+            if not agent:
+                return
+            system_prompt = agent.system_prompt or ''
+
+            routing_summary = None
+            if system_prompt.strip():
+                with llm_rate_limiter.slot():
+                    routing_summary = generate_agent_routing_summary(system_prompt, agent.name)
+
+            # Only store it if the prompt was not edited while the summary was generated
+            db.refresh(agent)
+            if (agent.system_prompt or '') != system_prompt:
+                self._count("summaries_stale")
+                return
+            agent.routing_summary = routing_summary
+            db.commit()
+            db.refresh(agent)
+            # Other worker processes reload the profile on their next read
+            cache_service.bump_version(VERSION_ENTITY, agent_id)
+            self.refresh(agent)
+            self._count("summaries_generated")
+            print(f"✅ AGENT PROFILES: Updated routing summary for agent '{agent.name}'")
+            invalidate_routing_cache(f"routing summary of agent {agent_id} updated")
+        except Exception as e:
+            db.rollback()
+            self._count("summaries_failed")
+            print(f"⚠️ AGENT PROFILES: Failed to generate routing summary for agent {agent_id}: {e}")
+        finally:
+            db.close()
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                "profiles": len(self._profiles),
+                "summaries_pending": len(self._pending),
+                "missing_summaries": sum(
+                    1 for p in self._profiles.values() if p['system_prompt'].strip() and not p['routing_summary']
+                )
+            }
+
+
+# Global instance
+agent_profile_index = AgentProfileIndex(summary_concurrency=settings.ROUTING_SUMMARY_CONCURRENCY)
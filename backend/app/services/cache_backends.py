@@ -0,0 +1,205 @@
+"""
+Cache Backends
+
+Second cache tier shared by all worker processes on a host. CacheService
+keeps its in-process LRU as a near cache (L1) in front of it; values that
+are JSON serializable are also written here, so a secret, routing decision
+or checkpoint computed by one uvicorn worker is a hit in every other worker.
+"""
+
+import json
+import os
+import sqlite3
+import stat
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from ..config import settings
+
+
+def _check_private(st: os.stat_result, what: str, writable_only: bool = False):
+    """Raise unless the service user owns it and nobody else can write (or, for files, read) it"""
+    if hasattr(os, "geteuid") and st.st_uid != os.geteuid():
+        raise PermissionError(f"{what} is owned by uid {st.st_uid}, not the service user")
+    if st.st_mode & (0o022 if writable_only else 0o077):
+        raise PermissionError(f"{what} is accessible to other users (mode {stat.S_IMODE(st.st_mode):o})")
+
+
+def _open_private_file(path: str):
+    """
+    Create the cache file (0600) in a private directory, or verify an existing
+    one. Cached values can be sensitive, and a file another local user could
+    create first or write to would let them read or poison every worker's cache.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # SQLite creates its -wal and -shm files next to the database
+    _check_private(os.stat(directory), f"Cache directory {directory}", writable_only=True)
+
+    nofollow = getattr(os, "O_NOFOLLOW", 0)
+    try:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL | nofollow, 0o600)
+    except FileExistsError:
+        fd = os.open(path, os.O_RDWR | nofollow)
+    try:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            raise PermissionError(f"Cache file {path} is not a regular file")
+        _check_private(st, f"Cache file {path}")
+    finally:
+        os.close(fd)
+
+
+class SQLiteCacheBackend:
+    """
+    Key/value store in a SQLite database in WAL mode (readers never block the
+    writer, and concurrent processes are safe). Values are JSON text with an
+    absolute expiry time, so every process agrees on when an entry expires.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._errors = 0
+        _open_private_file(path)
+        connection = self._connection()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, fresh_until REAL)"
+        )
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(cache_entries)")}
+        if "fresh_until" not in columns:
+            connection.execute("ALTER TABLE cache_entries ADD COLUMN fresh_until REAL")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections are not shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _failed(self, operation: str, error: Exception):
+        self._errors += 1
+        if self._errors == 1 or self._errors % 1000 == 0:
+            print(f"⚠️ CACHE L2: {operation} failed ({self._errors} errors so far): {error}")
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """(value, seconds until expiry, seconds until stale) or None if missing or expired"""
+        try:
+            row = self._connection().execute(
+                "SELECT value, expires_at, fresh_until FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            self._failed("get", e)
+            return None
+        if not row:
+            return None
+        now = time.time()
+        remaining = row[1] - now
+        if remaining <= 0:
+            return None
+        fresh_remaining = remaining if row[2] is None else row[2] - now
+        return json.loads(row[0]), remaining, fresh_remaining
+
+    def set(self, key: str, payload: str, ttl_seconds: float, fresh_ttl_seconds: Optional[float] = None):
+        """Store an already JSON-encoded value (servable for ttl_seconds, fresh for fresh_ttl_seconds)"""
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, fresh_until) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl_seconds, now + (ttl_seconds if fresh_ttl_seconds is None else fresh_ttl_seconds))
+            )
+        except sqlite3.Error as e:
+            self._failed("set", e)
+
+    def add(self, key: str, payload: str, ttl_seconds: float) -> bool:
+        """Store the value only if the key is missing or expired; True if this call stored it"""
+        now = time.time()
+        connection = self._connection()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute("DELETE FROM cache_entries WHERE key = ? AND expires_at <= ?", (key, now))
+                added = connection.execute(
+                    "INSERT OR IGNORE INTO cache_entries (key, value, expires_at, fresh_until) VALUES (?, ?, ?, ?)",
+                    (key, payload, now + ttl_seconds, now + ttl_seconds)
+                ).rowcount == 1
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                connection.execute("ROLLBACK")
+                raise
+            return added
+        except sqlite3.Error as e:
+            self._failed("add", e)
+            # Without the shared tier every process decides for itself
+            return True
+
+    def delete(self, key: str):
+        try:
+            self._connection().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self._failed("delete", e)
+
+    def clear(self, pattern: Optional[str] = None):
+        try:
+            if pattern is None:
+                self._connection().execute("DELETE FROM cache_entries")
+            else:
+                self._connection().execute("DELETE FROM cache_entries WHERE instr(key, ?) > 0", (pattern,))
+        except sqlite3.Error as e:
+            self._failed("clear", e)
+
+    def sweep(self) -> int:
+        """Drop expired entries, then the soonest-expiring ones beyond max_entries"""
+        try:
+            connection = self._connection()
+            removed = connection.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)).rowcount
+            excess = connection.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                removed += connection.execute(
+                    "DELETE FROM cache_entries WHERE key IN (SELECT key FROM cache_entries ORDER BY expires_at LIMIT ?)",
+                    (excess,)
+                ).rowcount
+            return removed
+        except sqlite3.Error as e:
+            self._failed("sweep", e)
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        try:
+            connection = self._connection()
+            entries = connection.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+            page_count = connection.execute("PRAGMA page_count").fetchone()[0]
+            page_size = connection.execute("PRAGMA page_size").fetchone()[0]
+        except sqlite3.Error as e:
+            self._failed("stats", e)
+            entries, page_count, page_size = None, 0, 0
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'entries': entries,
+            'max_entries': self.max_entries,
+            'file_bytes': page_count * page_size,
+            'errors': self._errors
+        }
+
+
+def create_shared_backend() -> Optional[SQLiteCacheBackend]:
+    """Shared tier configured by CACHE_L2_BACKEND ("" disables it)"""
+    backend = settings.CACHE_L2_BACKEND.lower()
+    if not backend:
+        return None
+    if backend != "sqlite":
+        print(f"⚠️ CACHE L2: Unknown backend '{settings.CACHE_L2_BACKEND}' - shared cache tier disabled")
+        return None
+    try:
+        return SQLiteCacheBackend(settings.CACHE_L2_PATH, settings.CACHE_L2_MAX_ENTRIES)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️ CACHE L2: Could not open {settings.CACHE_L2_PATH} - shared cache tier disabled: {e}")
+        return None
@@ -3,107 +3,522 @@ Cache Service for Performance Optimization
 
 Provides caching for expensive operations like Azure Key Vault secrets,
 LLM clients, and database queries to improve response times.
+JSON-serializable values are also kept in a shared tier (see cache_backends)
+so all worker processes on a host share them; the in-process LRU acts as a
+near cache in front of it.
 """
 
+import json
+import math
+import random
+import sys
+import threading
 import time
+import uuid
+from collections import OrderedDict
 from typing import Dict, Any, Optional
-from datetime import datetime, timedelta
 import asyncio
 from functools import lru_cache
 
+from ..config import settings
+from .cache_backends import create_shared_backend
+
+
+# Entries checked per lock acquisition by the expiry sweeper
+SWEEP_BATCH_SIZE = 1000
+
+# Entity version tokens outlive any entry tagged with them
+VERSION_TTL_SECONDS = 30 * 24 * 3600
+
+_COUNTERS = (
+    'hits', 'misses', 'sets', 'evictions', 'expirations', 'loads', 'l2_hits',
+    'stale_hits', 'early_refreshes', 'refreshes', 'refresh_failures', 'negative_hits', 'load_failures'
+)
+
+
+class _FailedLoad:
+    """Negative cache entry: the load failed, callers get the error until it expires"""
+    
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def namespace_of(key: str) -> str:
+    """Subsystem a key belongs to: its prefix up to the first ':' (e.g. "keyvault")"""
+    namespace, separator, _ = key.partition(':')
+    return namespace if separator else 'default'
+
+
+def _estimate_size(value: Any, depth: int = 0) -> int:
+    """Approximate memory footprint of a cached value in bytes"""
+    size = sys.getsizeof(value, 64)
+    if depth >= 3:
+        return size
+    if isinstance(value, (str, bytes, bytearray, int, float, bool)) or value is None:
+        return size
+    if isinstance(value, dict):
+        return size + sum(_estimate_size(k, depth + 1) + _estimate_size(v, depth + 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return size + sum(_estimate_size(item, depth + 1) for item in value)
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return size + nbytes
+    attributes = getattr(value, '__dict__', None)
+    if attributes:
+        return size + _estimate_size(attributes, depth + 1)
+    return size
+
 
 class CacheService:
     """
     Singleton cache service for application-wide caching.
-    Supports TTL-based expiration and pre-warming.
+    Supports TTL-based expiration and pre-warming. Bounded by entry count and
+    approximate byte size (least recently used entries are evicted first);
+    expired entries are removed by a background sweeper.
     """
     
     _instance = None
-    _cache: Dict[str, Dict[str, Any]] = {}
-    _locks: Dict[str, asyncio.Lock] = {}
     
     def __new__(cls):
         if cls._instance is None:
-            cls._instance = super(CacheService, cls).__new__(cls)
-            cls._instance._cache = {}
-            cls._instance._locks = {}
+            instance = super(CacheService, cls).__new__(cls)
+            instance._cache = OrderedDict()
+            instance._lock = threading.Lock()
+            # Serializes creation of unknown entity version tokens
+            instance._version_lock = threading.Lock()
+            # Per-key computation locks for get_or_set_async, dropped when unused
+            instance._locks: Dict[str, asyncio.Lock] = {}
+            instance._lock_users: Dict[str, int] = {}
+            # Keys with a stale-while-revalidate refresh in flight
+            instance._refreshing: set = set()
+            instance._refresh_tasks: set = set()
+            instance.max_entries = settings.CACHE_MAX_ENTRIES
+            instance.max_bytes = settings.CACHE_MAX_BYTES
+            instance._total_bytes = 0
+            instance._stats = dict.fromkeys(_COUNTERS, 0)
+            # Same counters per key namespace, plus load latency
+            instance._namespace_stats: Dict[str, Dict[str, float]] = {}
+            instance._namespaces: Dict[str, CacheNamespace] = {}
+            instance._sweeper = None
+            instance._l2 = create_shared_backend()
+            instance._l2_excluded = frozenset(
+                n.strip() for n in settings.CACHE_L2_EXCLUDED_NAMESPACES.split(',') if n.strip()
+            )
+            cls._instance = instance
         return cls._instance
     
-    def get(self, key: str) -> Optional[Any]:
-        """Get value from cache if not expired"""
-        if key in self._cache:
-            entry = self._cache[key]
-            if entry['expires_at'] > datetime.now():
-                print(f"✅ Cache hit for: {key}")
-                return entry['value']
-            else:
-                # Expired, remove from cache
-                del self._cache[key]
-                print(f"⏰ Cache expired for: {key}")
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Live entry (fresh or stale, near cache first, then the shared tier), counting hits and misses"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                if entry['expires_at'] > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self._count(key, 'negative_hits' if isinstance(entry['value'], _FailedLoad) else 'hits')
+                    return entry
+                # Expired, remove from cache (shared entries are re-read from the shared tier)
+                self._remove(key)
+                if not entry['shared']:
+                    self._count(key, 'expirations')
+        
+        if self._l2 is not None and self._is_shared(key):
+            found = self._l2.get(key)
+            if found is not None:
+                value, remaining, fresh_remaining = found
+                with self._lock:
+                    entry = self._store(
+                        key, value, remaining, _estimate_size(key) + _estimate_size(value),
+                        shared=True, fresh_ttl_seconds=fresh_remaining
+                    )
+                    self._count(key, 'hits')
+                    self._count(key, 'l2_hits')
+                return entry
+        
+        with self._lock:
+            self._count(key, 'misses')
         return None
     
-    def set(self, key: str, value: Any, ttl_seconds: int = 3600):
-        """Set value in cache with TTL"""
-        expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
-        self._cache[key] = {
+    def get(self, key: str) -> Optional[Any]:
+        """Get value from cache if not expired (stale-while-revalidate values included)"""
+        entry = self._get_entry(key)
+        if entry is None or isinstance(entry['value'], _FailedLoad):
+            return None
+        return entry['value']
+    
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600, stale_ttl_seconds: int = 0, load_seconds: float = 0.0):
+        """
+        Set value in cache with TTL. With stale_ttl_seconds the entry stays
+        servable (stale) that much longer while get_or_set_async refreshes it.
+        """
+        size = _estimate_size(key) + _estimate_size(value)
+        if size > self.max_bytes:
+            print(f"⚠️ Not caching {key}: {size} bytes exceeds the cache size limit")
+            # The previous value is outdated now; readers must not keep getting it
+            self.delete(key)
+            return
+        self._ensure_sweeper()
+        hard_ttl_seconds = ttl_seconds + stale_ttl_seconds
+        
+        shared = False
+        if self._l2 is not None and self._is_shared(key):
+            try:
+                payload = json.dumps(value)
+            except (TypeError, ValueError):
+                # Objects (clients, ORM rows, indexes) stay in this process
+                payload = None
+            if payload is not None:
+                self._l2.set(key, payload, hard_ttl_seconds, ttl_seconds)
+                shared = True
+        
+        with self._lock:
+            self._store(key, value, hard_ttl_seconds, size, shared, ttl_seconds, load_seconds)
+            self._count(key, 'sets')
+    
+    def add(self, key: str, value: Any, ttl_seconds: int = 3600) -> bool:
+        """
+        Set value only if the key is not cached yet - atomically across worker
+        processes when it goes to the shared tier. True if this call stored it
+        (e.g. a claim on work that only one process should do).
+        """
+        size = _estimate_size(key) + _estimate_size(value)
+        self._ensure_sweeper()
+        shared = self._l2 is not None and self._is_shared(key)
+        if shared and not self._l2.add(key, json.dumps(value), ttl_seconds):
+            return False
+        
+        with self._lock:
+            entry = self._cache.get(key)
+            if not shared and entry is not None and entry['expires_at'] > time.monotonic():
+                return False
+            self._store(key, value, ttl_seconds, size, shared)
+            self._count(key, 'sets')
+        return True
+    
+    def _is_shared(self, key: str) -> bool:
+        return namespace_of(key) not in self._l2_excluded
+    
+    def _store(self, key: str, value: Any, ttl_seconds: float, size: int, shared: bool,
+               fresh_ttl_seconds: Optional[float] = None, load_seconds: float = 0.0) -> Dict[str, Any]:
+        # Caller holds self._lock. Shared entries are only trusted locally for
+        # CACHE_L1_TTL_SECONDS, so deletes and overwrites by other processes show up
+        if fresh_ttl_seconds is None:
+            fresh_ttl_seconds = ttl_seconds
+        fresh_ttl_seconds = min(fresh_ttl_seconds, ttl_seconds)
+        if shared:
+            ttl_seconds = min(ttl_seconds, settings.CACHE_L1_TTL_SECONDS)
+        if key in self._cache:
+            self._remove(key)
+        now = time.monotonic()
+        entry = self._cache[key] = {
             'value': value,
-            'expires_at': expires_at,
-            'created_at': datetime.now()
+            'expires_at': now + ttl_seconds,
+            # Served without a refresh until then; stale (but servable) until expires_at
+            'fresh_until': now + fresh_ttl_seconds,
+            'load_seconds': load_seconds,
+            'created_at': time.time(),
+            'size': size,
+            'shared': shared
         }
-        print(f"💾 Cached: {key} (TTL: {ttl_seconds}s)")
+        self._total_bytes += size
+        while len(self._cache) > self.max_entries or self._total_bytes > self.max_bytes:
+            evicted = next(iter(self._cache))
+            self._remove(evicted)
+            self._count(evicted, 'evictions')
+        return entry
     
-    async def get_or_set_async(self, key: str, factory_fn, ttl_seconds: int = 3600):
-        """Get from cache or compute and cache the value (async-safe)"""
+    def delete(self, key: str):
+        """Remove a single entry if present"""
+        with self._lock:
+            if key in self._cache:
+                self._remove(key)
+        if self._l2 is not None and self._is_shared(key):
+            self._l2.delete(key)
+    
+    def _remove(self, key: str):
+        # Caller holds self._lock
+        entry = self._cache.pop(key)
+        self._total_bytes -= entry['size']
+    
+    def _namespace_counters(self, namespace: str) -> Dict[str, float]:
+        # Caller holds self._lock
+        counters = self._namespace_stats.get(namespace)
+        if counters is None:
+            counters = self._namespace_stats[namespace] = {**dict.fromkeys(_COUNTERS, 0), 'load_ms_total': 0.0, 'load_ms_max': 0.0}
+        return counters
+    
+    def _count(self, key: str, counter: str):
+        # Caller holds self._lock
+        self._stats[counter] += 1
+        self._namespace_counters(namespace_of(key))[counter] += 1
+    
+    def record_load(self, key: str, seconds: float):
+        """Record how long computing a missing value took (per key namespace)"""
+        load_ms = seconds * 1000
+        with self._lock:
+            self._stats['loads'] += 1
+            counters = self._namespace_counters(namespace_of(key))
+            counters['loads'] += 1
+            counters['load_ms_total'] += load_ms
+            counters['load_ms_max'] = max(counters['load_ms_max'], load_ms)
+    
+    def namespace(self, name: str) -> "CacheNamespace":
+        """Cache view whose keys are prefixed with `name:`"""
+        view = self._namespaces.get(name)
+        if view is None:
+            view = self._namespaces[name] = CacheNamespace(self, name)
+        return view
+    
+    def entity_version(self, entity: str, entity_id: Any = None) -> str:
+        """Current version token of one entity, or of the whole entity type when entity_id is None"""
+        key = f"version:{entity}:{'*' if entity_id is None else entity_id}"
+        token = self.get(key)
+        if token is None:
+            with self._version_lock:
+                token = self.get(key)
+                if token is None:
+                    # Unknown (never bumped, or evicted): a fresh token, so nothing cached under an older one matches
+                    token = uuid.uuid4().hex[:12]
+                    self.set(key, token, ttl_seconds=VERSION_TTL_SECONDS)
+        return token
+    
+    def bump_version(self, entity: str, entity_id: Any = None, bump_type: bool = True):
+        """
+        Invalidate everything cached against this entity (and, unless bump_type
+        is False, against its entity type as a whole) in O(1): keys built by
+        versioned_key stop matching.
+        """
+        if bump_type or entity_id is None:
+            self.set(f"version:{entity}:*", uuid.uuid4().hex[:12], ttl_seconds=VERSION_TTL_SECONDS)
+        if entity_id is not None:
+            self.set(f"version:{entity}:{entity_id}", uuid.uuid4().hex[:12], ttl_seconds=VERSION_TTL_SECONDS)
+    
+    def versioned_key(self, key: str, *dependencies) -> str:
+        """
+        Key tagged with the versions of the entities its value depends on, e.g.
+        versioned_key("llm_config:42", ("llm_config", 42)) or versioned_key(key, "agent")
+        for values depending on every agent. Entries of older versions are never
+        read again and age out through LRU eviction and TTL.
+        """
+        tokens = [
+            self.entity_version(*dependency) if isinstance(dependency, tuple) else self.entity_version(dependency)
+            for dependency in dependencies
+        ]
+        return f"{key}#{'.'.join(tokens)}"
+    
+    async def get_or_set_async(
+        self,
+        key: str,
+        factory_fn,
+        ttl_seconds: int = 3600,
+        stale_ttl_seconds: Optional[int] = None,
+        negative_ttl_seconds: Optional[int] = None
+    ):
+        """
+        Get from cache or compute and cache the value (async-safe, one computation per key).
+        For stale_ttl_seconds after the TTL the stale value is served while one
+        background refresh runs; refreshes also start early with a probability
+        that grows towards the TTL (XFetch), so they spread out instead of
+        piling up at expiry. Failed loads are cached for negative_ttl_seconds.
+        """
+        if stale_ttl_seconds is None:
+            stale_ttl_seconds = settings.CACHE_STALE_TTL_SECONDS
+        if negative_ttl_seconds is None:
+            negative_ttl_seconds = settings.CACHE_NEGATIVE_TTL_SECONDS
+        
         # Check cache first
-        cached_value = self.get(key)
-        if cached_value is not None:
-            return cached_value
+        entry = self._get_entry(key)
+        if entry is not None and entry['value'] is not None:
+            return self._serve(key, entry, factory_fn, ttl_seconds, stale_ttl_seconds)
         
         # Ensure we have a lock for this key
-        if key not in self._locks:
-            self._locks[key] = asyncio.Lock()
-        
-        # Acquire lock to prevent duplicate computations
-        async with self._locks[key]:
-            # Double-check cache after acquiring lock
-            cached_value = self.get(key)
-            if cached_value is not None:
-                return cached_value
-            
-            # Compute value
-            print(f"🔄 Computing value for: {key}")
-            if asyncio.iscoroutinefunction(factory_fn):
-                value = await factory_fn()
-            else:
-                value = factory_fn()
-            
-            # Cache and return
-            self.set(key, value, ttl_seconds)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        
+        try:
+            # Acquire lock to prevent duplicate computations
+            async with lock:
+                # Double-check cache after acquiring lock
+                entry = self._get_entry(key)
+                if entry is not None and entry['value'] is not None:
+                    return self._serve(key, entry, factory_fn, ttl_seconds, stale_ttl_seconds)
+                
+                try:
+                    value, load_seconds = await self._load(key, factory_fn)
+                except Exception as e:
+                    if negative_ttl_seconds > 0:
+                        with self._lock:
+                            self._store(key, _FailedLoad(e), negative_ttl_seconds, _estimate_size(key), shared=False)
+                            self._count(key, 'load_failures')
+                    raise
+                
+                # Cache and return
+                self.set(key, value, ttl_seconds, stale_ttl_seconds, load_seconds)
+                return value
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                del self._locks[key]
+    
+    async def _load(self, key: str, factory_fn):
+        started_at = time.perf_counter()
+        if asyncio.iscoroutinefunction(factory_fn):
+            value = await factory_fn()
+        else:
+            value = factory_fn()
+        load_seconds = time.perf_counter() - started_at
+        self.record_load(key, load_seconds)
+        return value, load_seconds
+    
+    def _serve(self, key: str, entry: Dict[str, Any], factory_fn, ttl_seconds: int, stale_ttl_seconds: int):
+        """Cached value of a live entry, starting a background refresh when it is (nearly) due"""
+        value = entry['value']
+        if isinstance(value, _FailedLoad):
+            raise value.error
+        
+        now = time.monotonic()
+        if now >= entry['fresh_until']:
+            counter = 'stale_hits'
+        elif entry['load_seconds'] and settings.CACHE_XFETCH_BETA > 0 and (
+            # XFetch: -log(u) is exponentially distributed, slow loads refresh earlier
+            now - entry['load_seconds'] * settings.CACHE_XFETCH_BETA * math.log(1.0 - random.random()) >= entry['fresh_until']
+        ):
+            counter = 'early_refreshes'
+        else:
             return value
+        
+        with self._lock:
+            self._count(key, counter)
+            if key in self._refreshing:
+                return value
+            self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh(key, factory_fn, ttl_seconds, stale_ttl_seconds))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+        return value
+    
+    async def _refresh(self, key: str, factory_fn, ttl_seconds: int, stale_ttl_seconds: int):
+        try:
+            value, load_seconds = await self._load(key, factory_fn)
+            self.set(key, value, ttl_seconds, stale_ttl_seconds, load_seconds)
+            with self._lock:
+                self._count(key, 'refreshes')
+        except Exception as e:
+            # Keep serving the stale value until it hard-expires
+            with self._lock:
+                self._count(key, 'refresh_failures')
+            print(f"⚠️ Background refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+    
+    def _ensure_sweeper(self):
+        if self._sweeper is None:
+            with self._lock:
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(target=self._sweep_loop, name="cache-sweeper", daemon=True)
+                    self._sweeper.start()
+    
+    def _sweep_loop(self):
+        while True:
+            time.sleep(settings.CACHE_SWEEP_INTERVAL_SECONDS)
+            try:
+                self.sweep_expired()
+            except Exception as e:
+                print(f"⚠️ Cache sweep failed: {e}")
+    
+    def sweep_expired(self) -> int:
+        """Remove expired entries, a batch at a time so readers are not blocked for long"""
+        with self._lock:
+            keys = list(self._cache.keys())
+        removed = 0
+        for i in range(0, len(keys), SWEEP_BATCH_SIZE):
+            now = time.monotonic()
+            with self._lock:
+                for key in keys[i:i + SWEEP_BATCH_SIZE]:
+                    entry = self._cache.get(key)
+                    if entry is not None and entry['expires_at'] <= now:
+                        self._remove(key)
+                        if not entry['shared']:
+                            self._count(key, 'expirations')
+                        removed += 1
+        if self._l2 is not None:
+            self._l2.sweep()
+        return removed
     
     def clear(self, pattern: Optional[str] = None):
-        """Clear cache entries matching pattern or all if pattern is None"""
-        if pattern is None:
-            self._cache.clear()
-            print("🗑️ Cleared entire cache")
-        else:
+        """
+        Clear cache entries matching pattern or all if pattern is None.
+        Scans every key; use bump_version to invalidate entity-dependent entries.
+        """
+        if self._l2 is not None:
+            self._l2.clear(pattern)
+        with self._lock:
+            if pattern is None:
+                self._cache.clear()
+                self._total_bytes = 0
+                print("🗑️ Cleared entire cache")
+                return
             keys_to_remove = [k for k in self._cache.keys() if pattern in k]
             for key in keys_to_remove:
-                del self._cache[key]
-            print(f"🗑️ Cleared {len(keys_to_remove)} cache entries matching: {pattern}")
+                self._remove(key)
+        print(f"🗑️ Cleared {len(keys_to_remove)} cache entries matching: {pattern}")
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        total_entries = len(self._cache)
-        expired_entries = sum(1 for entry in self._cache.values() 
-                            if entry['expires_at'] <= datetime.now())
-        
-        return {
-            'total_entries': total_entries,
-            'active_entries': total_entries - expired_entries,
-            'expired_entries': expired_entries,
-            'cache_keys': list(self._cache.keys())
-        }
+        """Get cache statistics (counters are maintained incrementally), overall and per namespace"""
+        with self._lock:
+            return {
+                'total_entries': len(self._cache),
+                'total_bytes': self._total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                **self._stats,
+                'hit_rate': _hit_rate(self._stats),
+                'pending_computations': len(self._locks),
+                'shared_tier': self._l2.get_stats() if self._l2 is not None else None,
+                'namespaces': {
+                    namespace: {
+                        **{counter: counters[counter] for counter in _COUNTERS},
+                        'hit_rate': _hit_rate(counters),
+                        'avg_load_ms': round(counters['load_ms_total'] / counters['loads'], 2) if counters['loads'] else 0.0,
+                        'max_load_ms': round(counters['load_ms_max'], 2)
+                    }
+                    for namespace, counters in sorted(self._namespace_stats.items())
+                }
+            }
+
+
+def _hit_rate(counters: Dict[str, float]) -> float:
+    lookups = counters['hits'] + counters['misses']
+    return round(counters['hits'] / lookups, 3) if lookups else 0.0
+
+
+class CacheNamespace:
+    """A subsystem's view of the cache (keyvault, routing, llm_config, ...)"""
+    
+    def __init__(self, cache: CacheService, name: str):
+        self.cache = cache
+        self.name = name
+    
+    def key(self, key: str) -> str:
+        return f"{self.name}:{key}"
+    
+    def get(self, key: str) -> Optional[Any]:
+        return self.cache.get(self.key(key))
+    
+    def set(self, key: str, value: Any, ttl_seconds: int = 3600):
+        self.cache.set(self.key(key), value, ttl_seconds)
+    
+    def delete(self, key: str):
+        self.cache.delete(self.key(key))
+    
+    def record_load(self, seconds: float):
+        self.cache.record_load(self.key(''), seconds)
+    
+    async def get_or_set_async(self, key: str, factory_fn, ttl_seconds: int = 3600):
+        return await self.cache.get_or_set_async(self.key(key), factory_fn, ttl_seconds)
 
 
 class KeyVaultCache:
@@ -195,6 +610,7 @@ class KeyVaultCache:
         
         elapsed = time.time() - start_time
         print(f"✅ Retrieved secret in {elapsed:.2f}s")
+        self.cache.record_load(cache_key, elapsed)
         
         # Cache both in memory and cache service (6 hour TTL for sync)
         self._resolved_secrets[secret_ref] = secret.value
@@ -219,7 +635,6 @@ class LLMClientCache:
     def get_or_create_client(self, config_key: str, factory_fn):
         """Get cached LLM client or create new one"""
         if config_key in self._clients:
-            print(f"✅ Using cached LLM client: {config_key}")
             return self._clients[config_key]
         
         print(f"🔧 Creating new LLM client: {config_key}")
@@ -0,0 +1,162 @@
+"""
+Idempotency Service
+
+Deduplicates chat turns submitted twice (double-clicks, client retries) using
+the `Idempotency-Key` request header. The first request with a key owns the
+execution; duplicates attach to its event stream while it is in flight, or
+replay its recorded events once it has finished, instead of running the
+workflow (and its LLM calls and shared-memory writes) again.
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+
+class IdempotencyConflict(ValueError):
+    """The key was already used for a request with a different payload"""
+
+
+class IdempotentExecution:
+    """Recorded events of one execution, replayable to any number of subscribers"""
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.events: List[Any] = []
+        self.done = False
+        self.failed = False
+        self.error: Optional[BaseException] = None
+        self.completed_at: Optional[float] = None
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _append(self, event: Any):
+        self.events.append(event)
+        self._notify()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def _finish(self):
+        self.done = True
+        self.completed_at = time.monotonic()
+        self._notify()
+
+    def start(self, source: AsyncIterator[Any]):
+        """
+        Drive the source in a background task so the execution completes (and
+        is recorded) even if the client that started it disconnects.
+        """
+        async def pump():
+            try:
+                async for event in source:
+                    self._append(event)
+            except Exception as e:
+                self.failed = True
+                self.error = e
+            finally:
+                self._finish()
+
+        self._task = asyncio.create_task(pump())
+
+    def run(self, coro: Awaitable[Any]):
+        """Run a non-streaming execution in the background; its return value is the single event"""
+        async def single():
+            yield await coro
+
+        self.start(single())
+
+    def fail(self, error_event: Any = None):
+        """Record a failure before the execution started; the key is released for retries"""
+        self.failed = True
+        if error_event is not None:
+            self._append(error_event)
+        self._finish()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Replay all recorded events, then follow new ones until the execution finishes"""
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+    async def result(self) -> Any:
+        """Wait for a non-streaming execution and return its result (re-raising its error)"""
+        while not self.done:
+            await self._changed.wait()
+        if self.error:
+            raise self.error
+        return self.events[-1] if self.events else None
+
+
+class IdempotencyRegistry:
+    """
+    In-flight and recently completed executions by idempotency key. Completed
+    executions are kept for IDEMPOTENCY_TTL_SECONDS; the registry holds at most
+    IDEMPOTENCY_MAX_KEYS keys (oldest completed first out).
+    """
+
+    def __init__(self, ttl_seconds: int = 600, max_keys: int = 1000):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self._executions: "OrderedDict[str, IdempotentExecution]" = OrderedDict()
+        self._stats = {"executions": 0, "attached": 0, "replayed": 0, "conflicts": 0}
+
+    @staticmethod
+    def fingerprint(payload: Dict[str, Any]) -> str:
+        body = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+        return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._executions.items()
+                    if e.done and (e.failed or now - e.completed_at > self.ttl_seconds)]:
+            del self._executions[key]
+
+        if len(self._executions) >= self.max_keys:
+            for key in [k for k, e in self._executions.items() if e.done][:len(self._executions) - self.max_keys + 1]:
+                del self._executions[key]
+
+    def reserve(self, scope: str, key: str, payload: Dict[str, Any]) -> Tuple[IdempotentExecution, bool]:
+        """
+        Return (execution, created). created=False means this request is a
+        duplicate and should attach to / replay the returned execution.
+        """
+        self._evict()
+        registry_key = f"{scope}:{key}"
+        fingerprint = self.fingerprint(payload)
+
+        execution = self._executions.get(registry_key)
+        if execution:
+            if execution.fingerprint != fingerprint:
+                self._stats["conflicts"] += 1
+                raise IdempotencyConflict(f"Idempotency-Key '{key}' was already used with a different request body")
+            self._stats["replayed" if execution.done else "attached"] += 1
+            print(f"🔁 IDEMPOTENCY: Duplicate request for {registry_key} - {'replaying result' if execution.done else 'attaching to in-flight execution'}")
+            return execution, False
+
+        execution = IdempotentExecution(fingerprint)
+        self._executions[registry_key] = execution
+        self._stats["executions"] += 1
+        return execution, True
+
+    def get_stats(self) -> Dict[str, Any]:
+        in_flight = sum(1 for e in self._executions.values() if not e.done)
+        return {**self._stats, "keys": len(self._executions), "in_flight": in_flight}
+
+
+# Global instance
+idempotency_registry = IdempotencyRegistry(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_keys=settings.IDEMPOTENCY_MAX_KEYS
+)
@@ -0,0 +1,96 @@
+"""
+LLM Rate Limiter
+
+Process-wide limiter shared by every LLM call site (interactive chat, routing
+and batch execution) so a large batch cannot starve interactive traffic or
+push the deployment past its Azure OpenAI quota.
+
+Two independent limits, both disabled when set to 0:
+- LLM_MAX_CONCURRENCY: maximum number of in-flight completion requests
+- LLM_REQUESTS_PER_MINUTE: token bucket on request starts
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any
+
+from ..config import settings
+
+
+class LLMRateLimiter:
+    """
+    Thread-safe limiter. Agent execution is synchronous and runs in worker
+    threads, so the limiter blocks the calling thread rather than the event loop.
+    """
+
+    def __init__(self, max_concurrency: int = 0, requests_per_minute: int = 0):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+
+        self._lock = threading.Lock()
+        self._tokens = float(requests_per_minute)
+        self._refilled_at = time.monotonic()
+
+        self._in_flight = 0
+        self._total_requests = 0
+        self._total_wait_ms = 0.0
+
+    def _take_token(self):
+        """Block until the requests-per-minute bucket has a token"""
+        if self.requests_per_minute <= 0:
+            return
+
+        rate_per_second = self.requests_per_minute / 60
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    float(self.requests_per_minute),
+                    self._tokens + (now - self._refilled_at) * rate_per_second
+                )
+                self._refilled_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / rate_per_second
+            time.sleep(wait_seconds)
+
+    @contextmanager
+    def slot(self):
+        """Hold one LLM request slot: `with llm_rate_limiter.slot(): client.chat.completions.create(...)`"""
+        started = time.perf_counter()
+        if self._semaphore:
+            self._semaphore.acquire()
+        try:
+            self._take_token()
+            with self._lock:
+                self._in_flight += 1
+                self._total_requests += 1
+                self._total_wait_ms += (time.perf_counter() - started) * 1000
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        finally:
+            if self._semaphore:
+                self._semaphore.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "requests_per_minute": self.requests_per_minute,
+                "in_flight": self._in_flight,
+                "total_requests": self._total_requests,
+                "avg_wait_ms": round(self._total_wait_ms / self._total_requests, 1) if self._total_requests else 0.0
+            }
+
+
+# Global instance
+llm_rate_limiter = LLMRateLimiter(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE
+)
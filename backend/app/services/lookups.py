@@ -0,0 +1,72 @@
+"""
+Cached Lookups
+
+Rows read on every chat turn (saved LLM configs, attached files, active MCP
+servers, tool ids), cached as plain dicts via @cached and invalidated by the
+routers that change them.
+"""
+
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..config import settings
+from ..db import models
+from .memoize import cached
+
+
+def _columns(row, *names: str) -> Dict[str, Any]:
+    return {name: getattr(row, name) for name in names}
+
+
+@cached("llm_config", ttl_seconds=settings.LLM_CONFIG_CACHE_TTL_SECONDS,
+        key=lambda db, config_id: str(config_id),
+        depends_on=lambda db, config_id: [("llm_config", str(config_id))])
+def get_llm_config(db: Session, config_id: str) -> Optional[Dict[str, Any]]:
+    """Saved LLM config columns, or None if it does not exist (kept out of the shared cache tier: may hold an API key)"""
+    config = db.query(models.LLMConfig).filter(models.LLMConfig.id == config_id).first()
+    if not config:
+        return None
+    values = _columns(config, "provider", "model_name", "temperature", "max_tokens", "api_base", "api_key_secret_ref")
+    values["id"] = str(config.id)
+    return values
+
+
+@cached("file", ttl_seconds=3600,
+        key=lambda db, file_id: str(file_id),
+        depends_on=lambda db, file_id: [("file", str(file_id))])
+def get_file_info(db: Session, file_id: str) -> Optional[Dict[str, Any]]:
+    """Attachment metadata in the shape file_processor expects, or None"""
+    file_record = db.query(models.File).filter(models.File.id == file_id).first()
+    if not file_record:
+        return None
+    return {
+        "id": str(file_record.id),
+        "filename": file_record.filename,
+        "url": file_record.url,
+        "path": file_record.url,  # For compatibility
+        "content_type": file_record.content_type,
+        "size": file_record.size
+    }
+
+
+@cached("mcp_server", ttl_seconds=60, key=lambda db: "active", depends_on=["mcp_server"])
+def get_active_mcp_servers(db: Session) -> List[Dict[str, str]]:
+    """Id and name of each MCP server currently marked active"""
+    servers = db.query(models.MCPServer.id, models.MCPServer.name).filter(
+        models.MCPServer.status == models.MCPServerStatus.active
+    ).all()
+    return [{"id": str(server.id), "name": server.name} for server in servers]
+
+
+@cached("tool", ttl_seconds=3600, key=lambda db, tool_name: tool_name, depends_on=["tool"])
+def get_tool_id(db: Session, tool_name: str) -> Optional[str]:
+    """Id of the registered tool with this function name, or None"""
+    tool = db.query(models.Tool.id).filter(models.Tool.name == tool_name).first()
+    return str(tool.id) if tool else None
+
+
+def detached_llm_config(values: Dict[str, Any]) -> models.LLMConfig:
+    """Transient LLMConfig built from get_llm_config's result"""
+    return models.LLMConfig(**{**values, "id": uuid.UUID(values["id"])})
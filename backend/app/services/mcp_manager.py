@@ -13,6 +13,7 @@ import logging
 from datetime import datetime
 from ..db import models
 from .data_processor import create_data_processor
+from .cache_service import cache_service
 
 logger = logging.getLogger(__name__)
 
@@ -76,6 +77,7 @@ class MCPManager:
             server.status = models.MCPServerStatus.active
             server.last_connected_at = datetime.utcnow()
             self.db.commit()
+            cache_service.bump_version("mcp_server", str(server.id))
             
             logger.info(f"✅ Successfully connected to MCP server: {server.name}")
             return True
@@ -85,6 +87,7 @@ class MCPManager:
             server.status = models.MCPServerStatus.error
             server.error_message = str(e)
             self.db.commit()
+            cache_service.bump_version("mcp_server", str(server.id))
             return False
     
     async def _connect_http_server(self, server: models.MCPServer):
@@ -248,6 +251,7 @@ class MCPManager:
                 if server:
                     server.status = models.MCPServerStatus.inactive
                     self.db.commit()
+                    cache_service.bump_version("mcp_server", server_id)
                 
                 logger.info(f"🔌 Disconnected from MCP server: {server_id}")
                 
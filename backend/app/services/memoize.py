@@ -0,0 +1,124 @@
+"""
+Memoization Decorator
+
+@cached wraps a sync or async function so its results live in CacheService:
+keys are derived from the call arguments, concurrent misses for the same key
+run the function once, and results can be tagged with entity versions so
+cache_service.bump_version() invalidates them.
+
+    @cached("llm_config", ttl_seconds=300, depends_on=lambda db, config_id: [("llm_config", config_id)])
+    def get_llm_config(db: Session, config_id: str) -> Optional[dict]:
+        ...
+
+None results are not cached. Return plain data (dicts, ids) rather than ORM
+instances: JSON-serializable results are shared with other workers, and
+detached rows expire on the next commit of the session that loaded them.
+"""
+
+import functools
+import inspect
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from sqlalchemy.orm import Session
+
+from .cache_service import cache_service
+from .routing_cache import stable_digest
+
+
+# Per-key locks for single-flight loading of sync functions, dropped when unused
+_sync_locks: Dict[str, threading.Lock] = {}
+_sync_lock_users: Dict[str, int] = {}
+_sync_locks_guard = threading.Lock()
+
+
+def _argument_digest(args: tuple, kwargs: Dict[str, Any]) -> str:
+    """Stable digest of the call arguments; database sessions are not part of the key"""
+    return stable_digest([
+        [arg for arg in args if not isinstance(arg, Session)],
+        {name: value for name, value in kwargs.items() if not isinstance(value, Session)}
+    ])
+
+
+def cached(
+    namespace: str,
+    ttl_seconds: int = 300,
+    key: Optional[Callable[..., Any]] = None,
+    depends_on: Union[Iterable[Any], Callable[..., Iterable[Any]], None] = None,
+    stale_ttl_seconds: Optional[int] = None
+):
+    """
+    Cache a function's results under `namespace`.
+
+    key: callable taking the function's arguments and returning the key part
+         (default: a digest of all arguments except database sessions).
+    depends_on: entities the result depends on, as accepted by
+         cache_service.versioned_key (e.g. ["agent"] or [("llm_config", id)]),
+         or a callable taking the function's arguments and returning them.
+    stale_ttl_seconds: async functions only, see get_or_set_async.
+    """
+    def decorator(fn):
+        qualified_name = f"{namespace}:{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        def cache_key(*args, **kwargs) -> str:
+            part = key(*args, **kwargs) if key is not None else _argument_digest(args, kwargs)
+            base = f"{qualified_name}:{part}"
+            if depends_on is None:
+                return base
+            dependencies = depends_on(*args, **kwargs) if callable(depends_on) else depends_on
+            return cache_service.versioned_key(base, *dependencies)
+
+        def invalidate(*args, **kwargs):
+            """Drop the cached result for these arguments"""
+            cache_service.delete(cache_key(*args, **kwargs))
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                async def load():
+                    return await fn(*args, **kwargs)
+                return await cache_service.get_or_set_async(
+                    cache_key(*args, **kwargs), load, ttl_seconds,
+                    stale_ttl_seconds=stale_ttl_seconds, negative_ttl_seconds=0
+                )
+            wrapper = async_wrapper
+        else:
+            @functools.wraps(fn)
+            def sync_wrapper(*args, **kwargs):
+                full_key = cache_key(*args, **kwargs)
+                value = cache_service.get(full_key)
+                if value is not None:
+                    return value
+
+                with _sync_locks_guard:
+                    lock = _sync_locks.get(full_key)
+                    if lock is None:
+                        lock = _sync_locks[full_key] = threading.Lock()
+                    _sync_lock_users[full_key] = _sync_lock_users.get(full_key, 0) + 1
+                try:
+                    with lock:
+                        # Another thread may have loaded it while we waited
+                        value = cache_service.get(full_key)
+                        if value is not None:
+                            return value
+                        started_at = time.perf_counter()
+                        value = fn(*args, **kwargs)
+                        load_seconds = time.perf_counter() - started_at
+                        cache_service.record_load(full_key, load_seconds)
+                        if value is not None:
+                            cache_service.set(full_key, value, ttl_seconds, load_seconds=load_seconds)
+                        return value
+                finally:
+                    with _sync_locks_guard:
+                        _sync_lock_users[full_key] -= 1
+                        if not _sync_lock_users[full_key]:
+                            del _sync_lock_users[full_key]
+                            del _sync_locks[full_key]
+            wrapper = sync_wrapper
+
+        wrapper.cache_key = cache_key
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
@@ -1,5 +1,5 @@
 from openai import AzureOpenAI
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from ..db.database import SessionLocal
 from ..db import models
 from ..config import settings
@@ -7,8 +7,15 @@ import uuid
 from datetime import datetime
 import re
 import json
+import asyncio
 from pathlib import Path
-from .cache_service import keyvault_cache
+from .cache_service import keyvault_cache, cache_service
+from .request_timer import get_request_timer
+from .llm_limiter import llm_rate_limiter
+from .trigger_matcher import TriggerMatcher
+from .orchestrator_rules import get_active_rule_engine
+from .lookups import get_file_info
+from .routing_cache import stable_digest
 
 print("=== ORCHESTRATOR MODULE LOADED ===")
 
@@ -80,6 +87,7 @@ def execute_single_agent(agent, message, files, prev_output):
     print(f"📝 Context: {list(prev_output.keys()) if isinstance(prev_output, dict) else 'Not a dict'}")
     print("="*60)
     
+    timer = get_request_timer(prev_output)
     tools = []
     caps = [c.name for c in agent.capabilities]
     
@@ -151,16 +159,16 @@ def execute_single_agent(agent, message, files, prev_output):
                     
                     db = SessionLocal()
                     try:
-                        file_record = db.query(models.File).filter(models.File.id == file_id).first()
-                        if file_record:
-                            print(f"📄 [{agent.name}] Found file record: {file_record.filename}, URL: {file_record.url}")
+                        file_info = get_file_info(db, file_id)
+                        if file_info:
+                            print(f"📄 [{agent.name}] Found file record: {file_info['filename']}, URL: {file_info['url']}")
                             # Call the image analysis tool
-                            analysis_result = image_analysis(str(file_id), file_record.url)
+                            analysis_result = image_analysis(str(file_id), file_info['url'])
                             print(f"🔍 [{agent.name}] Image analysis result: {analysis_result}")
                             if analysis_result.get("success"):
-                                file_analyses.append(f"File {file_record.filename}: {analysis_result['analysis']}")
+                                file_analyses.append(f"File {file_info['filename']}: {analysis_result['analysis']}")
                             else:
-                                file_analyses.append(f"File {file_record.filename}: Analysis failed - {analysis_result.get('error', 'Unknown error')}")
+                                file_analyses.append(f"File {file_info['filename']}: Analysis failed - {analysis_result.get('error', 'Unknown error')}")
                         else:
                             print(f"❌ [{agent.name}] File record not found for ID: {file_id}")
                             file_analyses.append(f"File ID {file_id}: File not found in database")
@@ -247,6 +255,8 @@ def execute_single_agent(agent, message, files, prev_output):
             api_version="2024-02-01"
         )
         
+        timer.start("prompt_building")
+        
         # Build system message
         if agent.system_prompt:
             system_content = agent.system_prompt
@@ -334,9 +344,9 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                     
                     db = SessionLocal()
                     try:
-                        file_record = db.query(models.File).filter(models.File.id == file_id).first()
-                        if file_record and file_record.url.startswith('/uploads/'):
-                            file_path = Path(f"uploads/{file_record.url.split('/')[-1]}")
+                        file_info = get_file_info(db, file_id)
+                        if file_info and file_info['url'].startswith('/uploads/'):
+                            file_path = Path(f"uploads/{file_info['url'].split('/')[-1]}")
                             if file_path.exists():
                                 # Read and encode the image
                                 with open(file_path, "rb") as img_file:
@@ -422,13 +432,16 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
             api_params["max_tokens"] = max_tokens
             api_params["temperature"] = temperature
         
+        timer.stop("prompt_building")
+        
         # Make the API call
         print(f"🚀 [{agent.name}] Calling {model_name} with {len(messages)} messages...")
         print(f"🔍 [{agent.name}] FINAL MESSAGES ARRAY SENT TO LLM:")
         for i, msg in enumerate(messages):
             content_preview = msg.get('content', '')[:100] if msg.get('content') else 'No content'
             print(f"  [{i}] {msg.get('role', 'unknown')}: {content_preview}...")
-        response = client.chat.completions.create(**api_params)
+        with timer.stage("llm"), llm_rate_limiter.slot():
+            response = client.chat.completions.create(**api_params)
         
         # Get the response message
         message_response = response.choices[0].message
@@ -442,6 +455,7 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
         # Execute tool calls if any
         tool_results = []
         if tool_calls:
+            timer.start("tool_calls")
             for tool_call in tool_calls:
                 try:
                     function_name = tool_call.function.name
@@ -495,6 +509,7 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                         "tool_call_id": tool_call.id,
                         "result": {"error": str(e)}
                     })
+            timer.stop("tool_calls")
             
             # If tools were called, we need to continue the conversation with tool results
             if tool_results:
@@ -543,7 +558,8 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                 api_params["messages"] = messages
                 print(f"🔄 [{agent.name}] Making follow-up call with tool results...")
                 
-                final_response = client.chat.completions.create(**api_params)
+                with timer.stage("llm"), llm_rate_limiter.slot():
+                    final_response = client.chat.completions.create(**api_params)
                 final_content = final_response.choices[0].message.content
                 final_tool_calls = final_response.choices[0].message.tool_calls if hasattr(final_response.choices[0].message, 'tool_calls') else None
                 
@@ -564,6 +580,7 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                     
                     # Execute additional tool calls
                     additional_results = []
+                    timer.start("tool_calls")
                     for tool_call in final_tool_calls:
                         try:
                             function_name = tool_call.function.name
@@ -611,6 +628,7 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                                 "tool_call_id": tool_call.id,
                                 "result": {"error": str(e)}
                             })
+                    timer.stop("tool_calls")
                     
                     # Add the assistant message with additional tool calls
                     messages.append({
@@ -655,7 +673,8 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                     
                     # Make another call to get refined response
                     api_params["messages"] = messages
-                    refined_response = client.chat.completions.create(**api_params)
+                    with timer.stage("llm"), llm_rate_limiter.slot():
+                        refined_response = client.chat.completions.create(**api_params)
                     final_content = refined_response.choices[0].message.content
                     final_tool_calls = refined_response.choices[0].message.tool_calls if hasattr(refined_response.choices[0].message, 'tool_calls') else None
                     
@@ -695,6 +714,7 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
 
 async def execute_single_agent_stream(agent, message, files, prev_output):
     """Streaming version of execute_single_agent that yields response chunks"""
+    timer = get_request_timer(prev_output)
     tools = []
     caps = [c.name for c in agent.capabilities]
     
@@ -757,16 +777,16 @@ async def execute_single_agent_stream(agent, message, files, prev_output):
                     
                     db = SessionLocal()
                     try:
-                        file_record = db.query(models.File).filter(models.File.id == file_id).first()
-                        if file_record:
-                            print(f"📄 [{agent.name}] Found file record: {file_record.filename}, URL: {file_record.url}")
+                        file_info = get_file_info(db, file_id)
+                        if file_info:
+                            print(f"📄 [{agent.name}] Found file record: {file_info['filename']}, URL: {file_info['url']}")
                             # Call the image analysis tool
-                            analysis_result = image_analysis(str(file_id), file_record.url)
+                            analysis_result = image_analysis(str(file_id), file_info['url'])
                             print(f"🔍 [{agent.name}] Image analysis result: {analysis_result}")
                             if analysis_result.get("success"):
-                                file_analyses.append(f"File {file_record.filename}: {analysis_result['analysis']}")
+                                file_analyses.append(f"File {file_info['filename']}: {analysis_result['analysis']}")
                             else:
-                                file_analyses.append(f"File {file_record.filename}: Analysis failed - {analysis_result.get('error', 'Unknown error')}")
+                                file_analyses.append(f"File {file_info['filename']}: Analysis failed - {analysis_result.get('error', 'Unknown error')}")
                         else:
                             print(f"❌ [{agent.name}] File record not found for ID: {file_id}")
                             file_analyses.append(f"File ID {file_id}: File not found in database")
@@ -856,6 +876,8 @@ async def execute_single_agent_stream(agent, message, files, prev_output):
             api_version="2024-02-01"
         )
         
+        timer.start("prompt_building")
+        
         # Build system message
         if agent.system_prompt:
             system_content = agent.system_prompt
@@ -943,9 +965,9 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
                     
                     db = SessionLocal()
                     try:
-                        file_record = db.query(models.File).filter(models.File.id == file_id).first()
-                        if file_record and file_record.url.startswith('/uploads/'):
-                            file_path = Path(f"uploads/{file_record.url.split('/')[-1]}")
+                        file_info = get_file_info(db, file_id)
+                        if file_info and file_info['url'].startswith('/uploads/'):
+                            file_path = Path(f"uploads/{file_info['url'].split('/')[-1]}")
                             if file_path.exists():
                                 # Read and encode the image
                                 with open(file_path, "rb") as img_file:
@@ -1031,30 +1053,58 @@ DO NOT give up after one failed attempt. Always try at least 2-3 different appro
             api_params["max_tokens"] = max_tokens
             api_params["temperature"] = temperature
         
+        timer.stop("prompt_building")
+        
         # Make the streaming API call
         print(f"🚀 [{agent.name}] STREAMING: Calling {model_name} with {len(messages)} messages...")
         print(f"🔍 [{agent.name}] STREAMING FINAL MESSAGES ARRAY SENT TO LLM:")
         for i, msg in enumerate(messages):
             content_preview = msg.get('content', '')[:100] if msg.get('content') else 'No content'
             print(f"  [{i}] {msg.get('role', 'unknown')}: {content_preview}...")
-        response = client.chat.completions.create(**api_params)
+        timer.start("llm")
+        timer.start("llm_ttft")
+        # Run the blocking client off the event loop so other streams keep flowing
+        response = await asyncio.to_thread(_create_completion_limited, client, api_params)
         
-        # Stream the response chunks
-        for chunk in response:
+        # Stream the response chunks as they arrive
+        async for chunk in _iterate_in_thread(response):
             try:
                 if hasattr(chunk, 'choices') and len(chunk.choices) > 0:
                     choice = chunk.choices[0]
                     if hasattr(choice, 'delta') and hasattr(choice.delta, 'content') and choice.delta.content is not None:
                         content = choice.delta.content
+                        timer.stop("llm_ttft")
                         yield content
             except Exception as chunk_error:
                 # Log chunk error but continue streaming
                 print(f"Error processing chunk: {chunk_error}")
                 continue
+        timer.stop("llm")
         
     except Exception as e:
         yield f"Error calling LLM: {str(e)}"
 
+def _create_completion_limited(client, api_params: dict):
+    """Start a completion under the shared LLM rate limiter (the slot covers the request, not the stream)"""
+    with llm_rate_limiter.slot():
+        return client.chat.completions.create(**api_params)
+
+async def _iterate_in_thread(iterable):
+    """Iterate a blocking iterator (e.g. an OpenAI stream) from a worker thread"""
+    iterator = iter(iterable)
+    sentinel = object()
+    try:
+        while True:
+            item = await asyncio.to_thread(next, iterator, sentinel)
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        # Release the HTTP stream if the consumer stopped early (e.g. a cancelled speculation)
+        close = getattr(iterable, "close", None)
+        if close:
+            close()
+
 async def _execute_tools_based_on_request(message: str, tools: list, capabilities: list) -> str:
     """Execute tools based on user request and available capabilities"""
     try:
@@ -1573,6 +1623,47 @@ def _execute_tools_based_on_request_sync(message: str, tools: list, capabilities
         print(f"Error in tool execution: {e}")
         return f"Error executing tools: {str(e)}"
 
+def _load_pipeline_plan(db: Session, agent_id: str) -> list:
+    """
+    Load a pipeline as an ordered list of agents (parent first) with llm_config,
+    capabilities and rag_indexes eager-loaded. Plans are cached and detached, so
+    later commits never trigger lazy reloads; the key covers the pipeline steps,
+    every step agent's version (bumped on create/update/delete, including
+    capability and RAG index changes) and the LLM config versions, so editing
+    any of them loads a fresh plan.
+    """
+    child_ids = [row.child_agent_id for row in db.query(models.AgentPipeline.child_agent_id).filter(
+        models.AgentPipeline.parent_agent_id == agent_id
+    ).order_by(models.AgentPipeline.order)]
+    step_ids = [str(step_id) for step_id in [agent_id] + child_ids]
+    
+    cache_key = cache_service.versioned_key(
+        f"pipeline_plan:{agent_id}:{stable_digest(step_ids)}",
+        *[("agent", step_id) for step_id in step_ids],
+        "llm_config"
+    )
+    cached_plan = cache_service.get(cache_key)
+    if cached_plan:
+        return cached_plan
+    
+    agents = db.query(models.Agent).options(
+        joinedload(models.Agent.llm_config),
+        joinedload(models.Agent.capabilities),
+        joinedload(models.Agent.rag_indexes)
+    ).filter(models.Agent.id.in_([agent_id] + child_ids)).all()
+    agents_by_id = {str(a.id): a for a in agents}
+    
+    for a in agents:
+        db.expunge(a)
+    
+    if str(agent_id) not in agents_by_id:
+        return []
+    
+    plan = [agents_by_id[step_id] for step_id in step_ids if step_id in agents_by_id]
+    cache_service.set(cache_key, plan, ttl_seconds=600)
+    return plan
+
+
 def run_agent(agent_id: str, message: str = None, files: list[str] = None, session_id: str = None):
     print(f"=== RUN_AGENT START ===")
     print(f"Agent ID: {agent_id}")
@@ -1581,36 +1672,41 @@ def run_agent(agent_id: str, message: str = None, files: list[str] = None, sessi
     
     db = SessionLocal()
     try:
-        agent = db.query(models.Agent).filter(models.Agent.id == agent_id).first()
-        if not agent:
+        steps = _load_pipeline_plan(db, agent_id)
+        if not steps:
             print("Agent not found")
             return {"error": "Agent not found"}
         
+        agent = steps[0]
         print(f"Agent found: {agent.name}")
         print(f"Agent capabilities: {[c.name for c in agent.capabilities]}")
         
-        # Conversation handling
+        # Conversation handling - nothing is written until the pipeline has finished
+        convo = None
         if session_id:
             convo = db.query(models.Conversation).filter(models.Conversation.id == session_id).first()
-            if not convo:
-                convo = models.Conversation(id=session_id)
-                db.add(convo)
-        else:
-            convo = models.Conversation(id=uuid.uuid4())
-            db.add(convo)
-            session_id = str(convo.id)
-        db.commit()
-        past_msgs = db.query(models.Message).filter(models.Message.conversation_id == convo.id).order_by(models.Message.created_at).all()
-        hist = [{"role": m.role, "content": m.content} for m in past_msgs]
+        new_convo = None
+        if not convo:
+            new_convo = models.Conversation(id=session_id or uuid.uuid4())
+            session_id = str(new_convo.id)
+        
+        # Recent history window only (newest first from the index, then back to chronological)
+        hist = []
+        if convo:
+            past_msgs = db.query(models.Message).filter(
+                models.Message.conversation_id == convo.id
+            ).order_by(models.Message.created_at.desc()).limit(settings.RUN_AGENT_HISTORY_LIMIT).all()
+            hist = [{"role": m.role, "content": m.content} for m in reversed(past_msgs)]
+        
         # Pipeline execution
-        steps = [agent] + [db.query(models.Agent).filter(models.Agent.id == p.child_agent_id).first()
-                           for p in db.query(models.AgentPipeline).filter(models.AgentPipeline.parent_agent_id == agent.id).order_by(models.AgentPipeline.order)]
         output = {"response": message, "attachments": []}
-        run_id = uuid.uuid4()
+        if hist:
+            output["conversation_history"] = hist
+        pipeline_runs = []
         for step in steps:
             print(f"Executing step with agent: {step.name}")
             prun = models.PipelineRun(id=uuid.uuid4(), agent_id=step.id, started_at=datetime.utcnow(), status="running")
-            db.add(prun)
+            pipeline_runs.append(prun)
             try:
                 output = execute_single_agent(step, output["response"], files, output)
                 print(f"Step output: {output}")
@@ -1620,16 +1716,151 @@ def run_agent(agent_id: str, message: str = None, files: list[str] = None, sessi
                 prun.status = "failed"
                 prun.error_message = str(e)
             prun.completed_at = datetime.utcnow()
-            db.commit()
-        # Save conversation
-        db.add(models.Message(conversation_id=convo.id, role="user", content=message))
-        db.add(models.Message(conversation_id=convo.id, role="assistant", content=output["response"], attachments=output["attachments"]))
+        
+        # Save run records and conversation in one transaction
+        conversation_id = convo.id if convo else new_convo.id
+        records = pipeline_runs + [
+            models.Message(conversation_id=conversation_id, role="user", content=message),
+            models.Message(conversation_id=conversation_id, role="assistant", content=output["response"], attachments=output["attachments"])
+        ]
+        if new_convo:
+            records.insert(0, new_convo)
+        db.add_all(records)
         db.commit()
         print(f"=== RUN_AGENT END - Returning: {output} ===")
         return {"session_id": session_id, **output}
     finally:
         db.close()
 
+# Keyword lists used by the default orchestrator to pick a specialist agent
+DIAGRAM_REQUEST_KEYWORDS = [
+    # Flowcharts
+    "create a flowchart", "draw a flowchart", "make a flowchart",
+    "create a flow chart", "draw a flow chart", "make a flow chart",
+    "flowchart", "flow chart",
+    
+    # General diagrams
+    "create a diagram", "draw a diagram", "make a diagram",
+    "create diagram", "draw diagram", "make diagram",
+    "diagram",
+    
+    # Specific diagram types
+    "create a sequence diagram", "draw a sequence diagram",
+    "create a class diagram", "draw a class diagram",
+    "create an er diagram", "draw an er diagram",
+    "create a gantt chart", "draw a gantt chart",
+    "create a pie chart", "draw a pie chart",
+    
+    # Network and architecture diagrams
+    "create a network diagram", "draw a network diagram", "make a network diagram",
+    "create network diagram", "draw network diagram", "make network diagram",
+    "network diagram", "network topology",
+    
+    "create an architecture diagram", "draw an architecture diagram", "make an architecture diagram",
+    "create architecture diagram", "draw architecture diagram", "make architecture diagram",
+    "architecture diagram", "system architecture",
+    
+    # Infrastructure diagrams
+    "create an infrastructure diagram", "draw an infrastructure diagram",
+    "create infrastructure diagram", "draw infrastructure diagram",
+    "infrastructure diagram", "infrastructure",
+    
+    # Any request containing "diagram" or "chart"
+    "diagram", "chart"
+]
+
+IMAGE_REQUEST_KEYWORDS = [
+    "analyze this image", "what's in this image", "describe this image",
+    "explain this image", "what do you see", "analyze the image",
+    "analyse this image", "analyse the image"  # Add British spelling
+]
+
+# Both keyword lists compiled into one automaton: a single pass per message
+_ORCHESTRATOR_REQUEST_MATCHER = TriggerMatcher({
+    "diagram": DIAGRAM_REQUEST_KEYWORDS,
+    "image": IMAGE_REQUEST_KEYWORDS
+})
+
+
+def _select_orchestrator_agent(agents: list, message: str, rules=None):
+    """
+    Pick the agent that should handle an orchestrator request. Routing rules of
+    the active orchestrator config are checked first, then the built-in keywords.
+    
+    Returns:
+        Tuple of (agent, None) or (None, explanation) when no suitable agent is available
+    """
+    if rules:
+        rule_match = rules.match(message, agents)
+        if rule_match:
+            agent, rule = rule_match
+            print(f"Routing rule '{rule.name}' matched - selected agent: {agent.name}")
+            return agent, None
+    
+    request_matches = _ORCHESTRATOR_REQUEST_MATCHER.counts(message.lower())
+    
+    # Check for diagram generation requests
+    if request_matches.get("diagram"):
+        print("Diagram generation request detected")
+        
+        # Find agents with diagram generation capability
+        diagram_agents = [a for a in agents if any(c.name == "diagram_generation" for c in a.capabilities)]
+        
+        if diagram_agents:
+            print(f"Found {len(diagram_agents)} agents with diagram generation capability")
+            # Use the first available diagram agent
+            print(f"Selected agent: {diagram_agents[0].name}")
+            return diagram_agents[0], None
+        
+        return None, "I can help you create diagrams! However, no agents with diagram generation capability are currently available. Please configure an agent with the 'diagram_generation' capability."
+    
+    # Check for image analysis requests
+    if request_matches.get("image"):
+        print("Image analysis request detected")
+        
+        # Find agents with image analysis capability
+        image_agents = [a for a in agents if any(c.name == "image_analysis" for c in a.capabilities)]
+        
+        if image_agents:
+            print(f"Found {len(image_agents)} agents with image analysis capability")
+            # Use the first available image analysis agent
+            print(f"Selected agent: {image_agents[0].name}")
+            return image_agents[0], None
+        
+        return None, "I can help you analyze images! However, no agents with image analysis capability are currently available. Please configure an agent with the 'image_analysis' capability."
+    
+    # Default: use smarter agent selection
+    print("General request - using smart agent selection")
+    
+    # The orchestrator config's default agent, if it is active
+    default_agent = rules.default_agent(agents) if rules else None
+    if default_agent:
+        print(f"Using configured default agent: {default_agent.name}")
+        return default_agent, None
+    
+    # First, try to find an agent with general capabilities
+    general_agents = [a for a in agents if a.name.lower() == "assistant"]
+    if general_agents:
+        print(f"Using Assistant agent: {general_agents[0].name}")
+        return general_agents[0], None
+    
+    # Fall back to first available agent
+    if agents:
+        print(f"Using fallback agent: {agents[0].name}")
+        return agents[0], None
+    
+    return None, "No agents are currently available. Please configure at least one agent."
+
+
+def _load_active_agents(db: Session) -> list:
+    """Load active agents with the relationships agent execution needs"""
+    return db.query(models.Agent).options(
+        joinedload(models.Agent.llm_config),
+        joinedload(models.Agent.capabilities),
+        joinedload(models.Agent.rag_indexes)
+    ).filter(models.Agent.status == "active").all()
+
+
 def run_orchestrator_agent(message: str, files: list[str] = None, session_id: str = None):
     """
     New orchestrator agent that manages all interactions and tool execution.
@@ -1642,140 +1873,25 @@ def run_orchestrator_agent(message: str, files: list[str] = None, session_id: st
     db = SessionLocal()
     try:
         # Get all available agents and their capabilities
-        agents = db.query(models.Agent).filter(models.Agent.status == "active").all()
+        agents = _load_active_agents(db)
         print(f"Available agents: {[a.name for a in agents]}")
         
-        # Analyze the message to determine what tools/capabilities are needed
-        message_lower = message.lower()
-        
-        # Check for diagram generation requests
-        if any(keyword in message_lower for keyword in [
-            # Flowcharts
-            "create a flowchart", "draw a flowchart", "make a flowchart",
-            "create a flow chart", "draw a flow chart", "make a flow chart",
-            "flowchart", "flow chart",
-            
-            # General diagrams
-            "create a diagram", "draw a diagram", "make a diagram",
-            "create diagram", "draw diagram", "make diagram",
-            "diagram",
-            
-            # Specific diagram types
-            "create a sequence diagram", "draw a sequence diagram",
-            "create a class diagram", "draw a class diagram",
-            "create an er diagram", "draw an er diagram",
-            "create a gantt chart", "draw a gantt chart",
-            "create a pie chart", "draw a pie chart",
-            
-            # Network and architecture diagrams
-            "create a network diagram", "draw a network diagram", "make a network diagram",
-            "create network diagram", "draw network diagram", "make network diagram",
-            "network diagram", "network topology",
-            
-            "create an architecture diagram", "draw an architecture diagram", "make an architecture diagram",
-            "create architecture diagram", "draw architecture diagram", "make architecture diagram",
-            "architecture diagram", "system architecture",
-            
-            # Infrastructure diagrams
-            "create an infrastructure diagram", "draw an infrastructure diagram",
-            "create infrastructure diagram", "draw infrastructure diagram",
-            "infrastructure diagram", "infrastructure",
-            
-            # Any request containing "diagram" or "chart"
-            "diagram", "chart"
-        ]):
-            print("Diagram generation request detected")
-            
-            # Find agents with diagram generation capability
-            diagram_agents = [a for a in agents if any(c.name == "diagram_generation" for c in a.capabilities)]
-            
-            if diagram_agents:
-                print(f"Found {len(diagram_agents)} agents with diagram generation capability")
-                # Use the first available diagram agent
-                selected_agent = diagram_agents[0]
-                print(f"Selected agent: {selected_agent.name}")
-                
-                # Execute the diagram generation
-                result = execute_single_agent(selected_agent, message, files, {})
-                return {
-                    "session_id": session_id,
-                    "response": result.get("response", "Diagram generation completed"),
-                    "attachments": result.get("attachments", []),
-                    "tool_calls": result.get("tool_calls", [])
-                }
-            else:
-                return {
-                    "session_id": session_id,
-                    "response": "I can help you create diagrams! However, no agents with diagram generation capability are currently available. Please configure an agent with the 'diagram_generation' capability.",
-                    "attachments": [],
-                    "tool_calls": []
-                }
-        
-        # Check for image analysis requests
-        elif any(keyword in message_lower for keyword in [
-            "analyze this image", "what's in this image", "describe this image",
-            "explain this image", "what do you see", "analyze the image",
-            "analyse this image", "analyse the image"  # Add British spelling
-        ]):
-            print("Image analysis request detected")
-            
-            # Find agents with image analysis capability
-            image_agents = [a for a in agents if any(c.name == "image_analysis" for c in a.capabilities)]
-            
-            if image_agents:
-                print(f"Found {len(image_agents)} agents with image analysis capability")
-                # Use the first available image analysis agent
-                selected_agent = image_agents[0]
-                print(f"Selected agent: {selected_agent.name}")
-                
-                # Execute the image analysis
-                result = execute_single_agent(selected_agent, message, files, {})
-                return {
-                    "session_id": session_id,
-                    "response": result.get("response", "Image analysis completed"),
-                    "attachments": result.get("attachments", []),
-                    "tool_calls": result.get("tool_calls", [])
-                }
-            else:
-                return {
-                    "session_id": session_id,
-                    "response": "I can help you analyze images! However, no agents with image analysis capability are currently available. Please configure an agent with the 'image_analysis' capability.",
-                    "attachments": [],
-                    "tool_calls": []
-                }
-        
-        # Default: use smarter agent selection
-        else:
-            print("General request - using smart agent selection")
-            
-            # Try to find the best agent for the request
-            selected_agent = None
-            
-            # First, try to find an agent with general capabilities
-            general_agents = [a for a in agents if a.name.lower() == "assistant"]
-            if general_agents:
-                selected_agent = general_agents[0]
-                print(f"Using Assistant agent: {selected_agent.name}")
-            else:
-                # Fall back to first available agent
-                if agents:
-                    selected_agent = agents[0]
-                    print(f"Using fallback agent: {selected_agent.name}")
-                else:
-                    return {
-                        "session_id": session_id,
-                        "response": "No agents are currently available. Please configure at least one agent.",
-                        "attachments": [],
-                        "tool_calls": []
-                    }
-            
-            result = execute_single_agent(selected_agent, message, files, {})
+        selected_agent, unavailable_message = _select_orchestrator_agent(agents, message, get_active_rule_engine(db))
+        if not selected_agent:
             return {
                 "session_id": session_id,
-                "response": result.get("response", "Request processed"),
-                "attachments": result.get("attachments", []),
-                "tool_calls": result.get("tool_calls", [])
+                "response": unavailable_message,
+                "attachments": [],
+                "tool_calls": []
             }
+        
+        result = execute_single_agent(selected_agent, message, files, {})
+        return {
+            "session_id": session_id,
+            "response": result.get("response", "Request processed"),
+            "attachments": result.get("attachments", []),
+            "tool_calls": result.get("tool_calls", [])
+        }
     
     except Exception as e:
         print(f"Error in orchestrator agent: {e}")
@@ -1789,6 +1905,37 @@ def run_orchestrator_agent(message: str, files: list[str] = None, session_id: st
         db.close()
 
 
+async def run_orchestrator_agent_stream(message: str, files: list[str] = None, session_id: str = None):
+    """
+    Streaming version of run_orchestrator_agent.
+    Selects the agent the same way and yields the selected agent's model tokens
+    as they arrive, so time-to-first-token is the model's own TTFT.
+    """
+    print(f"=== ORCHESTRATOR AGENT STREAM START ===")
+    print(f"Message: {message}")
+    print(f"Files: {files}")
+    
+    db = SessionLocal()
+    try:
+        agents = await asyncio.to_thread(_load_active_agents, db)
+        rules = await asyncio.to_thread(get_active_rule_engine, db)
+        print(f"Available agents: {[a.name for a in agents]}")
+        
+        selected_agent, unavailable_message = _select_orchestrator_agent(agents, message, rules)
+        if not selected_agent:
+            yield unavailable_message
+            return
+        
+        async for chunk in execute_single_agent_stream(selected_agent, message, files or [], {"attachments": [], "response": ""}):
+            yield chunk
+    
+    except Exception as e:
+        print(f"Error in orchestrator agent stream: {e}")
+        yield f"An error occurred while processing your request: {str(e)}"
+    finally:
+        db.close()
+
+
 def _check_for_unfulfilled_promises(response: str, agent_name: str) -> bool:
     """Check if agent response contains promises to execute tools without actually executing them"""
     
@@ -1860,7 +2007,8 @@ Execute the tools NOW and provide the actual results.
         print(f"🔧 [{agent_name}] Forcing tool execution with correction prompt")
         
         # Make the correction call
-        correction_response = client.chat.completions.create(**correction_params)
+        with llm_rate_limiter.slot():
+            correction_response = client.chat.completions.create(**correction_params)
         correction_content = correction_response.choices[0].message.content
         correction_tool_calls = correction_response.choices[0].message.tool_calls if hasattr(correction_response.choices[0].message, 'tool_calls') else None
         
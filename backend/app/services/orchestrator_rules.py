@@ -0,0 +1,115 @@
+"""
+Orchestrator Rule Engine
+
+Compiles the routing rules of the active OrchestratorConfig (keyword, regex
+and capability predicates) once, and picks the orchestrator's agent without
+any LLM call. The compiled engine is cached until the config is edited.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import settings
+from ..db import models
+from .cache_service import cache_service
+from .trigger_matcher import TriggerMatcher
+
+
+ACTIVE_RULES_CACHE_KEY = "orchestrator_rules:active"
+# Bumped on every config change; the version token is shared by all worker processes
+VERSION_ENTITY = "orchestrator_config"
+
+
+def _rule_field(rule: Any, name: str, default: Any = None) -> Any:
+    """Rules are stored as dicts, but may still be schema objects before a reload"""
+    if isinstance(rule, dict):
+        return rule.get(name, default)
+    return getattr(rule, name, default)
+
+
+class CompiledRule:
+    """One routing rule with its predicates compiled"""
+
+    def __init__(self, rule: Any, position: int):
+        self.name = _rule_field(rule, 'name') or f"rule {position + 1}"
+        self.priority = _rule_field(rule, 'priority', 1) or 1
+        self.keywords = [str(k).lower() for k in (_rule_field(rule, 'keywords') or []) if str(k).strip()]
+        self.patterns = []
+        for pattern in _rule_field(rule, 'patterns') or []:
+            try:
+                self.patterns.append(re.compile(pattern, re.IGNORECASE))
+            except re.error as e:
+                print(f"⚠️ ORCHESTRATOR RULES: Skipping invalid pattern {pattern!r} in rule '{self.name}': {e}")
+        self.capabilities = frozenset(_rule_field(rule, 'agent_capabilities') or [])
+        self.fallback_agent_id = _rule_field(rule, 'fallback_agent_id')
+
+    def matches_pattern(self, message: str) -> bool:
+        return any(pattern.search(message) for pattern in self.patterns)
+
+
+class OrchestratorRuleEngine:
+    """Routing rules of one OrchestratorConfig, checked in priority order"""
+
+    def __init__(self, routing_rules: List[Any] = None, default_agent_id: Optional[str] = None, config_name: str = None):
+        self.config_name = config_name
+        self.default_agent_id = str(default_agent_id) if default_agent_id else None
+        rules = [CompiledRule(rule, i) for i, rule in enumerate(routing_rules or [])]
+        # Higher priority first; equal priorities keep their configured order
+        self.rules = sorted(rules, key=lambda r: -r.priority)
+        # Keywords of every rule in one matcher: a single scan per message
+        self._keywords = TriggerMatcher({i: rule.keywords for i, rule in enumerate(self.rules)})
+
+    @classmethod
+    def from_config(cls, config: Optional[models.OrchestratorConfig]) -> "OrchestratorRuleEngine":
+        if not config:
+            return cls()
+        return cls(config.routing_rules, config.default_agent_id, config.name)
+
+    def match(self, message: str, agents: list) -> Optional[Tuple[Any, CompiledRule]]:
+        """(agent, rule) for the first matching rule that has a suitable agent, else None"""
+        if not self.rules:
+            return None
+        keyword_hits = self._keywords.counts(message.lower())
+        by_id = None
+        for i, rule in enumerate(self.rules):
+            if not keyword_hits.get(i) and not rule.matches_pattern(message):
+                continue
+
+            for agent in agents:
+                if rule.capabilities <= {c.name for c in agent.capabilities}:
+                    return agent, rule
+
+            if rule.fallback_agent_id:
+                by_id = by_id or {str(a.id): a for a in agents}
+                fallback = by_id.get(str(rule.fallback_agent_id))
+                if fallback:
+                    return fallback, rule
+            print(f"⚠️ ORCHESTRATOR RULES: Rule '{rule.name}' matched but no agent has {sorted(rule.capabilities)}")
+        return None
+
+    def default_agent(self, agents: list):
+        if not self.default_agent_id:
+            return None
+        return next((a for a in agents if str(a.id) == self.default_agent_id), None)
+
+
+def get_active_rule_engine(db) -> OrchestratorRuleEngine:
+    """
+    Engine for the active (most recently updated) OrchestratorConfig, compiled
+    once and cached until a config is created, edited or deleted.
+    """
+    cache_key = cache_service.versioned_key(ACTIVE_RULES_CACHE_KEY, VERSION_ENTITY)
+    engine = cache_service.get(cache_key)
+    if engine:
+        return engine
+
+    config = db.query(models.OrchestratorConfig).order_by(models.OrchestratorConfig.updated_at.desc()).first()
+    engine = OrchestratorRuleEngine.from_config(config)
+    cache_service.set(cache_key, engine, ttl_seconds=settings.ORCHESTRATOR_RULES_TTL_SECONDS)
+    print(f"📐 ORCHESTRATOR RULES: Compiled {len(engine.rules)} rules from '{engine.config_name or 'no config'}'")
+    return engine
+
+
+def invalidate_orchestrator_rules():
+    """Invalidation hook for the orchestrator config router (in every worker process)"""
+    cache_service.bump_version(VERSION_ENTITY)
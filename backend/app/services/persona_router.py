@@ -5,7 +5,10 @@ Handles intent detection and persona selection for multi-persona agents.
 Enhanced with shared memory for better context-aware routing decisions.
 """
 
+import asyncio
 import re
+import threading
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 from ..db import models
@@ -14,16 +17,20 @@ from ..config import settings
 from openai import AzureOpenAI
 from .shared_memory import shared_memory_service
 from .cache_service import cache_service
+from .llm_limiter import llm_rate_limiter
+from .trigger_matcher import trigger_matcher_cache
+from .vector_router import vector_router
+from .routing_cache import routing_cache
+from .agent_profile_index import agent_profile_index
+from .session_routing_state import session_routing_state
+from .lookups import get_llm_config, detached_llm_config
 
 
 class PersonaRouter:
     """Service for routing user inputs to appropriate personas based on intent detection."""
     
     def __init__(self):
-        # Cache for Azure Key Vault secrets to avoid repeated expensive calls
-        self._keyvault_cache = {}
-        self._llm_client_cache = {}
-        self._routing_decision_cache = {}  # Cache routing decisions
+        # Key Vault secrets, LLM configs and clients are cached in cache_service
         self.client = None
         print(f"🎭 PERSONA ROUTER: Initializing PersonaRouter...")
         print(f"🔑 PERSONA ROUTER: API Key available: {bool(settings.AZURE_OPENAI_API_KEY)}")
@@ -68,24 +75,29 @@ class PersonaRouter:
         # PERFORMANCE OPTIMIZATION: Skip session context lookup to avoid DB overhead  
         session_context = None
         
-        # Quick cache check for recent similar inputs
-        input_hash = hash(user_input.lower())
-        persona_ids = sorted([p.get('id') for p in personas if p.get('id')])
-        quick_cache_key = f"intent:{input_hash}:{hash(str(persona_ids))}"
+        # Quick cache check for recent similar inputs (stable key over input and persona triggers)
+        quick_cache_key = routing_cache.key("intent", user_input, {
+            'method': method,
+            'threshold': confidence_threshold,
+            'personas': [[p.get('id'), p.get('name'), p.get('triggers', [])] for p in personas]
+        })
         
-        cached_intent = cache_service.get(quick_cache_key)
+        cached_intent = routing_cache.get(quick_cache_key)
         if cached_intent:
             print(f"⚡ PERSONA ROUTER: Using cached intent detection result")
             return cached_intent.get('persona_id'), cached_intent.get('confidence', 0.0)
         
         if method == "keywords":
-            return self._keyword_intent_detection(user_input, personas, confidence_threshold, session_context)
+            result = self._keyword_intent_detection(user_input, personas, confidence_threshold, session_context)
         elif method == "llm":
-            return self._llm_intent_detection(user_input, personas, confidence_threshold, session_context)
+            result = self._llm_intent_detection(user_input, personas, confidence_threshold, session_context)
         elif method == "hybrid":
-            return self._hybrid_intent_detection(user_input, personas, confidence_threshold, session_context)
+            result = self._hybrid_intent_detection(user_input, personas, confidence_threshold, session_context)
         else:
             raise ValueError(f"Unknown intent detection method: {method}")
+        
+        routing_cache.set(quick_cache_key, {'persona_id': result[0], 'confidence': result[1]})
+        return result
     
     def _keyword_intent_detection(
         self, 
@@ -121,28 +133,29 @@ class PersonaRouter:
                             print(f"🔗 PERSONA ROUTER: Continuation detected, preferring recent agent '{last_agent_name}'")
                             return persona['id'], 0.8  # High confidence for continuations
         
-        for persona in personas:
+        # One pass over the input for all personas' triggers (automaton cached per trigger config)
+        matcher = trigger_matcher_cache.get({i: persona.get('triggers') or [] for i, persona in enumerate(personas)})
+        input_matches = matcher.counts(user_input_lower)
+        exact_input_matches = matcher.exact_counts(user_input_lower)
+        
+        # Also check conversation context for trigger words if available
+        context_matches = {}
+        if session_context and session_context.get('conversation_history'):
+            recent_text = ' '.join([msg['content'] for msg in session_context.get('conversation_history', [])[-2:]])
+            context_matches = matcher.counts(recent_text.lower())
+        
+        for i, persona in enumerate(personas):
             triggers = persona.get('triggers', [])
             if not triggers:
                 continue
-                
-            # Count keyword matches
-            matches = sum(1 for trigger in triggers if trigger.lower() in user_input_lower)
-            
-            # Also check conversation context for trigger words if available
-            context_matches = 0
-            if session_context and session_context.get('conversation_history'):
-                recent_text = ' '.join([msg['content'] for msg in session_context.get('conversation_history', [])[-2:]])
-                context_matches = sum(1 for trigger in triggers if trigger.lower() in recent_text.lower())
             
-            total_matches = matches + (context_matches * 0.3)  # Weight context matches less
+            total_matches = input_matches.get(i, 0) + (context_matches.get(i, 0) * 0.3)  # Weight context matches less
             
             if total_matches > 0:
                 # Calculate confidence based on match ratio and specificity
                 confidence = min(total_matches / len(triggers), 1.0)
                 # Boost confidence for exact matches
-                exact_matches = sum(1 for trigger in triggers if trigger.lower() == user_input_lower)
-                if exact_matches > 0:
+                if exact_input_matches.get(i, 0) > 0:
                     confidence = min(confidence + 0.3, 1.0)
                 
                 persona_scores.append((persona['id'], confidence))
@@ -153,17 +166,7 @@ class PersonaRouter:
         # Return the persona with highest confidence
         best_persona, best_confidence = max(persona_scores, key=lambda x: x[1])
         
-        # Cache the intent detection result for future similar inputs (5 minutes TTL)
-        result = (best_persona if best_confidence >= confidence_threshold else None, best_confidence)
-        try:
-            cache_service.set(quick_cache_key, {
-                'persona_id': result[0],
-                'confidence': result[1]
-            }, ttl_seconds=300)
-        except Exception as e:
-            print(f"⚠️ Failed to cache intent detection: {e}")
-        
-        return result
+        return (best_persona if best_confidence >= confidence_threshold else None, best_confidence)
     
     def _llm_intent_detection(
         self, 
@@ -217,15 +220,19 @@ If no persona is clearly appropriate, respond with:
 none:0.0"""
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",  # Use a fast model for intent detection
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                max_tokens=50,
-                temperature=0.1
-            )
+            with llm_rate_limiter.slot():
+                # No client retries: each retry would wait another full timeout past the routing deadline
+                response = self.client.with_options(
+                    max_retries=0, timeout=settings.ROUTING_LLM_TIMEOUT_SECONDS
+                ).chat.completions.create(
+                    model="gpt-4",  # Use a fast model for intent detection
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_input}
+                    ],
+                    max_tokens=50,
+                    temperature=0.1
+                )
             
             result = response.choices[0].message.content.strip()
             
@@ -310,12 +317,47 @@ none:0.0"""
         print("🎭 PERSONA ROUTER AGENT SELECTION")
         print("="*60)
         
-        # Create cache key for routing decisions
-        agent_ids = sorted([agent['id'] for agent in connected_agents])
-        cache_key = f"routing:{hash(user_input.lower())}:{hash(str(agent_ids))}"
+        intents = persona_router_config.get('intents', {})
+        confidence_threshold = intents.get('confidenceThreshold', 0.7)
         
-        # Check cache first for similar routing decisions (10 minute TTL)
-        cached_result = cache_service.get(cache_key)
+        # Continuation turns stay on the session's current agent (in-memory, no DB or LLM call)
+        if (session_id and connected_agents and intents.get('sessionRouting', settings.SESSION_ROUTING_STICKY)
+                and session_routing_state.continuation_reason(session_id, user_input)):
+            # Any trigger keyword of another agent means the user is switching topics
+            competing_agent, _ = self.keyword_candidate(user_input, persona_router_config, connected_agents, 0.0)
+            if not competing_agent and len(connected_agents) > 1:
+                # So does a clear vector match for another agent (a topic switch without trigger words)
+                try:
+                    vector_choice = vector_router.route(
+                        user_input, connected_agents, workflow_nodes, workflow_connections,
+                        min_margin=intents.get('vectorMinMargin')
+                    )
+                    competing_agent = vector_choice['agent'] if vector_choice else None
+                except Exception as e:
+                    print(f"⚠️ PERSONA ROUTER: Vector check of the session's agent failed: {e}")
+            sticky_result = session_routing_state.sticky_route(
+                session_id, user_input, connected_agents, competing_agent['id'] if competing_agent else None
+            )
+            if sticky_result:
+                return sticky_result
+        
+        # Stable cache key over the normalized input and everything that affects the decision
+        agent_ids = {agent['id'] for agent in connected_agents}
+        cache_key = routing_cache.key("agent", user_input, {
+            'intents': persona_router_config.get('intents', {}),
+            'mappings': persona_router_config.get('agentIntentMappings', {}),
+            'agents': [
+                [a['id'], a['data'].get('name'), a['data'].get('databaseId'), a['data'].get('systemPrompt', '')]
+                for a in connected_agents
+            ],
+            'edges': sorted(
+                [c.get('source'), c.get('target')] for c in (workflow_connections or [])
+                if c.get('source') in agent_ids or c.get('target') in agent_ids
+            )
+        })
+        
+        # Check cache first for similar routing decisions
+        cached_result = routing_cache.get(cache_key)
         if cached_result:
             print(f"⚡ PERSONA ROUTER: Using cached routing decision")
             # Verify the cached agent still exists in connected_agents
@@ -330,19 +372,33 @@ none:0.0"""
             print("❌ PERSONA ROUTER: No connected agents available")
             raise ValueError("No connected agents available")
         
-        intents = persona_router_config.get('intents', {})
         method = intents.get('method', 'hybrid')
-        confidence_threshold = intents.get('confidenceThreshold', 0.7)
         
         print(f"⚙️ PERSONA ROUTER: Method: {method}, Threshold: {confidence_threshold}")
         print(f"🤖 PERSONA ROUTER: Connected agents: {len(connected_agents)}")
         
+        # Vector similarity first: the LLM router is only called when the top two agents are too close
+        result = None
+        use_vector_routing = method == 'vector' or (
+            method == 'hybrid' and intents.get('vectorRouting', settings.PERSONA_ROUTER_VECTOR)
+        )
+        if use_vector_routing and len(connected_agents) > 1:
+            try:
+                result = vector_router.route(
+                    user_input, connected_agents, workflow_nodes, workflow_connections,
+                    min_margin=intents.get('vectorMinMargin')
+                )
+            except Exception as e:
+                print(f"⚠️ PERSONA ROUTER: Vector routing failed, falling back: {e}")
+        
         # Check if we should use system prompt-based routing
         # Try to use workflow LLM if available, fallback to instance LLM client
         has_llm_access = self.client or persona_router_config.get("_llm_node")
-        use_system_prompt_routing = method in ['llm', 'hybrid'] and has_llm_access
+        use_system_prompt_routing = method in ['llm', 'hybrid', 'vector'] and has_llm_access
         
-        if use_system_prompt_routing:
+        if result:
+            print(f"⚡ PERSONA ROUTER: Vector routing was decisive - skipping LLM router call")
+        elif use_system_prompt_routing:
             print(f"🧠 PERSONA ROUTER: Using system prompt-based routing")
             result = self._system_prompt_based_routing(
                 user_input, connected_agents, persona_router_config, confidence_threshold, workflow_nodes, workflow_connections, session_id
@@ -350,12 +406,13 @@ none:0.0"""
         else:
             print(f"🔑 PERSONA ROUTER: Using trigger-based routing (LLM not available: method={method}, has_llm={has_llm_access})")
             result = self._trigger_based_routing(
-                user_input, persona_router_config, connected_agents, method, confidence_threshold, session_id
+                user_input, persona_router_config, connected_agents,
+                'keywords' if method == 'vector' else method, confidence_threshold, session_id
             )
         
-        # Cache the routing decision for future similar inputs (10 minutes TTL)
+        # Cache the routing decision for future similar inputs
         try:
-            cache_service.set(cache_key, result, ttl_seconds=600)
+            routing_cache.set(cache_key, result)
             print(f"💾 PERSONA ROUTER: Cached routing decision for similar future inputs")
         except Exception as e:
             print(f"⚠️ PERSONA ROUTER: Failed to cache routing decision: {e}")
@@ -429,9 +486,9 @@ none:0.0"""
             
             tools_text = f"Tools: {'; '.join(tool_descriptions)}" if tool_descriptions else "Tools: None"
             
-            # PERFORMANCE OPTIMIZATION: Skip routing summary lookup to avoid multiple DB calls
-            routing_summary = None
-            print(f"⚡ [{i+1}] Agent: '{name}' - Using system prompt (routing summary disabled for performance)")
+            # Routing summary from the in-memory agent profile index (no DB call)
+            routing_summary = agent_profile_index.get_summary(agent_db_id)
+            print(f"⚡ [{i+1}] Agent: '{name}' - {'Using routing summary' if routing_summary else 'No routing summary available'}")
             
             # Build description using routing summary if available, otherwise fall back to system prompt
             if routing_summary:
@@ -500,7 +557,6 @@ Choose the agent whose capabilities best align with the user's needs."""
             try:
                 # Create a temporary LLM client using workflow's LLM configuration
                 from openai import AzureOpenAI
-                from ..config import settings
                 
                 # Get LLM config data - use the same logic as workflow execution
                 llm_data = llm_node.get("data", {})
@@ -512,22 +568,16 @@ Choose the agent whose capabilities best align with the user's needs."""
                 
                 if saved_config_id:
                     print(f"🗄️ PERSONA ROUTER: Loading saved LLM config: {saved_config_id}")
-                    # Use cached or fetch saved LLM config from database
-                    cache_key = f"llm_config_{saved_config_id}"
-                    if cache_key in self._llm_client_cache:
-                        temp_llm_config = self._llm_client_cache[cache_key]
-                        print(f"⚡ PERSONA ROUTER: Using cached LLM config")
+                    # Cached, tagged with the config's version: edits in the LLM config router invalidate it
+                    db = SessionLocal()
+                    try:
+                        saved_llm_config = get_llm_config(db, saved_config_id)
+                    finally:
+                        db.close()
+                    if saved_llm_config:
+                        temp_llm_config = detached_llm_config(saved_llm_config)
                     else:
-                        db = SessionLocal()
-                        try:
-                            temp_llm_config = db.query(models.LLMConfig).filter(models.LLMConfig.id == saved_config_id).first()
-                            if temp_llm_config:
-                                self._llm_client_cache[cache_key] = temp_llm_config
-                                print(f"✅ PERSONA ROUTER: Found and cached LLM config")
-                            else:
-                                print(f"❌ PERSONA ROUTER: Saved LLM config {saved_config_id} not found")
-                        finally:
-                            db.close()
+                        print(f"❌ PERSONA ROUTER: Saved LLM config {saved_config_id} not found")
                 else:
                     print(f"📝 PERSONA ROUTER: No saved config ID, creating temporary config")
                     # Create a temporary LLM config from the workflow node data
@@ -580,9 +630,10 @@ Choose the agent whose capabilities best align with the user's needs."""
                         print(f"   azure_endpoint: {api_base}")
                         print(f"   api_version: 2024-02-01")
                         # Check if we already have a cached client for this configuration
+                        llm_client_cache = cache_service.namespace("llm_client")
                         client_cache_key = f"{api_base}_{model_to_use}_{api_key[:10] if api_key else 'none'}"
-                        if client_cache_key in self._llm_client_cache:
-                            client_to_use = self._llm_client_cache[client_cache_key]
+                        client_to_use = llm_client_cache.get(client_cache_key)
+                        if client_to_use:
                             print(f"⚡ PERSONA ROUTER: Using cached LLM client")
                         else:
                             try:
@@ -596,7 +647,7 @@ Choose the agent whose capabilities best align with the user's needs."""
                                     http_client=http_client
                                 )
                                 # Cache the client for future use
-                                self._llm_client_cache[client_cache_key] = client_to_use
+                                llm_client_cache.set(client_cache_key, client_to_use, ttl_seconds=settings.LLM_CONFIG_CACHE_TTL_SECONDS)
                                 print(f"✅ PERSONA ROUTER: Workflow LLM client created and cached successfully")
                             except Exception as client_error:
                                 print(f"❌ PERSONA ROUTER: AzureOpenAI client creation failed: {client_error}")
@@ -634,7 +685,10 @@ Choose the agent whose capabilities best align with the user's needs."""
             else:
                 api_params["max_tokens"] = 50
             
-            response = client_to_use.chat.completions.create(**api_params)
+            with llm_rate_limiter.slot():
+                response = client_to_use.with_options(
+                    max_retries=0, timeout=settings.ROUTING_LLM_TIMEOUT_SECONDS
+                ).chat.completions.create(**api_params)
             
             result = response.choices[0].message.content.strip()
             print(f"📝 PERSONA ROUTER: LLM response: {result}")
@@ -812,6 +866,79 @@ Choose the agent whose capabilities best align with the user's needs."""
             'reasoning': f"Matched trigger keywords for '{selected_agent_name}' (confidence: {confidence})"
         }
     
+    def keyword_candidate(
+        self,
+        user_input: str,
+        persona_router_config: Dict[str, Any],
+        connected_agents: List[Dict[str, Any]],
+        min_confidence: float
+    ) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        Best connected agent by trigger keywords alone (no LLM call), used to pick
+        a speculative candidate. Returns (agent_node, confidence) or (None, 0.0).
+        """
+        agent_intent_mappings = persona_router_config.get('agentIntentMappings', {})
+        agent_personas = []
+        for agent in connected_agents:
+            triggers = agent_intent_mappings.get(agent['id'], {}).get('triggers', [])
+            triggers = [trigger for trigger in triggers if trigger]
+            if triggers:
+                agent_personas.append({
+                    'id': agent['id'],
+                    'name': agent['data'].get('name', 'Unnamed Agent'),
+                    'triggers': triggers
+                })
+        
+        if not agent_personas:
+            return None, 0.0
+        
+        agent_id, confidence = self._keyword_intent_detection(user_input, agent_personas, min_confidence)
+        candidate = next((a for a in connected_agents if a['id'] == agent_id), None) if agent_id else None
+        return candidate, confidence if candidate else 0.0
+    
+    def fast_route(
+        self,
+        user_input: str,
+        persona_router_config: Dict[str, Any],
+        connected_agents: List[Dict[str, Any]],
+        workflow_nodes: List[Dict[str, Any]] = None,
+        workflow_connections: List[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Confident answer from the keyword or vector router alone (no LLM call),
+        used when the LLM router misses its deadline. None if neither is confident.
+        """
+        candidate, confidence = self.keyword_candidate(
+            user_input, persona_router_config, connected_agents, settings.ROUTING_DEADLINE_MIN_CONFIDENCE
+        )
+        if candidate:
+            agent_name = candidate['data'].get('name', 'Unnamed Agent')
+            return {
+                'agent': candidate,
+                'agent_id': candidate['id'],
+                'confidence': confidence,
+                'method': 'deadline_keywords',
+                'fallback_used': True,
+                'reasoning': f"Router missed its deadline; trigger keywords matched '{agent_name}' (confidence: {confidence:.2f})"
+            }
+        
+        try:
+            result = vector_router.route(
+                user_input, connected_agents, workflow_nodes, workflow_connections,
+                min_margin=settings.ROUTING_DEADLINE_VECTOR_MIN_MARGIN
+            )
+        except Exception as e:
+            print(f"⚠️ PERSONA ROUTER: Vector fallback failed: {e}")
+            result = None
+        if result:
+            return {
+                **result,
+                'method': 'deadline_vector_similarity',
+                'fallback_used': True,
+                'reasoning': f"Router missed its deadline; {result['reasoning']}"
+            }
+        return None
+    
     def _get_agent_connected_tools(
         self, 
         agent_id: str, 
@@ -892,7 +1019,95 @@ def route_to_agent(
     Returns:
         Routing result with selected agent and metadata
     """
-    return persona_router.select_agent(user_input, persona_router_config, connected_agents, workflow_nodes, workflow_connections, session_id)
+    result = persona_router.select_agent(user_input, persona_router_config, connected_agents, workflow_nodes, workflow_connections, session_id)
+    session_routing_state.record(session_id, user_input, result, connected_agents)
+    return result
+
+
+class RoutingDeadlineStats:
+    """How often routing met its deadline, fell back, or ran late without a confident fallback"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.within_deadline = 0
+        self.deadline_fallbacks = 0
+        self.late_decisions = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, outcome: str, routing_ms: float):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.total_ms += routing_ms
+            self.max_ms = max(self.max_ms, routing_ms)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.within_deadline + self.deadline_fallbacks + self.late_decisions
+            return {
+                "deadline_ms": settings.ROUTING_DEADLINE_MS,
+                "within_deadline": self.within_deadline,
+                "deadline_fallbacks": self.deadline_fallbacks,
+                "late_decisions": self.late_decisions,
+                "timeout_rate": round((self.deadline_fallbacks + self.late_decisions) / total, 3) if total else 0.0,
+                "avg_routing_ms": round(self.total_ms / total, 1) if total else 0.0,
+                "max_routing_ms": round(self.max_ms, 1)
+            }
+
+
+routing_deadline_stats = RoutingDeadlineStats()
+
+
+async def route_to_agent_async(
+    user_input: str, 
+    persona_router_config: Dict[str, Any], 
+    connected_agents: List[Dict[str, Any]],
+    workflow_nodes: List[Dict[str, Any]] = None,
+    workflow_connections: List[Dict[str, Any]] = None,
+    session_id: str = None
+) -> Dict[str, Any]:
+    """
+    route_to_agent under a latency budget (ROUTING_DEADLINE_MS, per-router
+    `intents.routingDeadlineMs`). The full router runs in a worker thread; if it
+    has not decided by the deadline and the keyword or vector router has a
+    confident answer, that answer is used. The late decision still completes in
+    the background and lands in the routing cache for the next request. The
+    session's routing state records the agent that actually answers.
+    """
+    deadline_ms = persona_router_config.get('intents', {}).get('routingDeadlineMs', settings.ROUTING_DEADLINE_MS)
+    started_at = time.perf_counter()
+    routing = asyncio.ensure_future(asyncio.to_thread(
+        persona_router.select_agent, user_input, persona_router_config, connected_agents, workflow_nodes, workflow_connections, session_id
+    ))
+    
+    if deadline_ms and deadline_ms > 0:
+        try:
+            result = await asyncio.wait_for(asyncio.shield(routing), timeout=deadline_ms / 1000)
+            routing_deadline_stats.record("within_deadline", (time.perf_counter() - started_at) * 1000)
+            session_routing_state.record(session_id, user_input, result, connected_agents)
+            return result
+        except asyncio.TimeoutError:
+            fallback = await asyncio.to_thread(
+                persona_router.fast_route, user_input, persona_router_config, connected_agents, workflow_nodes, workflow_connections
+            )
+            if fallback and not routing.done():
+                routing_ms = (time.perf_counter() - started_at) * 1000
+                routing_deadline_stats.record("deadline_fallbacks", routing_ms)
+                print(f"⏱️ PERSONA ROUTER: Deadline of {deadline_ms}ms passed - using {fallback['method']} answer '{fallback['agent']['data'].get('name', 'Unnamed Agent')}'")
+                result = {**fallback, 'deadline_exceeded': True, 'routing_ms': round(routing_ms, 1)}
+                session_routing_state.record(session_id, user_input, result, connected_agents)
+                return result
+            if not routing.done():
+                print(f"⏱️ PERSONA ROUTER: Deadline of {deadline_ms}ms passed with no confident fallback - waiting for the router")
+    
+    result = await routing
+    routing_ms = (time.perf_counter() - started_at) * 1000
+    if deadline_ms and deadline_ms > 0 and routing_ms > deadline_ms:
+        routing_deadline_stats.record("late_decisions", routing_ms)
+    else:
+        routing_deadline_stats.record("within_deadline", routing_ms)
+    session_routing_state.record(session_id, user_input, result, connected_agents)
+    return result
 
 
 # Legacy function for backward compatibility
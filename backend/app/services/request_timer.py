@@ -0,0 +1,140 @@
+"""
+Request Timer Service
+
+Lightweight per-request stage timing for chat/workflow turns. Routers and the
+orchestrator feed a RequestTimer (file processing, persona routing, tool
+loading, prompt building, LLM TTFT, tool calls, shared-memory writes) and the
+finished breakdown is folded into rolling per-stage histograms.
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+
+class RequestTimer:
+    """
+    Collects wall-clock milliseconds per stage for a single request.
+    Repeated stages (e.g. several LLM calls) accumulate.
+    """
+
+    def __init__(self):
+        self._started_at = time.perf_counter()
+        self._stages: Dict[str, float] = {}
+        self._open: Dict[str, float] = {}
+        self._finished = False
+
+    def start(self, stage: str):
+        """Start timing a stage; pair with stop()"""
+        self._open[stage] = time.perf_counter()
+
+    def stop(self, stage: str):
+        """Stop timing a stage started with start(); ignored if it was never started"""
+        started = self._open.pop(stage, None)
+        if started is not None:
+            self.add(stage, (time.perf_counter() - started) * 1000)
+
+    def add(self, stage: str, elapsed_ms: float):
+        """Add elapsed milliseconds to a stage"""
+        self._stages[stage] = self._stages.get(stage, 0.0) + elapsed_ms
+
+    def clear(self, *stages: str):
+        """Discard recorded time for stages whose work was thrown away (e.g. a cancelled speculation)"""
+        for stage in stages:
+            self._stages.pop(stage, None)
+            self._open.pop(stage, None)
+
+    @contextmanager
+    def stage(self, stage: str):
+        """Time a block: `with timer.stage("tool_loading"): ...`"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, (time.perf_counter() - started) * 1000)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Timing breakdown for API responses"""
+        return {
+            "stages_ms": {name: round(ms, 1) for name, ms in self._stages.items()},
+            "total_ms": round((time.perf_counter() - self._started_at) * 1000, 1)
+        }
+
+    def finish(self) -> Dict[str, Any]:
+        """Close the timer, record it in the rolling histograms and return the breakdown"""
+        breakdown = self.as_dict()
+        if not self._finished:
+            self._finished = True
+            for name, ms in breakdown["stages_ms"].items():
+                stage_histograms.record(name, ms)
+            stage_histograms.record("total", breakdown["total_ms"])
+        return breakdown
+
+
+class StageHistograms:
+    """
+    Rolling per-stage latency histograms over the most recent samples.
+    Thread-safe; blocking agent calls record from worker threads.
+    """
+
+    # Upper bucket bounds in milliseconds (last bucket is open-ended)
+    BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+    def __init__(self, window: int = 1000):
+        self._window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self._window)
+            samples.append(elapsed_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Count, percentiles and bucket counts for every stage"""
+        with self._lock:
+            samples_by_stage = {stage: sorted(samples) for stage, samples in self._samples.items()}
+
+        return {stage: self._summarize(samples) for stage, samples in samples_by_stage.items()}
+
+    def _summarize(self, samples: list) -> Dict[str, Any]:
+        def percentile(p: float) -> float:
+            index = min(int(round(p * (len(samples) - 1))), len(samples) - 1)
+            return round(samples[index], 1)
+
+        buckets = {}
+        previous = 0
+        for bound in self.BUCKETS_MS:
+            upto = bisect.bisect_right(samples, bound)
+            buckets[f"le_{bound}"] = upto - previous
+            previous = upto
+        buckets["gt_{}".format(self.BUCKETS_MS[-1])] = len(samples) - previous
+
+        return {
+            "count": len(samples),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(samples[-1], 1),
+            "buckets": buckets
+        }
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def get_request_timer(prev_output: Optional[Dict[str, Any]]) -> RequestTimer:
+    """Timer threaded through agent execution context, or a throwaway one if the caller didn't provide one"""
+    if isinstance(prev_output, dict) and prev_output.get("request_timer"):
+        return prev_output["request_timer"]
+    return RequestTimer()
+
+
+# Global instance
+stage_histograms = StageHistograms()
@@ -0,0 +1,110 @@
+"""
+Routing Cache
+
+Cache for persona routing and intent detection decisions. Keys are stable
+blake2b digests of the normalized user input and the router configuration (so
+they are identical across worker processes and restarts), values are stored as
+JSON so they can live in any cache backend. The number of entries is bounded
+and everything can be invalidated when a workflow's agents change.
+"""
+
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from .cache_service import cache_service
+
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?]+$")
+
+
+def normalize_input(user_input: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation ("Hi  there?" == "hi there")"""
+    return _TRAILING_PUNCTUATION.sub("", " ".join((user_input or "").casefold().split()))
+
+
+def stable_digest(value: Any) -> str:
+    body = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.blake2b(body.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class RoutingCache:
+    """Bounded, JSON-valued routing decision cache on top of cache_service"""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: int = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @property
+    def generation(self) -> str:
+        """Version token bumped by invalidate(); part of every key so older entries become unreachable"""
+        return cache_service.entity_version("routing")
+
+    def key(self, kind: str, user_input: str, config: Any) -> str:
+        # Intent detection gets its own cache namespace (and metrics); other kinds live under "routing"
+        prefix = "intent" if kind == "intent" else f"routing:{kind}"
+        return f"{prefix}:{self.generation}:{stable_digest([normalize_input(user_input), config])}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = cache_service.get(key)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                self._keys.pop(key, None)
+                return None
+            self._stats["hits"] += 1
+            if key in self._keys:
+                self._keys.move_to_end(key)
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Store a decision; non-serializable references (agent node dicts) are left out"""
+        cache_service.set(key, json.dumps({k: v for k, v in value.items() if k != 'agent'}, default=str), self.ttl_seconds)
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_entries:
+                evicted, _ = self._keys.popitem(last=False)
+                cache_service.delete(evicted)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, reason: str = ""):
+        """
+        Drop all routing decisions, e.g. after a workflow's agents were edited.
+        O(1): the version bump makes old keys unreachable; their entries age out of the cache.
+        """
+        cache_service.bump_version("routing")
+        with self._lock:
+            dropped, self._keys = len(self._keys), OrderedDict()
+            self._stats["invalidations"] += 1
+        print(f"🗑️ ROUTING CACHE: Invalidated {dropped} routing decisions{f' ({reason})' if reason else ''}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._keys),
+                "max_entries": self.max_entries,
+                "generation": self.generation,
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0
+            }
+
+
+# Global instance
+routing_cache = RoutingCache(
+    max_entries=settings.ROUTING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ROUTING_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_routing_cache(reason: str = ""):
+    """Invalidation hook for routers that create, edit or delete agents and workflows"""
+    routing_cache.invalidate(reason)
@@ -0,0 +1,140 @@
+"""
+Session Context Cache
+
+In-process copy of what agent handoffs need from a shared session: session
+settings, current task, global context and the recent windows of messages,
+handoffs and facts. SharedMemoryService loads it once per session (TTL + LRU)
+and updates it write-through after each commit, so handoff context and
+summaries on a warm session need no database queries.
+
+Entries carry the session's entity version from cache_service; every write
+bumps it in the shared cache tier, so other worker processes drop their copy
+instead of serving a stale one.
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+from .cache_service import cache_service
+
+
+VERSION_ENTITY = "shared_session"
+
+
+class SessionContext:
+    """Recent context of one shared session"""
+
+    def __init__(self, session_id: str, shared_session_id, current_task: Optional[str], global_context: Dict,
+                 memory_strategy: str, preserve_context_on_agent_switch: bool, messages: List[Dict],
+                 handoffs: List[Dict], facts: List[str], message_limit: int, handoff_limit: int, fact_limit: int):
+        self.session_id = session_id
+        self.shared_session_id = shared_session_id
+        self.current_task = current_task
+        self.global_context = dict(global_context or {})
+        self.memory_strategy = memory_strategy
+        self.preserve_context_on_agent_switch = preserve_context_on_agent_switch
+        # Oldest first; the newest entries push the oldest out
+        self.messages = deque(messages, maxlen=message_limit)
+        self.handoffs = deque(handoffs, maxlen=handoff_limit)
+        self.facts = deque(facts, maxlen=fact_limit)
+        self.version: Optional[str] = None
+        self.loaded_at = time.monotonic()
+
+
+class SessionContextCache:
+    """Bounded (TTL + LRU) map of session id -> SessionContext"""
+
+    def __init__(self, max_sessions: int = 5000, ttl_seconds: int = 300):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._contexts: OrderedDict = OrderedDict()
+        # Sessions being loaded -> False once a write lands during the load
+        self._loading: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "expired": 0, "evicted": 0, "updates": 0}
+
+    def get(self, session_id: str, view: Callable[[SessionContext], Any]) -> Optional[Any]:
+        """
+        view(context) taken under the lock (so write-through updates never
+        interleave), or None when the session is not cached, expired, or was
+        written by another process since it was loaded.
+        """
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is None:
+                self._stats["misses"] += 1
+                return None
+            if time.monotonic() - context.loaded_at > self.ttl_seconds:
+                del self._contexts[session_id]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            version = context.version
+        current = cache_service.entity_version(VERSION_ENTITY, session_id)
+        with self._lock:
+            if self._contexts.get(session_id) is not context:
+                self._stats["misses"] += 1
+                return None
+            # (A local write-through in between already brought the context up to date)
+            if context.version != current and version == context.version:
+                del self._contexts[session_id]
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._contexts.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return view(context)
+
+    def begin_load(self, session_id: str) -> str:
+        """Call before reading the session from the database; returns the version to store with it"""
+        with self._lock:
+            self._loading[session_id] = True
+        return cache_service.entity_version(VERSION_ENTITY, session_id)
+
+    def put(self, context: SessionContext, version: str):
+        """Cache a freshly loaded context, unless a write landed while it was being read"""
+        with self._lock:
+            if not self._loading.pop(context.session_id, False):
+                return
+            context.version = version
+            self._contexts[context.session_id] = context
+            self._contexts.move_to_end(context.session_id)
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+                self._stats["evicted"] += 1
+
+    def apply(self, session_id: str, update: Callable[[SessionContext], Any]):
+        """
+        Write-through after a commit: update the cached context and bump the
+        session's version. update must be idempotent, since a context loaded
+        between the commit and this call already includes the write.
+        """
+        # Only this session's token; nothing depends on shared sessions as a whole
+        cache_service.bump_version(VERSION_ENTITY, session_id, bump_type=False)
+        version = cache_service.entity_version(VERSION_ENTITY, session_id)
+        with self._lock:
+            if session_id in self._loading:
+                self._loading[session_id] = False
+            context = self._contexts.get(session_id)
+            if context is None:
+                return
+            update(context)
+            context.version = version
+            self._stats["updates"] += 1
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._contexts.pop(session_id, None)
+            if session_id in self._loading:
+                self._loading[session_id] = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "sessions": len(self._contexts),
+                "hit_rate": round(self._stats["hits"] / lookups, 3) if lookups else 0.0
+            }
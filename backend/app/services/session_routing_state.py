@@ -0,0 +1,176 @@
+"""
+Session Routing State
+
+Cheap in-memory routing state per chat session: the agent that handled the
+last turn, recent topic words and turn count, bounded by TTL and LRU. The
+persona router keeps continuation turns ("and what about P2s?") on the
+current agent without any database or LLM call. Routing decisions are
+persisted as routing_decisions rows by a background worker, off the request path.
+"""
+
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from ..config import settings
+from ..db.database import SessionLocal
+from .shared_memory import shared_memory_service
+from .vector_router import STOPWORDS
+
+
+CONTINUATION_PREFIXES = (
+    'and ', 'also ', 'what about ', 'how about ', 'or ', 'then ', 'same for ', 'same but ',
+    'now ', 'ok and ', 'okay and ', 'and what about ', 'what if ', 'only ', 'just '
+)
+# Short follow-ups referring back to the previous answer
+REFERENCE_WORDS = frozenset(['it', 'that', 'those', 'these', 'them', 'this', 'same', 'again', 'more', 'instead'])
+SHORT_FOLLOW_UP_WORDS = 6
+RECENT_TOPIC_TURNS = 3
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class SessionRoutingState:
+    """Bounded (TTL + LRU) map of session id -> routing state"""
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: int = 1800, persist_queue_limit: int = 1000):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.persist_queue_limit = persist_queue_limit
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Single writer keeps routing decision inserts ordered per process
+        self._persist_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="router-memory")
+        self._persist_pending = 0
+        self._stats = {"sticky_routes": 0, "recorded": 0, "expired": 0, "evicted": 0, "persisted": 0, "persist_dropped": 0}
+
+    def get(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not session_id:
+            return None
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if not state:
+                return None
+            if time.monotonic() - state['updated_at'] > self.ttl_seconds:
+                del self._sessions[session_id]
+                self._stats["expired"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            return state
+
+    def continuation_reason(self, session_id: Optional[str], user_input: str) -> Optional[str]:
+        """Why this turn continues the session's current topic, or None"""
+        state = self.get(session_id)
+        if not state:
+            return None
+        text = ' '.join(user_input.lower().split())
+        if text.startswith(CONTINUATION_PREFIXES):
+            return "continuation phrase"
+        words = _WORD_PATTERN.findall(text)
+        if len(words) <= SHORT_FOLLOW_UP_WORDS:
+            if REFERENCE_WORDS.intersection(words):
+                return "short follow-up referring to the previous turn"
+            if any(set(words) & topics for topics in state['topics']):
+                return "short follow-up on a recent topic"
+        return None
+
+    def sticky_route(
+        self,
+        session_id: Optional[str],
+        user_input: str,
+        connected_agents: List[Dict[str, Any]],
+        competing_agent_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Routing result keeping a continuation turn on the session's current agent.
+        None when there is no live state, the turn is not a continuation, the agent
+        is no longer connected, or trigger keywords point at a different agent.
+        """
+        reason = self.continuation_reason(session_id, user_input)
+        if not reason:
+            return None
+        state = self.get(session_id)
+        current = next((a for a in connected_agents if a['id'] == state['agent_id']), None)
+        if not current or (competing_agent_id and competing_agent_id != current['id']):
+            return None
+
+        with self._lock:
+            self._stats["sticky_routes"] += 1
+        agent_name = current['data'].get('name', 'Unnamed Agent')
+        print(f"📌 SESSION ROUTING: Staying on '{agent_name}' ({reason})")
+        return {
+            'agent': current,
+            'agent_id': current['id'],
+            'confidence': 0.85,
+            'method': 'session_continuation',
+            'fallback_used': False,
+            'reasoning': f"Continuing with '{agent_name}': {reason}"
+        }
+
+    def record(self, session_id: Optional[str], user_input: str, routing_result: Dict[str, Any], connected_agents: List[Dict[str, Any]] = None):
+        """Remember the turn's agent and topics, and queue the routing decision insert"""
+        if not session_id or not routing_result or not routing_result.get('agent_id'):
+            return
+        agent_name = (routing_result.get('agent') or {}).get('data', {}).get('name', 'Unnamed Agent')
+        # Content words only: function words ("what", "the", "can") would match almost any follow-up
+        topics = {
+            w for w in _WORD_PATTERN.findall(user_input.lower())
+            if len(w) > 2 and w not in REFERENCE_WORDS and w not in STOPWORDS
+        }
+
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if not state or state['agent_id'] != routing_result['agent_id']:
+                state = {'agent_id': routing_result['agent_id'], 'topics': deque(maxlen=RECENT_TOPIC_TURNS), 'turns': 0}
+            state['agent_name'] = agent_name
+            state['topics'].append(topics)
+            state['turns'] += 1
+            state['updated_at'] = time.monotonic()
+            self._sessions[session_id] = state
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evicted"] += 1
+            self._stats["recorded"] += 1
+
+            if self._persist_pending >= self.persist_queue_limit:
+                self._stats["persist_dropped"] += 1
+                return
+            self._persist_pending += 1
+
+        available = [{'id': a['id'], 'name': a['data'].get('name', 'Unnamed Agent')} for a in (connected_agents or [])]
+        self._persist_executor.submit(
+            self._persist, session_id, user_input, routing_result['agent_id'], agent_name,
+            routing_result.get('confidence', 0.0), available, routing_result.get('reasoning')
+        )
+
+    def _persist(self, session_id: str, user_input: str, agent_id: str, agent_name: str,
+                 confidence: float, available_agents: List[Dict], reason: Optional[str]):
+        db = SessionLocal()
+        try:
+            shared_memory_service.record_routing_decision(
+                db, session_id, user_input, agent_id, agent_name, confidence, available_agents, reason
+            )
+            with self._lock:
+                self._stats["persisted"] += 1
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ SESSION ROUTING: Failed to persist routing decision for session {session_id}: {e}")
+        finally:
+            db.close()
+            with self._lock:
+                self._persist_pending -= 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "sessions": len(self._sessions), "persist_pending": self._persist_pending}
+
+
+# Global instance
+session_routing_state = SessionRoutingState(
+    max_sessions=settings.SESSION_ROUTING_MAX_SESSIONS,
+    ttl_seconds=settings.SESSION_ROUTING_TTL_SECONDS
+)
@@ -6,63 +6,137 @@ in a conversation, enabling seamless context handoffs and continuous learning.
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, or_
+from sqlalchemy.exc import IntegrityError
 from typing import Dict, List, Optional, Any
+import asyncio
+import hashlib
+import threading
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 
+from ..config import settings
 from ..db import models
+from ..db.database import SessionLocal
+from .shared_memory_writer import SharedMemoryWriteQueue
+from .session_context_cache import SessionContext, SessionContextCache
+
+
+# Shared session id -> conversation id of its messages, remembered per process
+CONVERSATION_ID_CACHE_SIZE = 10000
+
+# Recent windows read from the append-only session tables
+RECENT_FACTS_LIMIT = 50
+RECENT_ROUTING_LIMIT = 20
+RECENT_HANDOFFS_LIMIT = 5
+# Conversation messages included in agent handoff context
+HANDOFF_HISTORY_LIMIT = 20
+
+
+def fact_digest(fact: str) -> str:
+    """Key of a fact in the per-session unique index"""
+    return hashlib.blake2b(fact.encode("utf-8"), digest_size=16).hexdigest()
 
 
 class SharedMemoryService:
     """
     Manages shared memory across agents in a conversation session.
     Provides context continuity, intelligent handoffs, and session-level learning.
-    All methods require a database session to be passed.
+    Methods take a database session, except queue_writes: chat turns queue their
+    messages and handoffs, which a background worker writes in batches.
     """
     
+    def __init__(self):
+        self.writer = SharedMemoryWriteQueue(
+            self._write_batch,
+            flush_interval_ms=settings.SHARED_MEMORY_FLUSH_INTERVAL_MS,
+            batch_size=settings.SHARED_MEMORY_BATCH_SIZE,
+            queue_limit=settings.SHARED_MEMORY_QUEUE_LIMIT
+        )
+        self._conversation_ids: OrderedDict = OrderedDict()
+        self._conversation_lock = threading.Lock()
+        # Warm sessions serve handoff context without queries; kept current write-through
+        self.contexts = SessionContextCache(
+            max_sessions=settings.SESSION_CONTEXT_CACHE_MAX_SESSIONS,
+            ttl_seconds=settings.SESSION_CONTEXT_CACHE_TTL_SECONDS
+        )
+    
+    def _new_shared_session(self, session_id: str) -> models.SharedSession:
+        return models.SharedSession(
+            id=uuid.uuid4(),
+            session_id=session_id,
+            session_facts=[],
+            global_context={},
+            agent_routing_history=[],
+            memory_strategy="shared",
+            max_context_length=50,
+            preserve_context_on_agent_switch=True
+        )
+    
     def get_or_create_shared_session(self, db: Session, session_id: str) -> models.SharedSession:
         """Get existing shared session or create a new one"""
+        # Writes queued by the previous turn land first
+        self.writer.wait_for_session(session_id)
         print(f"🔍 SHARED MEMORY: Looking for session_id: {session_id}")
         shared_session = db.query(models.SharedSession).filter(
             models.SharedSession.session_id == session_id
         ).first()
         
         if not shared_session:
-            shared_session = models.SharedSession(
-                session_id=session_id,
-                session_facts=[],
-                global_context={},
-                agent_routing_history=[],
-                memory_strategy="shared",
-                max_context_length=50,
-                preserve_context_on_agent_switch=True
-            )
+            shared_session = self._new_shared_session(session_id)
             db.add(shared_session)
-            db.commit()
-            print(f"🆕 SHARED MEMORY: Created new shared session: {session_id}")
+            try:
+                db.commit()
+                print(f"🆕 SHARED MEMORY: Created new shared session: {session_id}")
+            except IntegrityError:
+                # Created concurrently (e.g. by a background routing-decision write)
+                db.rollback()
+                shared_session = db.query(models.SharedSession).filter(
+                    models.SharedSession.session_id == session_id
+                ).one()
         else:
             history_count = len(shared_session.conversation_history) if hasattr(shared_session, 'conversation_history') and shared_session.conversation_history else 0
             print(f"✅ SHARED MEMORY: Found existing session: {session_id} with {history_count} messages")
         
         return shared_session
     
-    def get_shared_conversation_history(self, db: Session, session_id: str, limit: int = None) -> List[Dict]:
-        """Get conversation history for the session across all agents"""
+    def get_shared_conversation_history(self, db: Session, session_id: str, limit: int = None,
+                                        before: datetime = None, before_id: str = None) -> List[Dict]:
+        """
+        The most recent `limit` messages of the session across all agents, in
+        chronological order. Pass `before` and `before_id` (the timestamp and id
+        of the oldest message already loaded) to page further back.
+        """
         shared_session = self.get_or_create_shared_session(db, session_id)
         
         # Apply session's max context length if no specific limit provided
         if limit is None:
             limit = shared_session.max_context_length
         
-        # Get messages from this shared session
-        messages = db.query(models.Message).filter(
-            models.Message.shared_session_id == shared_session.id
-        ).order_by(models.Message.created_at).limit(limit).all()
+        return self._recent_messages(db, shared_session.id, limit, before, before_id)
+    
+    def _recent_messages(self, db: Session, shared_session_id, limit: int, before: datetime = None,
+                         before_id: str = None) -> List[Dict]:
+        # Newest first, walking the (shared_session_id, created_at) index backwards;
+        # id breaks created_at ties so the (created_at, id) cursor never skips a message
+        query = db.query(models.Message).filter(
+            models.Message.shared_session_id == shared_session_id
+        )
+        if before is not None and before_id is not None:
+            before_id = before_id if isinstance(before_id, uuid.UUID) else uuid.UUID(str(before_id))
+            query = query.filter(or_(
+                models.Message.created_at < before,
+                and_(models.Message.created_at == before, models.Message.id < before_id)
+            ))
+        elif before is not None:
+            query = query.filter(models.Message.created_at < before)
+        messages = query.order_by(desc(models.Message.created_at), desc(models.Message.id)).limit(limit).all()
         
         conversation_history = []
-        for msg in messages:
+        for msg in reversed(messages):
             conversation_history.append({
+                "id": str(msg.id),
                 "role": msg.role,
                 "content": msg.content,
                 "agent_id": str(msg.agent_id) if msg.agent_id else None,
@@ -73,6 +147,198 @@ class SharedMemoryService:
         
         return conversation_history
     
+    def message_write(self,
+                      session_id: str,
+                      role: str,
+                      content: str,
+                      agent_id: str = None,
+                      agent_name: str = None,
+                      attachments: List = None) -> Dict[str, Any]:
+        """A pending Message insert, for queue_writes"""
+        return {
+            "kind": "message",
+            "session_id": session_id,
+            # Assigned up front so the cached context carries the same (created_at, id) cursor as the row
+            "id": uuid.uuid4(),
+            "created_at": datetime.utcnow(),
+            "role": role,
+            "content": content,
+            "agent_id": agent_id,
+            "agent_name": agent_name,
+            "attachments": attachments or []
+        }
+    
+    def handoff_write(self,
+                      session_id: str,
+                      from_agent_id: str = None,
+                      from_agent_name: str = None,
+                      to_agent_id: str = None,
+                      to_agent_name: str = None,
+                      handoff_reason: str = None,
+                      context_summary: str = None,
+                      preserved_context: Dict = None) -> Dict[str, Any]:
+        """A pending AgentHandoff insert (and routing history update), for queue_writes"""
+        return {
+            "kind": "handoff",
+            "session_id": session_id,
+            "id": uuid.uuid4(),
+            "created_at": datetime.utcnow(),
+            "from_agent_id": from_agent_id,
+            "from_agent_name": from_agent_name,
+            "to_agent_id": to_agent_id,
+            "to_agent_name": to_agent_name,
+            "handoff_reason": handoff_reason,
+            "context_summary": context_summary,
+            "preserved_context": preserved_context or {}
+        }
+    
+    def queue_writes(self, *writes: Dict[str, Any]):
+        """
+        Write one turn's messages/handoffs in a single transaction, off the
+        request path (write-behind). Written inline when write-behind is
+        disabled or the queue is full.
+        """
+        if settings.SHARED_MEMORY_WRITE_BEHIND and self.writer.submit(list(writes)):
+            return
+        self._write_batch(list(writes))
+    
+    async def queue_writes_async(self, *writes: Dict[str, Any]):
+        """queue_writes for async callers: the inline fallback runs in a worker thread"""
+        if settings.SHARED_MEMORY_WRITE_BEHIND and self.writer.submit(list(writes)):
+            return
+        await asyncio.to_thread(self._write_batch, list(writes))
+    
+    def _write_batch(self, writes: List[Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            self._commit_writes(db, writes)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _commit_writes(self, db: Session, writes: List[Dict[str, Any]]):
+        """Apply pending writes with one session lookup per batch and a single commit"""
+        session_ids = {write["session_id"] for write in writes}
+        shared_sessions = {
+            shared_session.session_id: shared_session
+            for shared_session in db.query(models.SharedSession).filter(
+                models.SharedSession.session_id.in_(session_ids)
+            )
+        }
+        for session_id in session_ids - shared_sessions.keys():
+            shared_sessions[session_id] = self._new_shared_session(session_id)
+            db.add(shared_sessions[session_id])
+        
+        new_conversations: Dict[Any, Any] = {}
+        context_updates: Dict[str, List[Dict[str, Any]]] = {}
+        messages = handoffs = 0
+        for write in writes:
+            shared_session = shared_sessions[write["session_id"]]
+            context_updates.setdefault(write["session_id"], []).append(write)
+            if write["kind"] == "message":
+                db.add(models.Message(
+                    id=write["id"],
+                    conversation_id=self._conversation_id(db, shared_session.id, new_conversations),
+                    role=write["role"],
+                    content=write["content"],
+                    agent_id=uuid.UUID(write["agent_id"]) if write["agent_id"] else None,
+                    agent_name=write["agent_name"],
+                    shared_session_id=shared_session.id,
+                    attachments=write["attachments"],
+                    created_at=write["created_at"]
+                ))
+                messages += 1
+            else:
+                db.add(models.AgentHandoff(
+                    id=write["id"],
+                    shared_session_id=shared_session.id,
+                    from_agent_id=uuid.UUID(write["from_agent_id"]) if write["from_agent_id"] else None,
+                    from_agent_name=write["from_agent_name"],
+                    to_agent_id=uuid.UUID(write["to_agent_id"]) if write["to_agent_id"] else None,
+                    to_agent_name=write["to_agent_name"],
+                    handoff_reason=write["handoff_reason"],
+                    context_summary=write["context_summary"],
+                    preserved_context=write["preserved_context"],
+                    created_at=write["created_at"]
+                ))
+                # The handoff row is the routing history entry; only the current agent changes on the session
+                shared_session.current_agent_id = uuid.UUID(write["to_agent_id"]) if write["to_agent_id"] else None
+                handoffs += 1
+            shared_session.updated_at = datetime.utcnow()
+        
+        db.commit()
+        
+        # Only conversations that were actually committed are remembered
+        with self._conversation_lock:
+            for shared_session_id, conversation_id in new_conversations.items():
+                self._remember_conversation(shared_session_id, conversation_id)
+        for session_id, session_writes in context_updates.items():
+            self.contexts.apply(session_id, lambda context, session_writes=session_writes: self._apply_to_context(context, session_writes))
+        print(f"💾 SHARED MEMORY: Wrote {messages} message(s) and {handoffs} handoff(s) for {len(session_ids)} session(s)")
+    
+    def _apply_to_context(self, context: SessionContext, writes: List[Dict[str, Any]]):
+        """
+        Write-through of committed messages/handoffs into a cached session context.
+        Rows the context already holds are skipped: a load that read the database
+        after the commit (but was cached before this ran) already has them.
+        """
+        message_ids = {message.get("id") for message in context.messages}
+        handoff_ids = {handoff.get("id") for handoff in context.handoffs}
+        for write in writes:
+            if write["kind"] == "message":
+                if str(write["id"]) in message_ids:
+                    continue
+                context.messages.append({
+                    "id": str(write["id"]),
+                    "role": write["role"],
+                    "content": write["content"],
+                    "agent_id": write["agent_id"],
+                    "agent_name": write["agent_name"],
+                    "timestamp": write["created_at"].isoformat(),
+                    "attachments": write["attachments"]
+                })
+            else:
+                if str(write["id"]) in handoff_ids:
+                    continue
+                context.handoffs.append({
+                    "id": str(write["id"]),
+                    "from_agent": write["from_agent_name"],
+                    "to_agent": write["to_agent_name"],
+                    "reason": write["handoff_reason"],
+                    "summary": write["context_summary"],
+                    "timestamp": write["created_at"].isoformat()
+                })
+    
+    def _conversation_id(self, db: Session, shared_session_id, new_conversations: Dict[Any, Any]):
+        """Conversation the session's messages belong to, created on its first message"""
+        if shared_session_id in new_conversations:
+            return new_conversations[shared_session_id]
+        with self._conversation_lock:
+            conversation_id = self._conversation_ids.get(shared_session_id)
+            if conversation_id is not None:
+                self._conversation_ids.move_to_end(shared_session_id)
+                return conversation_id
+        
+        row = db.query(models.Message.conversation_id).filter(
+            models.Message.shared_session_id == shared_session_id
+        ).first()
+        if row:
+            conversation_id = row.conversation_id
+        else:
+            conversation = models.Conversation(id=uuid.uuid4())
+            db.add(conversation)
+            conversation_id = conversation.id
+        new_conversations[shared_session_id] = conversation_id
+        return conversation_id
+    
+    def _remember_conversation(self, shared_session_id, conversation_id):
+        self._conversation_ids[shared_session_id] = conversation_id
+        self._conversation_ids.move_to_end(shared_session_id)
+        while len(self._conversation_ids) > CONVERSATION_ID_CACHE_SIZE:
+            self._conversation_ids.popitem(last=False)
+    
     def add_message_to_shared_context(self, 
                                      db: Session,
                                      session_id: str, 
@@ -81,36 +347,9 @@ class SharedMemoryService:
                                      agent_id: str = None, 
                                      agent_name: str = None,
                                      attachments: List = None):
-        """Add a new message to the shared conversation context"""
-        shared_session = self.get_or_create_shared_session(db, session_id)
-        
-        # Create a conversation if one doesn't exist for this session
-        conversation = db.query(models.Conversation).join(models.Message).filter(
-            models.Message.shared_session_id == shared_session.id
-        ).first()
-        
-        if not conversation:
-            conversation = models.Conversation()
-            db.add(conversation)
-            db.commit()
-        
-        # Add the message
-        message = models.Message(
-            conversation_id=conversation.id,
-            role=role,
-            content=content,
-            agent_id=uuid.UUID(agent_id) if agent_id else None,
-            agent_name=agent_name,
-            shared_session_id=shared_session.id,
-            attachments=attachments or []
-        )
-        
-        db.add(message)
-        db.commit()
-        
-        # Update session timestamp
-        shared_session.updated_at = datetime.utcnow()
-        db.commit()
+        """Add a new message to the shared conversation context (inline, one transaction)"""
+        self.writer.wait_for_session(session_id)
+        self._commit_writes(db, [self.message_write(session_id, role, content, agent_id, agent_name, attachments)])
         
         print(f"💾 Added message to shared context: {role} from {agent_name or 'Unknown'}")
     
@@ -124,38 +363,12 @@ class SharedMemoryService:
                            handoff_reason: str = None,
                            context_summary: str = None,
                            preserved_context: Dict = None):
-        """Record when control is handed off from one agent to another"""
-        shared_session = self.get_or_create_shared_session(db, session_id)
-        
-        handoff = models.AgentHandoff(
-            shared_session_id=shared_session.id,
-            from_agent_id=uuid.UUID(from_agent_id) if from_agent_id else None,
-            from_agent_name=from_agent_name,
-            to_agent_id=uuid.UUID(to_agent_id) if to_agent_id else None,
-            to_agent_name=to_agent_name,
-            handoff_reason=handoff_reason,
-            context_summary=context_summary,
-            preserved_context=preserved_context or {}
-        )
-        
-        db.add(handoff)
-        
-        # Update session's current agent and routing history
-        shared_session.current_agent_id = uuid.UUID(to_agent_id) if to_agent_id else None
-        
-        routing_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "from_agent": from_agent_name,
-            "to_agent": to_agent_name,
-            "reason": handoff_reason,
-            "context_summary": context_summary
-        }
-        
-        routing_history = shared_session.agent_routing_history or []
-        routing_history.append(routing_entry)
-        shared_session.agent_routing_history = routing_history
-        
-        db.commit()
+        """Record when control is handed off from one agent to another (inline, one transaction)"""
+        self.writer.wait_for_session(session_id)
+        self._commit_writes(db, [self.handoff_write(
+            session_id, from_agent_id, from_agent_name, to_agent_id, to_agent_name,
+            handoff_reason, context_summary, preserved_context
+        )])
         
         print(f"🔄 Recorded agent handoff: {from_agent_name or 'Unknown'} → {to_agent_name or 'Unknown'}")
         print(f"   Reason: {handoff_reason}")
@@ -167,25 +380,64 @@ class SharedMemoryService:
                               session_facts: List[str] = None,
                               global_context: Dict = None):
         """Update session-level context information"""
-        shared_session = self.get_or_create_shared_session(db, session_id)
-        
-        if current_task is not None:
-            shared_session.current_task = current_task
-        
-        if session_facts is not None:
-            # Merge new facts with existing ones, avoiding duplicates
-            existing_facts = shared_session.session_facts or []
-            all_facts = existing_facts + [fact for fact in session_facts if fact not in existing_facts]
-            shared_session.session_facts = all_facts
-        
-        if global_context is not None:
-            # Merge new context with existing context
-            existing_context = shared_session.global_context or {}
-            existing_context.update(global_context)
-            shared_session.global_context = existing_context
-        
-        shared_session.updated_at = datetime.utcnow()
-        db.commit()
+        for attempt in range(2):
+            shared_session = self.get_or_create_shared_session(db, session_id)
+            
+            if current_task is not None:
+                shared_session.current_task = current_task
+            
+            added_facts = self._add_session_facts(db, shared_session.id, session_facts) if session_facts else []
+            
+            if global_context is not None:
+                # Merge new context with existing context (copy, so SQLAlchemy sees the change)
+                existing_context = dict(shared_session.global_context or {})
+                existing_context.update(global_context)
+                shared_session.global_context = existing_context
+            
+            shared_session.updated_at = datetime.utcnow()
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent turn added one of the same facts; the retry skips it
+                db.rollback()
+                if attempt:
+                    raise
+                continue
+            
+            def update_context(context: SessionContext):
+                if current_task is not None:
+                    context.current_task = current_task
+                # (Already there when the context was loaded after this commit)
+                context.facts.extend(fact for fact in added_facts if fact not in context.facts)
+                if global_context is not None:
+                    context.global_context = {**context.global_context, **global_context}
+            self.contexts.apply(session_id, update_context)
+            return
+    
+    def _add_session_facts(self, db: Session, shared_session_id, facts: List[str]) -> List[str]:
+        """Append facts not yet known for the session (unique per session by digest); returns the added ones"""
+        new_facts = {}
+        for fact in facts:
+            new_facts.setdefault(fact_digest(fact), fact)
+        existing = {
+            row.fact_hash for row in db.query(models.SessionFact.fact_hash).filter(
+                models.SessionFact.shared_session_id == shared_session_id,
+                models.SessionFact.fact_hash.in_(new_facts.keys())
+            )
+        }
+        added = []
+        for digest, fact in new_facts.items():
+            if digest not in existing:
+                db.add(models.SessionFact(shared_session_id=shared_session_id, fact=fact, fact_hash=digest))
+                added.append(fact)
+        return added
+    
+    def get_session_facts(self, db: Session, shared_session_id, limit: int = RECENT_FACTS_LIMIT) -> List[str]:
+        """The session's most recent facts, oldest first"""
+        rows = db.query(models.SessionFact.fact).filter(
+            models.SessionFact.shared_session_id == shared_session_id
+        ).order_by(desc(models.SessionFact.created_at)).limit(limit).all()
+        return [row.fact for row in reversed(rows)]
     
     def get_persona_router_memory(self, db: Session, session_id: str) -> models.PersonaRouterMemory:
         """Get or create persona router memory for the session"""
@@ -217,72 +469,119 @@ class SharedMemoryService:
                                confidence: float,
                                available_agents: List[Dict],
                                routing_reason: str = None):
-        """Record a persona router decision for learning"""
-        router_memory = self.get_persona_router_memory(db, session_id)
-        
-        decision = {
-            "timestamp": datetime.utcnow().isoformat(),
-            "user_input": user_input,
-            "selected_agent_id": selected_agent_id,
-            "selected_agent_name": selected_agent_name,
-            "confidence": confidence,
-            "available_agents": available_agents,
-            "routing_reason": routing_reason
-        }
-        
-        routing_decisions = router_memory.routing_decisions or []
-        routing_decisions.append(decision)
-        router_memory.routing_decisions = routing_decisions
-        
-        # Update task history
-        task_history = router_memory.task_history or []
-        task_history.append({
-            "task": user_input,
-            "agent": selected_agent_name,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        router_memory.task_history = task_history
+        """Record a persona router decision for learning (one appended row)"""
+        shared_session = self.get_or_create_shared_session(db, session_id)
         
-        router_memory.updated_at = datetime.utcnow()
+        db.add(models.RoutingDecision(
+            shared_session_id=shared_session.id,
+            user_input=user_input,
+            selected_agent_id=selected_agent_id,
+            selected_agent_name=selected_agent_name,
+            confidence=confidence,
+            available_agents=list(available_agents or []),
+            routing_reason=routing_reason
+        ))
         db.commit()
         
         print(f"📊 Recorded routing decision: '{user_input}' → {selected_agent_name} (confidence: {confidence})")
     
+    def get_recent_routing_decisions(self, db: Session, session_id: str, limit: int = RECENT_ROUTING_LIMIT) -> List[Dict]:
+        """
+        The session's most recent persona router decisions, oldest first. Each
+        decision is also a task history entry (user_input -> selected agent).
+        """
+        shared_session = self.get_or_create_shared_session(db, session_id)
+        decisions = db.query(models.RoutingDecision).filter(
+            models.RoutingDecision.shared_session_id == shared_session.id
+        ).order_by(desc(models.RoutingDecision.created_at)).limit(limit).all()
+        
+        return [
+            {
+                "timestamp": decision.created_at.isoformat(),
+                "user_input": decision.user_input,
+                "selected_agent_id": decision.selected_agent_id,
+                "selected_agent_name": decision.selected_agent_name,
+                "confidence": decision.confidence,
+                "available_agents": decision.available_agents or [],
+                "routing_reason": decision.routing_reason
+            }
+            for decision in reversed(decisions)
+        ]
+    
     def get_context_for_agent_handoff(self, db: Session, session_id: str) -> Dict:
         """
         Get comprehensive context for intelligent agent handoffs.
         This provides the receiving agent with full situational awareness.
+        Served from the in-process session context cache when the session is warm.
         """
+        # Writes queued by the previous turn land (and reach the cache) first
+        self.writer.wait_for_session(session_id)
+        context = self.contexts.get(session_id, self._handoff_context)
+        if context is not None:
+            return context
+        
+        session_context, version = self._load_session_context(db, session_id)
+        context = self._handoff_context(session_context)
+        self.contexts.put(session_context, version)
+        return context
+    
+    def _load_session_context(self, db: Session, session_id: str):
+        version = self.contexts.begin_load(session_id)
         shared_session = self.get_or_create_shared_session(db, session_id)
         
-        # Get recent conversation history
-        conversation_history = self.get_shared_conversation_history(db, session_id, limit=20)
-        
-        # Get recent handoffs for context
+        # Recent handoffs; the same rows are the agent routing history
         recent_handoffs = db.query(models.AgentHandoff).filter(
             models.AgentHandoff.shared_session_id == shared_session.id
-        ).order_by(desc(models.AgentHandoff.created_at)).limit(5).all()
-        
-        handoff_context = []
-        for handoff in recent_handoffs:
-            handoff_context.append({
-                "from_agent": handoff.from_agent_name,
-                "to_agent": handoff.to_agent_name,
-                "reason": handoff.handoff_reason,
-                "summary": handoff.context_summary,
-                "timestamp": handoff.created_at.isoformat()
-            })
+        ).order_by(desc(models.AgentHandoff.created_at)).limit(RECENT_ROUTING_LIMIT).all()
         
+        session_context = SessionContext(
+            session_id=session_id,
+            shared_session_id=shared_session.id,
+            current_task=shared_session.current_task,
+            global_context=shared_session.global_context,
+            memory_strategy=shared_session.memory_strategy,
+            preserve_context_on_agent_switch=shared_session.preserve_context_on_agent_switch,
+            messages=self._recent_messages(db, shared_session.id, HANDOFF_HISTORY_LIMIT),
+            handoffs=[
+                {
+                    "id": str(handoff.id),
+                    "from_agent": handoff.from_agent_name,
+                    "to_agent": handoff.to_agent_name,
+                    "reason": handoff.handoff_reason,
+                    "summary": handoff.context_summary,
+                    "timestamp": handoff.created_at.isoformat()
+                }
+                for handoff in reversed(recent_handoffs)
+            ],
+            facts=self.get_session_facts(db, shared_session.id),
+            message_limit=HANDOFF_HISTORY_LIMIT,
+            handoff_limit=RECENT_ROUTING_LIMIT,
+            fact_limit=RECENT_FACTS_LIMIT
+        )
+        return session_context, version
+    
+    def _handoff_context(self, context: SessionContext) -> Dict:
+        """Handoff context built from a session context (copies, callers may modify them)"""
         return {
-            "session_id": session_id,
-            "current_task": shared_session.current_task,
-            "session_facts": shared_session.session_facts or [],
-            "global_context": shared_session.global_context or {},
-            "conversation_history": conversation_history,
-            "recent_handoffs": handoff_context,
-            "agent_routing_history": shared_session.agent_routing_history or [],
-            "memory_strategy": shared_session.memory_strategy,
-            "context_preservation": shared_session.preserve_context_on_agent_switch
+            "session_id": context.session_id,
+            "current_task": context.current_task,
+            "session_facts": list(context.facts),
+            "global_context": dict(context.global_context),
+            "conversation_history": [dict(message) for message in context.messages],
+            # Newest first
+            "recent_handoffs": [dict(handoff) for handoff in reversed(context.handoffs)][:RECENT_HANDOFFS_LIMIT],
+            "agent_routing_history": [
+                {
+                    "timestamp": handoff["timestamp"],
+                    "from_agent": handoff["from_agent"],
+                    "to_agent": handoff["to_agent"],
+                    "reason": handoff["reason"],
+                    "context_summary": handoff["summary"]
+                }
+                for handoff in context.handoffs
+            ],
+            "memory_strategy": context.memory_strategy,
+            "context_preservation": context.preserve_context_on_agent_switch
         }
     
     def generate_context_summary(self, db: Session, session_id: str, agent_name: str) -> str:
@@ -310,6 +609,22 @@ class SharedMemoryService:
             return f"[CONTEXT] {agent_name} is now handling the conversation. " + " | ".join(summary_parts)
         else:
             return f"[CONTEXT] {agent_name} is starting a new conversation."
+    
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until all queued writes are in the database"""
+        return self.writer.flush(timeout)
+    
+    def close(self):
+        """Flush queued writes and stop the writer (application shutdown)"""
+        self.writer.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "write_behind": settings.SHARED_MEMORY_WRITE_BEHIND,
+            "writer": self.writer.get_stats(),
+            "conversation_ids_cached": len(self._conversation_ids),
+            "context_cache": self.contexts.get_stats()
+        }
 
 
 # Singleton instance
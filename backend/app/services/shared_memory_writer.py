@@ -0,0 +1,156 @@
+"""
+Shared Memory Write Queue
+
+Write-behind for shared memory: chat turns queue their Message and
+AgentHandoff writes and return immediately, and one background thread
+drains the queue, applying each batch in a single transaction. A turn's
+writes are queued together and never split across transactions; when a
+batch fails, each turn's writes are retried on their own so one bad write
+only costs its own turn. Pending writes are flushed on shutdown, and readers of a session wait for that
+session's pending writes, so a turn always sees the previous one.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+_STOP = object()
+
+# Write groups that could not be applied, kept for inspection
+FAILED_GROUPS_KEPT = 100
+
+
+class SharedMemoryWriteQueue:
+    """Bounded queue of write groups, applied in batches by a daemon thread"""
+
+    def __init__(self, write_batch: Callable[[List[Dict[str, Any]]], None], flush_interval_ms: int = 50,
+                 batch_size: int = 200, queue_limit: int = 10000):
+        self._write_batch = write_batch
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.queue_limit = queue_limit
+        self._queue = queue.Queue()
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._pending_sessions: Dict[str, int] = {}
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "retries": 0, "failed": 0, "failed_groups": 0,
+                       "rejected": 0}
+        self.failed_groups: deque = deque(maxlen=FAILED_GROUPS_KEPT)
+
+    def submit(self, writes: List[Dict[str, Any]]) -> bool:
+        """
+        Queue one turn's writes. False when the queue is full or closed; the
+        caller then writes them inline.
+        """
+        with self._condition:
+            if self._closed or self._pending + len(writes) > self.queue_limit:
+                self._stats["rejected"] += len(writes)
+                return False
+            self._pending += len(writes)
+            for write in writes:
+                self._pending_sessions[write['session_id']] = self._pending_sessions.get(write['session_id'], 0) + 1
+            self._stats["queued"] += len(writes)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="shared-memory-writer", daemon=True)
+                self._worker.start()
+                atexit.register(self.close)
+        self._queue.put(writes)
+        return True
+
+    def _run(self):
+        while True:
+            group = self._queue.get()
+            if group is _STOP:
+                return
+            groups = [group]
+            size = len(group)
+            stop = False
+            # Gather whatever else arrives within the flush interval into the same transaction
+            deadline = time.monotonic() + self.flush_interval
+            while size < self.batch_size:
+                try:
+                    group = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+                if group is _STOP:
+                    stop = True
+                    break
+                groups.append(group)
+                size += len(group)
+            self._write(groups)
+            if stop:
+                return
+
+    def _write(self, groups: List[List[Dict[str, Any]]]):
+        batch = [write for group in groups for write in group]
+        try:
+            self._write_batch(batch)
+            failed = []
+        except Exception as e:
+            if len(groups) == 1:
+                # Transient errors (e.g. a concurrent session insert) usually clear on retry
+                print(f"⚠️ SHARED MEMORY: Batch of {len(batch)} writes failed, retrying: {e}")
+                time.sleep(self.flush_interval)
+            else:
+                # Retry each turn's writes alone so one bad write does not drop the others
+                print(f"⚠️ SHARED MEMORY: Batch of {len(batch)} writes failed, retrying its {len(groups)} turns separately: {e}")
+            with self._condition:
+                self._stats["retries"] += 1
+            failed = [group for group in groups if not self._write_group(group)]
+
+        with self._condition:
+            failed_writes = sum(len(group) for group in failed)
+            self._stats["written"] += len(batch) - failed_writes
+            self._stats["failed"] += failed_writes
+            self._stats["failed_groups"] += len(failed)
+            self.failed_groups.extend(failed)
+            self._stats["batches"] += 1
+            self._pending -= len(batch)
+            for write in batch:
+                session_id = write['session_id']
+                self._pending_sessions[session_id] -= 1
+                if not self._pending_sessions[session_id]:
+                    del self._pending_sessions[session_id]
+            self._condition.notify_all()
+
+    def _write_group(self, group: List[Dict[str, Any]]) -> bool:
+        try:
+            self._write_batch(group)
+            return True
+        except Exception as e:
+            session_ids = sorted({write['session_id'] for write in group})
+            print(f"❌ SHARED MEMORY: Dropped {len(group)} writes for session(s) {', '.join(session_ids)}: {e}")
+            return False
+
+    def wait_for_session(self, session_id: str, timeout: float = 5.0) -> bool:
+        """Block until the session has no queued writes (read-your-writes for the next turn)"""
+        with self._condition:
+            return self._condition.wait_for(lambda: session_id not in self._pending_sessions, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued write has been applied (or dropped)"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self, timeout: float = 30.0):
+        """Stop accepting writes, apply everything already queued and stop the worker"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            worker = self._worker
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join(timeout)
+            if worker.is_alive():
+                print(f"⚠️ SHARED MEMORY: {self._pending} queued writes not flushed within {timeout}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {**self._stats, "pending": self._pending, "pending_sessions": len(self._pending_sessions)}
@@ -0,0 +1,194 @@
+"""
+Speculative Routing Service
+
+In hybrid routing the persona router LLM call sits on the critical path before
+the chosen agent even starts. With speculation enabled the keyword-best agent
+starts streaming while the router LLM decides: the speculative stream is
+committed when the router agrees and cancelled when it does not.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from ..config import settings
+from .persona_router import persona_router, route_to_agent_async
+
+
+_STREAM_END = object()
+
+
+class SpeculationStats:
+    """Hit rate and wasted work of speculative agent execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+        self.saved_ms = 0.0
+
+    def record_hit(self, overlapped_ms: float):
+        with self._lock:
+            self.attempts += 1
+            self.hits += 1
+            self.saved_ms += overlapped_ms
+
+    def record_miss(self, wasted_tokens: int):
+        with self._lock:
+            self.attempts += 1
+            self.misses += 1
+            self.wasted_tokens += wasted_tokens
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / self.attempts, 3) if self.attempts else 0.0,
+                # Streamed completion chunks of cancelled speculations (~1 token each)
+                "wasted_tokens": self.wasted_tokens,
+                "avg_saved_ms": round(self.saved_ms / self.hits, 1) if self.hits else 0.0
+            }
+
+
+class SpeculativeStream:
+    """Pumps an agent stream into a buffer so it can later be committed or cancelled"""
+
+    def __init__(self, chunks: AsyncIterator[str]):
+        self.tokens = 0
+        self._buffer: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._pump(chunks))
+
+    async def _pump(self, chunks: AsyncIterator[str]):
+        try:
+            async for chunk in chunks:
+                self.tokens += 1
+                await self._buffer.put(chunk)
+        except asyncio.CancelledError:
+            await chunks.aclose()
+            raise
+        except Exception as e:
+            await self._buffer.put(f"Error calling LLM: {str(e)}")
+        finally:
+            self._buffer.put_nowait(_STREAM_END)
+
+    async def commit(self) -> AsyncIterator[str]:
+        """Yield everything buffered so far, then the rest of the stream as it arrives"""
+        while True:
+            chunk = await self._buffer.get()
+            if chunk is _STREAM_END:
+                return
+            yield chunk
+
+    async def cancel(self) -> int:
+        """Stop the speculative stream and return how many chunks it produced"""
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        return self.tokens
+
+
+class Speculation:
+    """
+    One speculative routing attempt: the router runs in a worker thread while
+    the keyword candidate's stream is started by the caller via launch().
+    """
+
+    def __init__(self, candidate: Dict[str, Any], confidence: float, routing_args: tuple):
+        self.candidate = candidate
+        self.candidate_confidence = confidence
+        self.stream: Optional[SpeculativeStream] = None
+        self._started_at = time.perf_counter()
+        self._launched_at = None
+        self._routing = asyncio.ensure_future(route_to_agent_async(*routing_args))
+
+    @property
+    def provisional_result(self) -> Dict[str, Any]:
+        """Routing result used to prepare the candidate agent before the router decides"""
+        return {
+            'agent': self.candidate,
+            'agent_id': self.candidate['id'],
+            'confidence': self.candidate_confidence,
+            'method': 'speculative_keywords',
+            'fallback_used': False,
+            'reasoning': "Keyword candidate started speculatively while the router decides"
+        }
+
+    def launch(self, start_stream: Callable[[], AsyncIterator[str]]):
+        """Start the candidate agent's stream"""
+        self._launched_at = time.perf_counter()
+        self.stream = SpeculativeStream(start_stream())
+
+    async def resolve(self) -> Dict[str, Any]:
+        """
+        Wait for the router. Returns its routing result with `speculation` set to
+        "hit" (the launched stream was committed) or "miss" (it was cancelled).
+        """
+        routing_result = await self._routing
+        decided_at = time.perf_counter()
+
+        if routing_result.get('agent_id') == self.candidate['id']:
+            overlapped_ms = (decided_at - (self._launched_at or decided_at)) * 1000
+            speculation_stats.record_hit(overlapped_ms)
+            routing_result = {**routing_result, 'speculation': 'hit'}
+            print(f"🎯 SPECULATION: Router agreed with '{self.candidate['data'].get('name', 'Unnamed Agent')}' - committing ({overlapped_ms:.0f}ms overlapped)")
+        else:
+            wasted = await self.stream.cancel() if self.stream else 0
+            speculation_stats.record_miss(wasted)
+            routing_result = {**routing_result, 'speculation': 'miss'}
+            print(f"↩️ SPECULATION: Router chose '{routing_result['agent']['data'].get('name', 'Unnamed Agent')}' - cancelled candidate ({wasted} chunks wasted)")
+
+        routing_result['routing_ms'] = round((decided_at - self._started_at) * 1000, 1)
+        return routing_result
+
+    async def abort(self):
+        """Tear down on client disconnect or errors"""
+        if self.stream:
+            await self.stream.cancel()
+        self._routing.cancel()
+
+
+def speculation_enabled(router_config: Dict[str, Any]) -> bool:
+    intents = router_config.get('intents', {})
+    if intents.get('method', 'hybrid') != 'hybrid':
+        return False
+    return bool(intents.get('speculative', settings.PERSONA_ROUTER_SPECULATION))
+
+
+def start_speculation(
+    user_input: str,
+    router_config: Dict[str, Any],
+    connected_agents: List[Dict[str, Any]],
+    workflow_nodes: List[Dict[str, Any]] = None,
+    workflow_connections: List[Dict[str, Any]] = None,
+    session_id: str = None
+) -> Optional[Speculation]:
+    """
+    Start routing in the background and pick the keyword candidate to run
+    speculatively. Returns None when there is nothing to speculate on (routing
+    disabled, a single agent, or no trigger match) - callers route normally then.
+    """
+    if len(connected_agents) < 2 or not speculation_enabled(router_config):
+        return None
+
+    candidate, confidence = persona_router.keyword_candidate(
+        user_input, router_config, connected_agents, settings.PERSONA_ROUTER_SPECULATION_MIN_CONFIDENCE
+    )
+    if not candidate:
+        return None
+
+    print(f"⚡ SPECULATION: Starting '{candidate['data'].get('name', 'Unnamed Agent')}' (keyword confidence {confidence:.2f}) while the router decides")
+    return Speculation(
+        candidate, confidence,
+        (user_input, router_config, connected_agents, workflow_nodes, workflow_connections, session_id)
+    )
+
+
+# Global instance
+speculation_stats = SpeculationStats()
@@ -0,0 +1,150 @@
+"""
+Stream Writer Service
+
+Frames streaming responses for the chat endpoints. Model tokens are coalesced
+into a single frame per time window or byte budget instead of one frame (and
+one json.dumps) per token, and status events are emitted according to a
+configurable mode with no artificial delays.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Optional
+
+from ..config import settings
+
+
+FRAME_FORMATS = ("sse", "ndjson")
+STATUS_MODES = ("full", "minimal", "off")
+
+
+class StreamWriter:
+    """
+    Builds frames for a single streaming response.
+
+    Frame formats:
+    - sse: `data: {...}\\n\\n` frames (default, used by the web frontend)
+    - ndjson: one compact JSON object per line for high-volume API clients
+
+    Status modes:
+    - full: every status event is sent
+    - minimal: only essential status events are sent
+    - off: no status events are sent
+    """
+
+    def __init__(
+        self,
+        frame_format: str = None,
+        status_mode: str = None,
+        coalesce_ms: int = None,
+        max_frame_bytes: int = None
+    ):
+        self.frame_format = (frame_format or settings.STREAM_FRAME_FORMAT).lower()
+        if self.frame_format not in FRAME_FORMATS:
+            raise ValueError(f"Unknown stream format: {self.frame_format}")
+
+        self.status_mode = (status_mode or settings.STREAM_STATUS_EVENTS).lower()
+        if self.status_mode not in STATUS_MODES:
+            raise ValueError(f"Unknown status event mode: {self.status_mode}")
+
+        self.coalesce_ms = settings.STREAM_COALESCE_MS if coalesce_ms is None else max(int(coalesce_ms), 0)
+        self.max_frame_bytes = settings.STREAM_MAX_FRAME_BYTES if max_frame_bytes is None else max(int(max_frame_bytes), 1)
+
+    @classmethod
+    def from_options(cls, options: Optional[Dict[str, Any]]) -> "StreamWriter":
+        """Create a writer from a request's `stream_options` payload"""
+        options = options or {}
+        return cls(
+            frame_format=options.get("format"),
+            status_mode=options.get("status_events"),
+            coalesce_ms=options.get("coalesce_ms"),
+            max_frame_bytes=options.get("max_frame_bytes")
+        )
+
+    @property
+    def media_type(self) -> str:
+        return "application/x-ndjson" if self.frame_format == "ndjson" else "text/event-stream"
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Content-Type": self.media_type,
+        }
+
+    def frame(self, payload: Dict[str, Any]) -> str:
+        """Serialize one event into a frame"""
+        data = json.dumps(payload, separators=(",", ":"))
+        if self.frame_format == "ndjson":
+            return f"{data}\n"
+        return f"data: {data}\n\n"
+
+    def status(self, message: str, essential: bool = False) -> Optional[str]:
+        """Build a status frame, or None if the current mode suppresses it"""
+        if self.status_mode == "off":
+            return None
+        if self.status_mode == "minimal" and not essential:
+            return None
+        return self.frame({"status": message, "type": "status"})
+
+    async def coalesce(self, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+        """
+        Turn a stream of model tokens into content frames.
+
+        Tokens are buffered until the coalescing window (measured from the first
+        buffered token) elapses or the buffer reaches max_frame_bytes, then
+        flushed as one frame. The window is enforced even while the source is
+        idle, so a slow model never holds tokens back longer than coalesce_ms.
+        """
+        if self.coalesce_ms <= 0:
+            async for chunk in chunks:
+                if chunk:
+                    yield self.frame({"content": chunk})
+            return
+
+        loop = asyncio.get_running_loop()
+        window = self.coalesce_ms / 1000
+        iterator = chunks.__aiter__()
+        buffer = []
+        buffered_bytes = 0
+        deadline = None
+        pending = None
+
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+                if not done:
+                    # Window elapsed while waiting on the model - flush what we have
+                    yield self.frame({"content": "".join(buffer)})
+                    buffer, buffered_bytes, deadline = [], 0, None
+                    continue
+
+                finished, pending = pending, None
+                try:
+                    chunk = finished.result()
+                except StopAsyncIteration:
+                    break
+
+                if not chunk:
+                    continue
+
+                buffer.append(chunk)
+                buffered_bytes += len(chunk.encode("utf-8"))
+                if deadline is None:
+                    deadline = loop.time() + window
+
+                if buffered_bytes >= self.max_frame_bytes or loop.time() >= deadline:
+                    yield self.frame({"content": "".join(buffer)})
+                    buffer, buffered_bytes, deadline = [], 0, None
+
+            if buffer:
+                yield self.frame({"content": "".join(buffer)})
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
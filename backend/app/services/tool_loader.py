@@ -11,6 +11,7 @@ from ..db import models
 from ..services.tools import ALL_TOOLS, TOOL_METADATA
 from .mcp_manager import MCPManager
 from .cache_service import cache_service
+from .lookups import get_tool_id
 
 # Global tool registry cache - loaded once and reused
 _GLOBAL_TOOL_REGISTRY = None
@@ -233,13 +234,15 @@ class ToolLoader:
     def _record_tool_usage(self, tool_name: str, success: bool):
         """Record tool usage statistics in database"""
         try:
-            tool = self.db.query(models.Tool).filter(models.Tool.name == tool_name).first()
-            if tool:
-                tool.usage_count += 1
+            tool_id = get_tool_id(self.db, tool_name)
+            if tool_id:
+                # Increment in the database: no row read, no lost updates between workers
+                counts = {models.Tool.usage_count: models.Tool.usage_count + 1}
                 if success:
-                    tool.success_count += 1
+                    counts[models.Tool.success_count] = models.Tool.success_count + 1
                 else:
-                    tool.failure_count += 1
+                    counts[models.Tool.failure_count] = models.Tool.failure_count + 1
+                self.db.query(models.Tool).filter(models.Tool.id == tool_id).update(counts, synchronize_session=False)
                 self.db.commit()
         except Exception as e:
             print(f"⚠️ Failed to record tool usage: {e}")
@@ -0,0 +1,161 @@
+"""
+Trigger Matcher
+
+Multi-pattern keyword matching for persona routing. Trigger keywords of all
+personas are compiled into one Aho-Corasick automaton, so an input is scanned
+once regardless of how many triggers are configured, instead of one substring
+scan per trigger. Compiled matchers are cached by a hash of their triggers.
+"""
+
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, Hashable, List, Sequence, Tuple
+
+
+# Below this many patterns C-level substring scans beat a Python automaton walk
+LINEAR_SCAN_MAX_PATTERNS = 200
+
+
+class TriggerMatcher:
+    """
+    Aho-Corasick automaton over groups of case-insensitive trigger patterns.
+    A group is e.g. one persona; counts are reported per group. Small configs
+    (up to LINEAR_SCAN_MAX_PATTERNS) scan the pre-lowercased patterns directly.
+    """
+
+    def __init__(self, groups: Dict[Hashable, Sequence[str]]):
+        self.pattern_count = 0
+        # Trie as one transition dict per state; state 0 is the root
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: ids of patterns ending here (including via fail links)
+        self._output: List[List[int]] = [[]]
+        self._pattern_group: List[Hashable] = []
+        # Empty triggers match every input (same as `"" in text`)
+        self._always: Dict[Hashable, int] = {}
+        self._exact: Dict[str, Dict[Hashable, int]] = {}
+        self._linear: List[Tuple[str, Hashable]] = []
+
+        for group, patterns in groups.items():
+            for pattern in patterns:
+                self._add(group, str(pattern).lower())
+        self._build_fail_links()
+
+    def _add(self, group: Hashable, pattern: str):
+        self.pattern_count += 1
+        exact = self._exact.setdefault(pattern, {})
+        exact[group] = exact.get(group, 0) + 1
+
+        if not pattern:
+            self._always[group] = self._always.get(group, 0) + 1
+            return
+        self._linear.append((pattern, group))
+
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state].append(len(self._pattern_group))
+        self._pattern_group.append(group)
+
+    def _build_fail_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def _matched_patterns(self, text: str, stop_at_first: bool = False) -> set:
+        if len(self._linear) <= LINEAR_SCAN_MAX_PATTERNS:
+            matched = set()
+            for pattern_id, (pattern, _) in enumerate(self._linear):
+                if pattern in text:
+                    matched.add(pattern_id)
+                    if stop_at_first:
+                        break
+            return matched
+
+        goto, fail, output = self._goto, self._fail, self._output
+        matched = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                matched.update(output[state])
+                if stop_at_first:
+                    break
+        return matched
+
+    def counts(self, text: str) -> Dict[Hashable, int]:
+        """
+        Number of a group's triggers that occur in the text (each trigger counted
+        once, like `sum(1 for t in triggers if t in text)`). The text is expected
+        to be lowercased already.
+        """
+        counts = dict(self._always)
+        for pattern_id in self._matched_patterns(text):
+            group = self._pattern_group[pattern_id]
+            counts[group] = counts.get(group, 0) + 1
+        return counts
+
+    def exact_counts(self, text: str) -> Dict[Hashable, int]:
+        """Number of a group's triggers equal to the (lowercased) text"""
+        return self._exact.get(text, {})
+
+    def matches_any(self, text: str) -> bool:
+        """Whether any trigger occurs in the (lowercased) text; stops at the first match"""
+        return bool(self._always) or bool(self._matched_patterns(text, stop_at_first=True))
+
+
+def _config_key(groups: Dict[Hashable, Sequence[str]]) -> tuple:
+    """Hashable snapshot of a trigger configuration (dict lookups hash it natively)"""
+    return tuple((group, tuple(patterns)) for group, patterns in groups.items())
+
+
+class TriggerMatcherCache:
+    """Compiled matchers keyed by trigger configuration hash (LRU bounded)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._matchers: "OrderedDict[tuple, TriggerMatcher]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "compiled": 0}
+
+    def get(self, groups: Dict[Hashable, Sequence[str]]) -> TriggerMatcher:
+        key = _config_key(groups)
+        with self._lock:
+            matcher = self._matchers.get(key)
+            if matcher:
+                self._matchers.move_to_end(key)
+                self._stats["hits"] += 1
+                return matcher
+
+        matcher = TriggerMatcher(groups)
+        with self._lock:
+            self._matchers[key] = matcher
+            self._stats["compiled"] += 1
+            while len(self._matchers) > self.max_entries:
+                self._matchers.popitem(last=False)
+        return matcher
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "entries": len(self._matchers)}
+
+
+# Global instance
+trigger_matcher_cache = TriggerMatcherCache()
@@ -0,0 +1,221 @@
+"""
+Vector Router Service
+
+Offline, CPU-only agent selection for the persona router. Each connected agent
+gets a hashed TF-IDF vector built from its routing summary, system prompt and
+connected tool descriptions; user input is routed by cosine similarity. The
+LLM router is only needed when the top two agents are too close to call.
+"""
+
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..config import settings
+from .cache_service import cache_service
+from .routing_cache import routing_cache, stable_digest
+
+
+# Hashed feature space (collisions are rare enough at routing-document sizes)
+VECTOR_DIMENSIONS = 2 ** 16
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about an and are as at be been but by can could do does for from has have how i if in into is it its
+me my no not of on or our please should so than that the their them then there these they this to
+up us was we what when where which who why will with would you your
+""".split())
+
+
+def _tokens(text: str) -> List[str]:
+    """Lowercased words without stopwords, plus adjacent word bigrams"""
+    words = [w for w in _TOKEN_PATTERN.findall(text.lower()) if w not in STOPWORDS and len(w) > 1]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+
+def _feature(token: str) -> int:
+    # crc32 is stable across processes (unlike hash()), so indexes are reproducible
+    return zlib.crc32(token.encode("utf-8")) % VECTOR_DIMENSIONS
+
+
+def term_frequencies(text: str) -> Dict[int, float]:
+    """Sublinear (1 + log tf) term weights in hashed feature space"""
+    counts = Counter(_feature(token) for token in _tokens(text))
+    return {feature: 1.0 + math.log(count) for feature, count in counts.items()}
+
+
+class AgentVectorIndex:
+    """TF-IDF vectors of a fixed set of agents (one row per agent)"""
+
+    def __init__(self, agent_ids: List[str], document_terms: List[Dict[int, float]]):
+        self.agent_ids = agent_ids
+
+        # Smoothed IDF over the agents' own documents: terms shared by every
+        # agent (e.g. "assistant", "help") carry little routing signal
+        document_frequency = Counter(feature for terms in document_terms for feature in terms)
+        n_documents = len(document_terms)
+        self._idf = {
+            feature: math.log((1 + n_documents) / (1 + df)) + 1.0
+            for feature, df in document_frequency.items()
+        }
+
+        self._features = np.array(sorted(self._idf), dtype=np.int64)
+        self._column = {feature: i for i, feature in enumerate(self._features.tolist())}
+        idf = np.array([self._idf[feature] for feature in self._features.tolist()], dtype=np.float32)
+
+        self._matrix = np.zeros((n_documents, len(self._features)), dtype=np.float32)
+        for row, terms in enumerate(document_terms):
+            for feature, weight in terms.items():
+                self._matrix[row, self._column[feature]] = weight
+        self._matrix *= idf
+        norms = np.linalg.norm(self._matrix, axis=1, keepdims=True)
+        self._matrix /= np.where(norms == 0, 1.0, norms)
+        self._query_idf = idf
+
+    def scores(self, text: str) -> np.ndarray:
+        """Cosine similarity of the text to every agent (terms unseen in any agent document are ignored)"""
+        query = np.zeros(len(self._features), dtype=np.float32)
+        for feature, weight in term_frequencies(text).items():
+            column = self._column.get(feature)
+            if column is not None:
+                query[column] = weight
+        query *= self._query_idf
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return np.zeros(len(self.agent_ids), dtype=np.float32)
+        return self._matrix @ (query / norm)
+
+
+class VectorRouter:
+    """Builds (and caches) agent vector indexes and ranks agents for user input"""
+
+    def _agent_profiles(
+        self,
+        connected_agents: List[Dict[str, Any]],
+        workflow_nodes: List[Dict[str, Any]],
+        workflow_connections: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        from .persona_router import persona_router
+        try:
+            from .tools import TOOL_METADATA
+        except ImportError:
+            TOOL_METADATA = {}
+
+        profiles = []
+        for agent in connected_agents:
+            tools = persona_router._get_agent_connected_tools(
+                agent.get('id'), workflow_nodes or [], workflow_connections or []
+            )
+            profiles.append({
+                'id': agent['id'],
+                'name': agent['data'].get('name', 'Unnamed Agent'),
+                'database_id': agent['data'].get('databaseId'),
+                'system_prompt': agent['data'].get('systemPrompt', ''),
+                'tools': [
+                    f"{tool} {tool.replace('_', ' ')} {TOOL_METADATA.get(tool, {}).get('description', '')}"
+                    for tool in tools if tool
+                ]
+            })
+        return profiles
+
+    def get_index(
+        self,
+        connected_agents: List[Dict[str, Any]],
+        workflow_nodes: List[Dict[str, Any]] = None,
+        workflow_connections: List[Dict[str, Any]] = None
+    ) -> AgentVectorIndex:
+        """Index for these agents, rebuilt only when their prompts or tools change"""
+        profiles = self._agent_profiles(connected_agents, workflow_nodes, workflow_connections)
+        profile_hash = stable_digest(profiles)
+        # Routing cache generation: agent edits (e.g. new routing summaries) force a rebuild
+        cache_key = f"vector_index:{routing_cache.generation}:{profile_hash}"
+
+        index = cache_service.get(cache_key)
+        if index:
+            return index
+
+        from .agent_profile_index import agent_profile_index
+        document_terms = []
+        with_summaries = 0
+        for profile in profiles:
+            saved = agent_profile_index.get(profile['database_id'])
+            # Name is repeated so "ask the <name>" style requests weigh it
+            header = '\n'.join([profile['name'], profile['name'], *profile['tools']])
+            if saved and saved['system_prompt'] == profile['system_prompt']:
+                # Saved agent unchanged on the canvas: reuse its precomputed summary/prompt vector
+                terms = term_frequencies(header)
+                for feature, weight in saved['terms'].items():
+                    terms[feature] = terms.get(feature, 0.0) + weight
+            else:
+                summary = saved['routing_summary'] if saved else None
+                terms = term_frequencies('\n'.join([header, summary or '', profile['system_prompt']]))
+            with_summaries += bool(saved and saved['routing_summary'])
+            document_terms.append(terms)
+
+        index = AgentVectorIndex([p['id'] for p in profiles], document_terms)
+        cache_service.set(cache_key, index, ttl_seconds=settings.VECTOR_ROUTER_INDEX_TTL_SECONDS)
+        print(f"🧮 VECTOR ROUTER: Built index for {len(profiles)} agents ({with_summaries} with routing summaries)")
+        return index
+
+    def rank(
+        self,
+        user_input: str,
+        connected_agents: List[Dict[str, Any]],
+        workflow_nodes: List[Dict[str, Any]] = None,
+        workflow_connections: List[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Agents ordered by similarity: [{'agent', 'agent_id', 'score'}, ...]"""
+        index = self.get_index(connected_agents, workflow_nodes, workflow_connections)
+        scores = index.scores(user_input)
+        order = np.argsort(-scores, kind="stable")
+        return [
+            {'agent': connected_agents[i], 'agent_id': index.agent_ids[i], 'score': float(scores[i])}
+            for i in order.tolist()
+        ]
+
+    def route(
+        self,
+        user_input: str,
+        connected_agents: List[Dict[str, Any]],
+        workflow_nodes: List[Dict[str, Any]] = None,
+        workflow_connections: List[Dict[str, Any]] = None,
+        min_margin: float = None,
+        min_score: float = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Routing result when the best agent clearly wins, else None (the caller
+        falls back to LLM routing). The margin is relative: (top - second) / top.
+        """
+        min_margin = settings.VECTOR_ROUTER_MIN_MARGIN if min_margin is None else min_margin
+        min_score = settings.VECTOR_ROUTER_MIN_SCORE if min_score is None else min_score
+
+        ranked = self.rank(user_input, connected_agents, workflow_nodes, workflow_connections)
+        best = ranked[0]
+        second_score = ranked[1]['score'] if len(ranked) > 1 else 0.0
+        margin = (best['score'] - second_score) / best['score'] if best['score'] > 0 else 0.0
+        scores = {r['agent_id']: round(r['score'], 4) for r in ranked}
+
+        agent_name = best['agent']['data'].get('name', 'Unnamed Agent')
+        if best['score'] < min_score or margin < min_margin:
+            print(f"🧮 VECTOR ROUTER: Too close to call - best '{agent_name}' score {best['score']:.3f}, margin {margin:.2f}")
+            return None
+
+        print(f"🧮 VECTOR ROUTER: Selected '{agent_name}' - score {best['score']:.3f}, margin {margin:.2f}")
+        return {
+            'agent': best['agent'],
+            'agent_id': best['agent_id'],
+            'confidence': round(0.5 + 0.5 * margin, 3),
+            'method': 'vector_similarity',
+            'fallback_used': False,
+            'reasoning': f"Closest agent profile '{agent_name}' (similarity {best['score']:.2f}, margin {margin:.2f})",
+            'vector_scores': scores
+        }
+
+
+# Global instance
+vector_router = VectorRouter()
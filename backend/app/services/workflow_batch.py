@@ -0,0 +1,340 @@
+"""
+Workflow Batch Service
+
+Runs one visual-editor workflow over many inputs. The workflow is compiled once
+(node graph resolution, LLM configs, tool loading) and each item then only pays
+for routing and agent execution. Items run concurrently up to a per-batch limit
+on top of the shared LLM rate limiter, on a thread pool of their own. Each
+completed item is stored as a batch_item_results row, so a dropped batch can be
+resumed with the same batch_id.
+"""
+
+import asyncio
+import csv
+import io
+import uuid
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional, AsyncIterator
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..db import models
+from ..db.database import SessionLocal
+from ..config import settings
+from .lookups import get_file_info, get_llm_config, detached_llm_config
+from .request_timer import RequestTimer
+from .tool_loader import create_tool_loader, get_tools_description_for_llm
+
+
+# Batch items block on LLM calls for a long time; keeping them off the default
+# executor leaves that free for token streaming and routing fallbacks
+_batch_executor = ThreadPoolExecutor(max_workers=settings.BATCH_MAX_CONCURRENCY, thread_name_prefix="workflow-batch")
+
+
+class WorkflowCompileError(ValueError):
+    """Raised when a workflow graph cannot be executed"""
+
+
+class CompiledWorkflow:
+    """
+    Execution plan for a workflow: the entry node, the agents it can hand off
+    to with their resolved LLM configs, and the workflow's loaded tools.
+    """
+
+    def __init__(self, nodes: List[Dict], connections: List[Dict]):
+        self.nodes = nodes
+        self.connections = connections
+        self.router_node: Optional[Dict] = None
+        self.router_config: Dict[str, Any] = {}
+        self.connected_agents: List[Dict] = []
+        self.agent_plans: Dict[str, Dict[str, Any]] = {}
+        self.workflow_tools: Dict[str, Any] = {}
+        self.tools_description: str = ""
+
+    def _connected_node(self, source_id: str, node_type: str) -> Optional[Dict]:
+        nodes_by_id = {n.get("id"): n for n in self.nodes}
+        for connection in self.connections:
+            target = nodes_by_id.get(connection.get("target"))
+            if connection.get("source") == source_id and target and target.get("type") == node_type:
+                return target
+        return None
+
+    def _plan_agent(self, agent_node: Dict, db: Session):
+        """Resolve the LLM config and memory settings for one agent node"""
+        llm_node = self._connected_node(agent_node.get("id"), "llm")
+        if not llm_node:
+            raise WorkflowCompileError(f"No LLM node connected to agent '{agent_node.get('data', {}).get('name', 'Unnamed')}'")
+
+        saved_config_id = llm_node.get("data", {}).get("savedConfigId")
+        if saved_config_id:
+            saved_llm_config = get_llm_config(db, saved_config_id)
+            if not saved_llm_config:
+                raise WorkflowCompileError(f"Saved LLM config {saved_config_id} not found")
+            # Transient copy, so worker threads can read it after the request session closes
+            llm_config = detached_llm_config(saved_llm_config)
+        else:
+            llm_config = models.LLMConfig(
+                id=uuid.uuid4(),
+                provider=llm_node.get("data", {}).get("provider", "Azure OpenAI"),
+                model_name=llm_node.get("data", {}).get("model", "gpt-4"),
+                temperature=str(llm_node.get("data", {}).get("temperature", 0.7)),
+                max_tokens=str(llm_node.get("data", {}).get("maxTokens", 4000)),
+                api_base=llm_node.get("data", {}).get("apiBase", ""),
+                api_key_secret_ref=llm_node.get("data", {}).get("apiKeySecretRef", "")
+            )
+
+        self.agent_plans[agent_node.get("id")] = {
+            "node": agent_node,
+            "llm_config": llm_config,
+            "memory_node": self._connected_node(agent_node.get("id"), "memory")
+        }
+
+    async def compile(self, db: Session) -> "CompiledWorkflow":
+        """Resolve the graph and load tools once for the whole batch"""
+        self.router_node = next((n for n in self.nodes if n.get("type") == "persona_router"), None)
+
+        if self.router_node:
+            router_id = self.router_node.get("id")
+            nodes_by_id = {n.get("id"): n for n in self.nodes}
+            for connection in self.connections:
+                target = nodes_by_id.get(connection.get("target"))
+                if connection.get("source") == router_id and target and target.get("type") == "agent":
+                    self.connected_agents.append(target)
+
+            if not self.connected_agents:
+                raise WorkflowCompileError("No agents connected to persona router")
+
+            self.router_config = dict(self.router_node.get("data", {}))
+            llm_node_for_router = self._connected_node(router_id, "llm")
+            if llm_node_for_router:
+                self.router_config["_llm_node"] = llm_node_for_router
+
+            for agent_node in self.connected_agents:
+                self._plan_agent(agent_node, db)
+        else:
+            agent_node = next((n for n in self.nodes if n.get("type") == "agent"), None)
+            if not agent_node:
+                raise WorkflowCompileError("No agent or persona router node found in workflow")
+            self._plan_agent(agent_node, db)
+
+        tool_loader = create_tool_loader(db)
+        self.workflow_tools = await tool_loader.get_tools_for_workflow(self.nodes) or {}
+        if self.workflow_tools:
+            self.tools_description = get_tools_description_for_llm(self.workflow_tools)
+
+        print(f"🧩 BATCH: Compiled workflow - {len(self.agent_plans)} agent(s), {len(self.workflow_tools)} tool(s), router: {bool(self.router_node)}")
+        return self
+
+    def run(self, user_input: str) -> Dict[str, Any]:
+        """Execute the compiled workflow for one input (blocking - call from a worker thread)"""
+        from .orchestrator import execute_single_agent
+        from .persona_router import route_to_agent
+
+        timer = RequestTimer()
+        routing = None
+
+        if self.router_node:
+            with timer.stage("persona_routing"):
+                routing_result = route_to_agent(
+                    user_input, self.router_config, self.connected_agents, self.nodes, self.connections, None
+                )
+            selected_node = routing_result["agent"]
+            plan = self.agent_plans.get(selected_node.get("id"))
+            routing = {
+                "method": routing_result.get("method", "unknown"),
+                "confidence": routing_result.get("confidence", 0)
+            }
+        else:
+            plan = next(iter(self.agent_plans.values()))
+
+        node_data = plan["node"].get("data", {})
+        agent = models.Agent(
+            id=uuid.uuid4(),
+            name=node_data.get("name", "Workflow Agent"),
+            description=node_data.get("description", "Temporary agent for batch execution"),
+            system_prompt=node_data.get("systemPrompt", "You are a helpful AI assistant." if self.router_node else ""),
+            status=models.AgentStatus.active
+        )
+        agent.llm_config = plan["llm_config"]
+
+        prev_output = {"attachments": [], "response": "", "request_timer": timer}
+        if self.workflow_tools:
+            prev_output["available_tools"] = self.workflow_tools
+            prev_output["tools_description"] = self.tools_description
+
+        result = execute_single_agent(agent=agent, message=user_input, files=[], prev_output=prev_output)
+
+        item = {
+            "status": "error" if "error" in result else "ok",
+            "response": result.get("error") or result.get("response", ""),
+            "agent_name": agent.name,
+            "tool_calls": [tc.function.name for tc in result.get("tool_calls") or [] if hasattr(tc, "function")],
+            "timings": timer.finish()
+        }
+        if routing:
+            item["routing"] = routing
+        return item
+
+
+def _read_file_text(file_info: Dict[str, Any]) -> str:
+    """Contents of an uploaded file, from blob storage or the local uploads directory (blocking)"""
+    if file_info['url'].startswith("http"):
+        with urllib.request.urlopen(file_info['url']) as response:
+            return response.read().decode("utf-8-sig")
+    file_path = Path(f"uploads/{file_info['url'].split('/')[-1]}")
+    if not file_path.exists():
+        raise WorkflowCompileError(f"File {file_info['filename']} is missing from storage")
+    return file_path.read_text(encoding="utf-8-sig")
+
+
+async def load_batch_inputs(db: Session, file_id: str, input_column: Optional[str] = None) -> List[str]:
+    """Read batch inputs from one column of an uploaded CSV file (first column by default)"""
+    file_info = get_file_info(db, file_id)
+    if not file_info:
+        raise WorkflowCompileError(f"File {file_id} not found")
+
+    text = await asyncio.to_thread(_read_file_text, file_info)
+
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise WorkflowCompileError(f"File {file_info['filename']} has no header row")
+
+    column = input_column or reader.fieldnames[0]
+    if column not in reader.fieldnames:
+        raise WorkflowCompileError(f"Column '{column}' not found in {file_info['filename']}. Available: {reader.fieldnames}")
+
+    return [row.get(column) or "" for row in reader]
+
+
+def get_batch_checkpoint(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Batch size and completed item results of a batch, or None if nothing was stored for it (blocking)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.BATCH_CHECKPOINT_TTL_SECONDS)
+    db = SessionLocal()
+    try:
+        rows = db.query(models.BatchItemResult).filter(
+            models.BatchItemResult.batch_id == batch_id,
+            models.BatchItemResult.created_at >= cutoff
+        ).all()
+        if not rows:
+            return None
+        total = max(rows, key=lambda row: row.created_at).total
+        return {"total": total, "results": {row.item_index: row.result for row in rows if row.total == total}}
+    finally:
+        db.close()
+
+
+def _start_batch_checkpoint(batch_id: str, total: int) -> Dict[int, Dict[str, Any]]:
+    """
+    Completed results to resume from (blocking). Drops expired checkpoints, and
+    this batch's results if they were for a different number of inputs.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.BATCH_CHECKPOINT_TTL_SECONDS)
+    db = SessionLocal()
+    try:
+        db.query(models.BatchItemResult).filter(
+            models.BatchItemResult.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.query(models.BatchItemResult).filter(
+            models.BatchItemResult.batch_id == batch_id,
+            models.BatchItemResult.total != total
+        ).delete(synchronize_session=False)
+        db.commit()
+        rows = db.query(models.BatchItemResult.item_index, models.BatchItemResult.result).filter(
+            models.BatchItemResult.batch_id == batch_id
+        ).all()
+        return {row.item_index: row.result for row in rows}
+    finally:
+        db.close()
+
+
+def _save_batch_item(batch_id: str, total: int, index: int, item: Dict[str, Any]):
+    """Store one completed item (blocking); a failed write only costs re-running the item on resume"""
+    db = SessionLocal()
+    try:
+        db.add(models.BatchItemResult(batch_id=batch_id, item_index=index, total=total, result=item))
+        db.commit()
+    except IntegrityError:
+        # Already stored by a concurrent run of the same batch_id
+        db.rollback()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ BATCH {batch_id}: Could not checkpoint item {index}: {e}")
+    finally:
+        db.close()
+
+
+def _run_batch_item(compiled: CompiledWorkflow, batch_id: str, total: int, index: int, user_input: str) -> Dict[str, Any]:
+    """Execute one item and checkpoint its result (runs on the batch executor)"""
+    try:
+        item = compiled.run(user_input)
+    except Exception as e:
+        item = {"status": "error", "response": str(e)}
+    _save_batch_item(batch_id, total, index, item)
+    return item
+
+
+async def run_batch(
+    compiled: CompiledWorkflow,
+    inputs: List[str],
+    batch_id: str,
+    concurrency: int
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run all pending inputs and yield events as they happen:
+    `batch_started`, one `result` per item (in completion order, with progress)
+    and `batch_completed`. Items already in the batch checkpoint are replayed
+    from it instead of being executed again.
+    """
+    total = len(inputs)
+    loop = asyncio.get_running_loop()
+    completed_results = await asyncio.to_thread(_start_batch_checkpoint, batch_id, total)
+
+    pending = [index for index in range(total) if index not in completed_results]
+    resumed = total - len(pending)
+    failed = sum(1 for item in completed_results.values() if item.get("status") != "ok")
+
+    yield {"type": "batch_started", "batch_id": batch_id, "total": total, "resumed": resumed, "concurrency": concurrency}
+
+    completed = 0
+    for index, item in sorted(completed_results.items()):
+        completed += 1
+        yield {"type": "result", "index": index, "input": inputs[index], **item,
+               "from_checkpoint": True, "progress": {"completed": completed, "total": total, "failed": failed}}
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in pending:
+        queue.put_nowait(index)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            item = await loop.run_in_executor(
+                _batch_executor, _run_batch_item, compiled, batch_id, total, index, inputs[index]
+            )
+            await results.put((index, item))
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(pending)))]
+
+    try:
+        for _ in range(len(pending)):
+            index, item = await results.get()
+            completed += 1
+            if item.get("status") != "ok":
+                failed += 1
+
+            yield {"type": "result", "index": index, "input": inputs[index], **item,
+                   "progress": {"completed": completed, "total": total, "failed": failed}}
+    finally:
+        # Client went away or batch finished - stop picking up new items
+        for task in workers:
+            task.cancel()
+
+    yield {"type": "batch_completed", "batch_id": batch_id, "total": total, "succeeded": total - failed, "failed": failed}
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Add composite (session, created_at) indexes used by most-recent-N history reads:
+messages by shared session and by conversation, and agent handoffs by shared session
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import engine
+from sqlalchemy import text
+
+INDEXES = [
+    ("ix_messages_shared_session_id_created_at", "messages", "shared_session_id, created_at"),
+    ("ix_messages_conversation_id_created_at", "messages", "conversation_id, created_at"),
+    ("ix_agent_handoffs_shared_session_id_created_at", "agent_handoffs", "shared_session_id, created_at"),
+]
+
+
+def add_message_history_indexes():
+    """Create the indexes if missing (CONCURRENTLY on PostgreSQL, so writes are not blocked)"""
+    concurrently = "CONCURRENTLY " if engine.dialect.name == "postgresql" else ""
+    try:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for name, table, columns in INDEXES:
+                if concurrently:
+                    # An interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would keep
+                    invalid = conn.execute(text(
+                        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                        "WHERE c.relname = :name AND NOT i.indisvalid"
+                    ), {"name": name}).fetchone()
+                    if invalid:
+                        print(f"Dropping invalid index {name} left by an interrupted build")
+                        conn.execute(text(f"DROP INDEX CONCURRENTLY {name}"))
+                conn.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"))
+                print(f"✅ Index {name} on {table} ({columns}) is in place")
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("ANALYZE messages"))
+                conn.execute(text("ANALYZE agent_handoffs"))
+    except Exception as e:
+        print(f"❌ Error adding message history indexes: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    print("Adding message history indexes...")
+    success = add_message_history_indexes()
+    if success:
+        print("Database migration completed successfully!")
+    else:
+        print("Database migration failed!")
+        sys.exit(1)
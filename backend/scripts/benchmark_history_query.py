@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark: shared-session history reads at 1M messages.
+
+Compares the previous query (ORDER BY created_at ASC LIMIT n, which returned the
+oldest n messages) with the most-recent-N reader (ORDER BY created_at DESC LIMIT n
+on the composite (shared_session_id, created_at) index, reversed in memory),
+before and after the index exists.
+
+Uses a scratch SQLite database by default; pass --database-url to run against
+an empty PostgreSQL database instead. Never point it at the application database.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, insert, select
+
+from app.db import models
+
+MESSAGES = models.Message.__table__
+INDEX_NAME = "ix_messages_shared_session_id_created_at"
+
+
+def populate(engine, total_messages: int, sessions: int, rng: random.Random) -> list:
+    """Insert `sessions` shared sessions with total_messages messages spread over them"""
+    models.Base.metadata.create_all(engine, tables=[
+        models.Conversation.__table__, models.SharedSession.__table__, MESSAGES
+    ])
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(MESSAGES)).scalar()
+        if existing >= total_messages:
+            print(f"Reusing {existing:,} existing messages")
+            return [row[0] for row in conn.execute(select(models.SharedSession.__table__.c.id))]
+
+    session_ids = [uuid.uuid4() for _ in range(sessions)]
+    conversation_ids = [uuid.uuid4() for _ in range(sessions)]
+    with engine.begin() as conn:
+        conn.execute(insert(models.SharedSession.__table__), [
+            {"id": session_id, "session_id": f"bench-{n}"} for n, session_id in enumerate(session_ids)
+        ])
+        conn.execute(insert(models.Conversation.__table__), [{"id": c} for c in conversation_ids])
+
+    started_at = time.perf_counter()
+    base_time = datetime.utcnow() - timedelta(days=30)
+    chunk = []
+    for n in range(total_messages):
+        # Sessions interleave, like concurrent chats
+        index = rng.randrange(sessions)
+        chunk.append({
+            "id": uuid.uuid4(),
+            "conversation_id": conversation_ids[index],
+            "shared_session_id": session_ids[index],
+            "role": "user" if n % 2 else "assistant",
+            "content": f"message {n}",
+            "attachments": [],
+            "created_at": base_time + timedelta(milliseconds=n * 50)
+        })
+        if len(chunk) == 20000:
+            with engine.begin() as conn:
+                conn.execute(insert(MESSAGES), chunk)
+            chunk = []
+            print(f"\r  inserted {n + 1:,} messages", end="", flush=True)
+    if chunk:
+        with engine.begin() as conn:
+            conn.execute(insert(MESSAGES), chunk)
+    print(f"\r  inserted {total_messages:,} messages in {time.perf_counter() - started_at:.1f}s")
+    return session_ids
+
+
+def oldest_first(conn, session_id, limit: int) -> list:
+    """The previous reader: ascending order, so LIMIT keeps the oldest messages"""
+    return conn.execute(
+        select(MESSAGES.c.role, MESSAGES.c.content, MESSAGES.c.created_at)
+        .where(MESSAGES.c.shared_session_id == session_id)
+        .order_by(MESSAGES.c.created_at).limit(limit)
+    ).all()
+
+
+def most_recent(conn, session_id, limit: int) -> list:
+    """Descending keyset read of the newest messages, reversed to chronological order"""
+    rows = conn.execute(
+        select(MESSAGES.c.role, MESSAGES.c.content, MESSAGES.c.created_at)
+        .where(MESSAGES.c.shared_session_id == session_id)
+        .order_by(MESSAGES.c.created_at.desc()).limit(limit)
+    ).all()
+    return rows[::-1]
+
+
+def measure(engine, reader, session_ids: list, limit: int, queries: int, rng: random.Random) -> dict:
+    timings = []
+    with engine.connect() as conn:
+        reader(conn, session_ids[0], limit)  # warm up
+        for _ in range(queries):
+            session_id = rng.choice(session_ids)
+            started_at = time.perf_counter()
+            reader(conn, session_id, limit)
+            timings.append((time.perf_counter() - started_at) * 1000)
+    timings.sort()
+    return {
+        "p50": statistics.median(timings),
+        "p95": timings[int(len(timings) * 0.95) - 1],
+        "max": timings[-1]
+    }
+
+
+def report(label: str, result: dict):
+    print(f"  {label:<34} p50 {result['p50']:8.2f} ms   p95 {result['p95']:8.2f} ms   max {result['max']:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'judy_history_benchmark.db')}")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    engine = create_engine(args.database_url)
+    print(f"Database: {args.database_url}")
+    session_ids = populate(engine, args.messages, args.sessions, rng)
+    index = next(ix for ix in MESSAGES.indexes if ix.name == INDEX_NAME)
+
+    # Correctness: the old query returns the start of the conversation, not its latest turns
+    with engine.connect() as conn:
+        newest = conn.execute(
+            select(func.max(MESSAGES.c.created_at)).where(MESSAGES.c.shared_session_id == session_ids[0])
+        ).scalar()
+        old_rows = oldest_first(conn, session_ids[0], args.limit)
+        new_rows = most_recent(conn, session_ids[0], args.limit)
+    print(f"Latest message in session: {newest}")
+    print(f"  old query ends at {old_rows[-1].created_at}, new reader ends at {new_rows[-1].created_at}")
+
+    print(f"\n{args.queries} history reads of {args.limit} messages, {args.messages:,} messages over {args.sessions:,} sessions")
+    index.drop(engine, checkfirst=True)
+    print("Without index:")
+    report("ASC LIMIT (previous)", measure(engine, oldest_first, session_ids, args.limit, args.queries, rng))
+    report("DESC LIMIT + reverse", measure(engine, most_recent, session_ids, args.limit, args.queries, rng))
+
+    started_at = time.perf_counter()
+    index.create(engine)
+    print(f"With ({INDEX_NAME}), built in {time.perf_counter() - started_at:.1f}s:")
+    report("ASC LIMIT (previous)", measure(engine, oldest_first, session_ids, args.limit, args.queries, rng))
+    report("DESC LIMIT + reverse", measure(engine, most_recent, session_ids, args.limit, args.queries, rng))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Routing benchmark: replays a labeled dataset through PersonaRouter.select_agent
+for each routing method against a mock router LLM and reports accuracy,
+latency, LLM calls per request and cache hit rate as JSON.
+
+    python benchmark_routing.py                       # default dataset, all methods
+    python benchmark_routing.py --min-accuracy 0.8    # exit 1 on regressions (CI)
+
+Exits 1 whenever a routing call errors (including silent error/fallback
+results) or a method that always asks the LLM never reached the mock.
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import zlib
+from types import SimpleNamespace
+sys.path.append('../')
+
+# Router/service start-up logs go to stderr so stdout stays valid JSON
+with contextlib.redirect_stdout(sys.stderr):
+    from app.services.persona_router import persona_router
+    from app.services.routing_cache import routing_cache, invalidate_routing_cache
+
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_benchmark_dataset.json")
+
+# Router configurations compared: method name -> intents overrides
+METHODS = {
+    "keywords": {"method": "keywords"},
+    "llm": {"method": "llm"},
+    "hybrid": {"method": "hybrid"},
+    "hybrid_llm_only": {"method": "hybrid", "vectorRouting": False},
+    "vector": {"method": "vector"},
+}
+# Methods that ask the LLM on every uncached request
+LLM_METHODS = {"llm", "hybrid_llm_only"}
+# Keyword routing falls back to a default agent by design when no trigger matches
+EXPECTED_FALLBACK_METHODS = {"keywords"}
+
+
+class MockRouterLLM:
+    """
+    Stands in for the AzureOpenAI client used by the router. Answers
+    "<agent_id>:<confidence>" with the labeled agent with probability
+    `accuracy` (deterministic per input), after `latency_ms`.
+    """
+
+    def __init__(self, accuracy: float, latency_ms: float, seed: int):
+        self.accuracy = accuracy
+        self.latency_ms = latency_ms
+        self.seed = seed
+        self.calls = 0
+        self.case = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def with_options(self, **kwargs):
+        # The router sets per-call retries/timeouts; the mock ignores them
+        return self
+
+    def _create(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000)
+        user_input = kwargs["messages"][-1]["content"]
+        rng = random.Random(self.seed ^ zlib.crc32(user_input.encode("utf-8")))
+        expected = self.case["expected"]
+        if rng.random() < self.accuracy:
+            answer = f"{expected}:0.9"
+        else:
+            others = [a["id"] for a in self.case["agents"] if a["id"] != expected]
+            answer = f"{rng.choice(others)}:0.8" if others else "none:0.0"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=answer))])
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def load_cases(path: str) -> list:
+    with open(path) as f:
+        dataset = json.load(f)
+    cases = []
+    for case in dataset["cases"]:
+        workflow = dataset["workflows"][case["workflow"]]
+        cases.append({**case, **{
+            "router": workflow["router"],
+            "agents": workflow["agents"],
+            "nodes": workflow["agents"] + workflow.get("nodes", []),
+            "connections": workflow.get("connections", [])
+        }})
+    return cases
+
+
+def run_method(name: str, intents: dict, cases: list, mock: MockRouterLLM, passes: int, verbose: bool) -> dict:
+    with contextlib.redirect_stdout(sys.stderr):
+        invalidate_routing_cache(f"benchmark {name}")
+        cache_before = routing_cache.get_stats()
+    calls_before = mock.calls
+    latencies, correct, errors, fallbacks = [], 0, 0, 0
+
+    for _ in range(passes):
+        for case in cases:
+            mock.case = case
+            router_config = copy.deepcopy(case["router"])
+            router_config["intents"] = {**router_config.get("intents", {}), **intents}
+            output = None if verbose else io.StringIO()
+            started_at = time.perf_counter()
+            try:
+                with contextlib.redirect_stdout(output) if output else contextlib.nullcontext():
+                    result = persona_router.select_agent(
+                        case["input"], router_config, case["agents"], case["nodes"], case["connections"]
+                    )
+                correct += result.get("agent_id") == case["expected"]
+                fallbacks += bool(result.get("fallback_used"))
+                # A failed LLM/vector call is caught by the router and answered with a fallback agent
+                if "error" in str(result.get("method", "")) or (
+                        result.get("fallback_used") and name not in EXPECTED_FALLBACK_METHODS):
+                    errors += 1
+                    print(f"⚠️ {name}: '{case['input']}' fell back ({result.get('method')}): {result.get('reasoning')}",
+                          file=sys.stderr)
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ {name}: '{case['input']}' failed: {e}", file=sys.stderr)
+            latencies.append((time.perf_counter() - started_at) * 1000)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        cache_after = routing_cache.get_stats()
+    hits = cache_after["hits"] - cache_before["hits"]
+    lookups = hits + cache_after["misses"] - cache_before["misses"]
+    requests = len(latencies)
+    return {
+        "requests": requests,
+        "accuracy": round(correct / requests, 3) if requests else 0.0,
+        "errors": errors,
+        "fallbacks": fallbacks,
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2) if latencies else 0.0,
+            "p95": round(percentile(latencies, 95), 2),
+            "max": round(max(latencies), 2) if latencies else 0.0
+        },
+        "llm_calls_per_request": round((mock.calls - calls_before) / requests, 3) if requests else 0.0,
+        "cache_hit_rate": round(hits / lookups, 3) if lookups else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--methods", default=",".join(METHODS), help="comma separated subset of: " + ", ".join(METHODS))
+    parser.add_argument("--passes", type=int, default=2, help="replays of the dataset (later passes measure the cache)")
+    parser.add_argument("--llm-accuracy", type=float, default=0.9)
+    parser.add_argument("--llm-latency-ms", type=float, default=100)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-accuracy", type=float, default=None, help="exit with status 1 if any method is below this")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show router logs")
+    args = parser.parse_args()
+
+    cases = load_cases(args.dataset)
+    mock = MockRouterLLM(args.llm_accuracy, args.llm_latency_ms, args.seed)
+    persona_router.client = mock
+
+    report = {
+        "dataset": os.path.basename(args.dataset),
+        "cases": len(cases),
+        "passes": args.passes,
+        "mock_llm": {"accuracy": args.llm_accuracy, "latency_ms": args.llm_latency_ms},
+        "methods": {}
+    }
+    for name in args.methods.split(","):
+        report["methods"][name] = run_method(name, METHODS[name], cases, mock, args.passes, args.verbose)
+
+    body = json.dumps(report, indent=2)
+    print(body)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(body + "\n")
+
+    failed = False
+    errors = {n: m["errors"] for n, m in report["methods"].items() if m["errors"]}
+    if errors:
+        print(f"❌ Routing errors: {errors}", file=sys.stderr)
+        failed = True
+    no_llm_calls = [n for n, m in report["methods"].items() if n in LLM_METHODS and not m["llm_calls_per_request"]]
+    if no_llm_calls:
+        print(f"❌ No mock LLM calls recorded for: {', '.join(no_llm_calls)}", file=sys.stderr)
+        failed = True
+    if args.min_accuracy is not None:
+        failing = {n: m["accuracy"] for n, m in report["methods"].items() if m["accuracy"] < args.min_accuracy}
+        if failing:
+            print(f"❌ Accuracy below {args.min_accuracy}: {failing}", file=sys.stderr)
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
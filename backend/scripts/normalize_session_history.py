@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Move append-only JSON arrays into child tables:
+- shared_sessions.session_facts -> session_facts rows (unique per session)
+- persona_router_memory.routing_decisions -> routing_decisions rows (task_history
+  is the same data and is derived from them)
+- shared_sessions.agent_routing_history is already mirrored by agent_handoffs
+  and is read from there, so it only needs clearing
+
+Idempotent: facts are deduplicated by the unique index and decisions by
+(timestamp, input, selected agent), so a session that already has rows (e.g.
+decisions recorded since the deploy) still gets its legacy ones. Pass
+--clear-json to empty the legacy columns once the backfill has been checked.
+"""
+
+import sys
+import os
+import argparse
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db.database import engine, SessionLocal
+from app.db import models
+from app.services.shared_memory import fact_digest
+
+BATCH_SIZE = 500
+
+
+def _timestamp(value, fallback: datetime) -> datetime:
+    try:
+        return datetime.fromisoformat(value) if value else fallback
+    except (TypeError, ValueError):
+        return fallback
+
+
+def create_tables():
+    models.Base.metadata.create_all(bind=engine, tables=[
+        models.SessionFact.__table__, models.RoutingDecision.__table__
+    ])
+    print("✅ session_facts and routing_decisions tables are in place")
+
+
+def backfill_session_facts(db, clear_json: bool) -> int:
+    added = 0
+    query = db.query(models.SharedSession).filter(models.SharedSession.session_facts.isnot(None))
+    for shared_session in query.yield_per(BATCH_SIZE):
+        facts = shared_session.session_facts or []
+        if facts:
+            existing = {
+                row.fact_hash for row in db.query(models.SessionFact.fact_hash).filter(
+                    models.SessionFact.shared_session_id == shared_session.id
+                )
+            }
+            created_at = shared_session.created_at or datetime.utcnow()
+            for position, fact in enumerate(facts):
+                digest = fact_digest(str(fact))
+                if digest in existing:
+                    continue
+                existing.add(digest)
+                # Facts are read newest first by created_at; increasing timestamps keep the array order
+                db.add(models.SessionFact(
+                    shared_session_id=shared_session.id, fact=str(fact), fact_hash=digest,
+                    created_at=created_at + timedelta(microseconds=position)
+                ))
+                added += 1
+        if clear_json:
+            shared_session.session_facts = []
+            shared_session.agent_routing_history = []
+    db.commit()
+    return added
+
+
+def backfill_routing_decisions(db, clear_json: bool) -> int:
+    added = 0
+    for router_memory in db.query(models.PersonaRouterMemory).yield_per(BATCH_SIZE):
+        decisions = router_memory.routing_decisions or []
+        if decisions:
+            existing = {
+                (row.created_at, row.user_input, row.selected_agent_id)
+                for row in db.query(
+                    models.RoutingDecision.created_at,
+                    models.RoutingDecision.user_input,
+                    models.RoutingDecision.selected_agent_id
+                ).filter(models.RoutingDecision.shared_session_id == router_memory.shared_session_id)
+            }
+            fallback = router_memory.created_at or datetime.utcnow()
+            for decision in decisions:
+                created_at = _timestamp(decision.get("timestamp"), fallback)
+                key = (created_at, decision.get("user_input"), decision.get("selected_agent_id"))
+                if key in existing:
+                    continue
+                existing.add(key)
+                db.add(models.RoutingDecision(
+                    shared_session_id=router_memory.shared_session_id,
+                    user_input=decision.get("user_input"),
+                    selected_agent_id=decision.get("selected_agent_id"),
+                    selected_agent_name=decision.get("selected_agent_name"),
+                    confidence=decision.get("confidence"),
+                    available_agents=decision.get("available_agents") or [],
+                    routing_reason=decision.get("routing_reason"),
+                    created_at=created_at
+                ))
+                added += 1
+        if clear_json:
+            router_memory.routing_decisions = []
+            router_memory.task_history = []
+    db.commit()
+    return added
+
+
+def normalize_session_history(clear_json: bool = False):
+    try:
+        create_tables()
+        db = SessionLocal()
+        try:
+            facts = backfill_session_facts(db, clear_json)
+            print(f"✅ Backfilled {facts} session facts")
+            decisions = backfill_routing_decisions(db, clear_json)
+            print(f"✅ Backfilled {decisions} routing decisions")
+            if clear_json:
+                print("✅ Cleared legacy JSON history columns")
+        finally:
+            db.close()
+    except Exception as e:
+        print(f"❌ Error normalizing session history: {e}")
+        return False
+
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move shared session JSON history arrays into child tables")
+    parser.add_argument("--clear-json", action="store_true", help="Empty the legacy JSON columns after backfilling")
+    args = parser.parse_args()
+    print("Normalizing shared session history...")
+    success = normalize_session_history(args.clear_json)
+    if success:
+        print("Database migration completed successfully!")
+    else:
+        print("Database migration failed!")
+        sys.exit(1)
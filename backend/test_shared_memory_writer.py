@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test the shared memory write-behind queue: ordering, flush on close and
+per-turn retries of failed batches
+"""
+
+import sys
+import threading
+sys.path.append('.')
+
+from app.services.shared_memory_writer import SharedMemoryWriteQueue
+
+
+class RecordingWriter:
+    """write_batch stand-in: records committed batches, fails batches holding a bad write"""
+
+    def __init__(self, delay: threading.Event = None):
+        self.batches = []
+        self.delay = delay
+
+    def __call__(self, writes):
+        if self.delay:
+            self.delay.wait(5)
+        if any(write.get("bad") for write in writes):
+            raise ValueError("bad write")
+        self.batches.append(list(writes))
+
+
+def turn(session_id: str, *contents, bad: bool = False):
+    return [{"session_id": session_id, "content": content, "bad": bad} for content in contents]
+
+
+def test_writes_are_applied_in_submit_order():
+    writer = RecordingWriter()
+    queue = SharedMemoryWriteQueue(writer, flush_interval_ms=20)
+    for i in range(20):
+        assert queue.submit(turn("s1", f"user {i}", f"assistant {i}"))
+    assert queue.flush(5)
+
+    written = [write["content"] for batch in writer.batches for write in batch]
+    assert written == [content for i in range(20) for content in (f"user {i}", f"assistant {i}")]
+    # A turn is never split across transactions
+    for batch in writer.batches:
+        assert len(batch) % 2 == 0
+    assert queue.get_stats()["written"] == 40
+    queue.close()
+
+
+def test_readers_wait_for_the_sessions_pending_writes():
+    release = threading.Event()
+    writer = RecordingWriter(delay=release)
+    queue = SharedMemoryWriteQueue(writer, flush_interval_ms=10)
+    queue.submit(turn("s1", "hello"))
+    assert not queue.wait_for_session("s1", timeout=0.1)
+    assert queue.wait_for_session("other", timeout=0.1)
+    release.set()
+    assert queue.wait_for_session("s1", timeout=5)
+    queue.close()
+
+
+def test_close_flushes_queued_writes():
+    release = threading.Event()
+    writer = RecordingWriter(delay=release)
+    queue = SharedMemoryWriteQueue(writer, flush_interval_ms=10)
+    for i in range(5):
+        queue.submit(turn(f"s{i}", f"message {i}"))
+    release.set()
+    queue.close()
+
+    assert sorted(write["content"] for batch in writer.batches for write in batch) == [f"message {i}" for i in range(5)]
+    assert queue.get_stats()["pending"] == 0
+    # Closed queues refuse writes; the caller writes them inline
+    assert not queue.submit(turn("s1", "late"))
+
+
+def test_failed_batch_is_retried_per_turn():
+    release = threading.Event()
+    writer = RecordingWriter(delay=release)
+    queue = SharedMemoryWriteQueue(writer, flush_interval_ms=100)
+    queue.submit(turn("good-1", "a", "b"))
+    queue.submit(turn("broken", "c", bad=True))
+    queue.submit(turn("good-2", "d"))
+    release.set()
+    assert queue.flush(5)
+
+    written = sorted(write["content"] for batch in writer.batches for write in batch)
+    assert written == ["a", "b", "d"]
+    stats = queue.get_stats()
+    assert stats["written"] == 3
+    assert stats["failed"] == 1
+    assert stats["failed_groups"] == 1
+    assert [write["session_id"] for group in queue.failed_groups for write in group] == ["broken"]
+    assert queue.wait_for_session("broken", timeout=0.1)
+    queue.close()
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Request-level tests of the workflow endpoints against a scratch SQLite database
+(the agent's LLM call is replaced, everything else runs as in production)
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append('.')
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/test_workflow_api.db")
+
+from fastapi.testclient import TestClient
+
+from app.db import models
+from app.db.database import engine
+from app.main import app
+from app.services import orchestrator
+from app.services.shared_memory import shared_memory_service
+
+models.Base.metadata.create_all(bind=engine)
+client = TestClient(app)
+
+NODES = [
+    {"id": "agent-1", "type": "agent", "data": {"name": "Helper", "systemPrompt": "You help."}},
+    {"id": "llm-1", "type": "llm", "data": {"provider": "azure", "model": "gpt-4o", "apiBase": "http://127.0.0.1:9"}}
+]
+CONNECTIONS = [{"source": "agent-1", "target": "llm-1"}]
+
+
+def test_workflow_returns_agent_response(monkeypatch):
+    """A successful non-streaming run reports the agent's LLM model and provider"""
+    monkeypatch.setattr(orchestrator, "execute_single_agent",
+                        lambda agent, message, files, prev_output: {"response": f"echo: {message}"})
+    response = client.post("/chat/workflow", json={
+        "nodes": NODES, "connections": CONNECTIONS, "input": "hello", "session_id": "test-workflow-api"
+    })
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["response"] == "echo: hello"
+    assert body["workflow_execution"]["agent_name"] == "Helper"
+    assert body["workflow_execution"]["llm_model"] == "gpt-4o"
+    assert body["workflow_execution"]["provider"] == "azure"
+
+
+def test_stream_rejects_invalid_stream_options():
+    """Invalid stream_options are a client error, not a failed execution"""
+    response = client.post("/chat/workflow/stream", json={
+        "nodes": NODES, "connections": CONNECTIONS, "input": "hello", "session_id": "test-workflow-api",
+        "stream_options": {"format": "xml"}
+    })
+    assert response.status_code == 400, response.text
+
+
+def test_stream_queues_turn_as_one_batch(monkeypatch):
+    """A routed streaming turn queues its user message, handoff and response together"""
+    async def agent_stream(agent, message, files, prev_output):
+        for token in ["Hi ", "there"]:
+            yield token
+    monkeypatch.setattr(orchestrator, "execute_single_agent_stream", agent_stream)
+    submitted = []
+    submit = shared_memory_service.writer.submit
+    monkeypatch.setattr(shared_memory_service.writer, "submit", lambda writes: submitted.append(writes) or submit(writes))
+
+    nodes = NODES + [{"id": "router-1", "type": "persona_router", "data": {"name": "Router", "intents": {"method": "keywords"}}}]
+    connections = CONNECTIONS + [{"source": "router-1", "target": "agent-1"}]
+    response = client.post("/chat/workflow/stream", json={
+        "nodes": nodes, "connections": connections, "input": "hello", "session_id": "test-workflow-api-turn"
+    })
+    assert response.status_code == 200, response.text
+    assert "there" in response.text
+
+    assert [[(w["kind"], w.get("role")) for w in writes] for writes in submitted] == [
+        [("message", "user"), ("handoff", None), ("message", "assistant")]
+    ]
+    assert shared_memory_service.flush(5)
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, "-q"]))
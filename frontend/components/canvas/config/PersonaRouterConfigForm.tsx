@@ -100,6 +100,15 @@ const PersonaRouterConfigForm: React.FC<PersonaRouterConfigFormProps> = ({ data,
     })
   }
 
+  const handleSpeculativeChange = (speculative: boolean) => {
+    updateData({
+      intents: {
+        ...data.intents,
+        speculative: speculative
+      }
+    })
+  }
+
   const handleConfidenceThresholdChange = (threshold: number) => {
     updateData({
       intents: {
@@ -208,10 +217,11 @@ const PersonaRouterConfigForm: React.FC<PersonaRouterConfigFormProps> = ({ data,
               <MenuItem value="keywords">Keywords Only (Manual Triggers)</MenuItem>
               <MenuItem value="llm">System Prompt Analysis (Recommended)</MenuItem>
               <MenuItem value="hybrid">Smart Hybrid</MenuItem>
+              <MenuItem value="vector">Vector Similarity (LLM only when unsure)</MenuItem>
             </Select>
           </FormControl>
           
-          {(data.intents?.method === 'llm' || data.intents?.method === 'hybrid') && (
+          {(data.intents?.method === 'llm' || data.intents?.method === 'hybrid' || data.intents?.method === 'vector') && (
             <Alert severity="info" sx={{ mt: 2 }}>
               <Typography variant="body2">
                 <strong>Smart Routing:</strong> The router will analyze each connected agent's system prompt 
@@ -220,6 +230,18 @@ const PersonaRouterConfigForm: React.FC<PersonaRouterConfigFormProps> = ({ data,
             </Alert>
           )}
 
+          {(data.intents?.method || 'hybrid') === 'hybrid' && (
+            <FormControlLabel
+              control={
+                <Switch
+                  checked={!!data.intents?.speculative}
+                  onChange={(e) => handleSpeculativeChange(e.target.checked)}
+                />
+              }
+              label="Speculative execution (start the trigger-keyword match while the router decides)"
+            />
+          )}
+
           <Box sx={{ px: 2 }}>
             <Typography gutterBottom>
               Confidence Threshold: {data.intents?.confidenceThreshold || 0.7}
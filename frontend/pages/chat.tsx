@@ -216,17 +216,21 @@ function ChatInterface() {
   // Separate state for chat - completely isolated
   const [input, setInput] = useState('')
   const [files, setFiles] = useState<File[]>([])
-  const [conversationHistory, setConversationHistory] = useState<Array<{id: string, type: 'user' | 'assistant', content: string}>>([])
+  const [conversationHistory, setConversationHistory] = useState<Array<{id: string, type: 'user' | 'assistant', content: string, idempotencyKey?: string}>>([])
   const [isExecuting, setIsExecuting] = useState(false)
   const [currentStatus, setCurrentStatus] = useState<string | null>(null)
   
   const messagesEndRef = useRef<HTMLDivElement>(null)
   const fileInputRef = useRef<HTMLInputElement>(null)
+  // Turn whose request has not succeeded yet: resending it reuses its key and body
+  const pendingTurnRef = useRef<{agentId: string, text: string, idempotencyKey: string, body: string} | null>(null)
+  // Set synchronously, so a double-click cannot start a second request before isExecuting renders
+  const sendingRef = useRef(false)
   
   const apiBase = process.env.NEXT_PUBLIC_API_BASE || ''
 
   // Message management functions (memoized to prevent re-renders)
-  const addMessage = useCallback((message: {type: 'user' | 'assistant', content: string}) => {
+  const addMessage = useCallback((message: {type: 'user' | 'assistant', content: string, idempotencyKey?: string}) => {
     const messageId = `msg_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`
     const messageWithId = { ...message, id: messageId }
     setConversationHistory(prev => [...prev, messageWithId])
@@ -347,29 +351,55 @@ function ChatInterface() {
 
   // Send message - with isolated state management
   async function sendMessage() {
-    if (!input.trim() || !selectedAgent || isExecuting) return
+    if (!input.trim() || !selectedAgent || isExecuting || sendingRef.current) return
+    sendingRef.current = true
     
     const messageText = input.trim()
     setInput('')
     
-    // Upload files if any
-    let fileIds: string[] = []
-    if (files.length > 0) {
-      try {
-        fileIds = await uploadFiles()
-        setFiles([])
-        if (fileInputRef.current) fileInputRef.current.value = ''
-      } catch (err) {
-        console.error('File upload failed:', err)
+    // Resending a failed turn repeats the same request, so the server replays or
+    // attaches to its execution instead of running it again
+    let turn = pendingTurnRef.current
+    if (!turn || turn.agentId !== selectedAgent.id || turn.text !== messageText || files.length > 0) {
+      // Upload files if any
+      let fileIds: string[] = []
+      if (files.length > 0) {
+        try {
+          fileIds = await uploadFiles()
+          setFiles([])
+          if (fileInputRef.current) fileInputRef.current.value = ''
+        } catch (err) {
+          console.error('File upload failed:', err)
+        }
       }
+      
+      const idempotencyKey = `${selectedAgent.id}_${crypto.randomUUID()}`
+      turn = {
+        agentId: selectedAgent.id,
+        text: messageText,
+        idempotencyKey,
+        body: JSON.stringify({
+          nodes: selectedAgent.nodes,
+          connections: selectedAgent.connections || [],
+          input: messageText,
+          files: fileIds,
+          session_id: `chat_${selectedAgent.id}_${Date.now()}`,
+          conversation_history: conversationHistory.map(msg => ({
+            role: msg.type === 'user' ? 'user' : 'assistant',
+            content: msg.content
+          }))
+        })
+      }
+      pendingTurnRef.current = turn
+      
+      // Add user message using isolated state
+      addMessage({
+        type: 'user',
+        content: messageText + (fileIds.length > 0 ? ` [Attached ${fileIds.length} file(s)]` : ''),
+        idempotencyKey
+      })
     }
     
-    // Add user message using isolated state
-    addMessage({
-      type: 'user',
-      content: messageText + (fileIds.length > 0 ? ` [Attached ${fileIds.length} file(s)]` : '')
-    })
-    
     // Start execution
     setIsExecuting(true)
     
@@ -382,20 +412,11 @@ function ChatInterface() {
       
       if (hasStreamingAgent) {
         // Use streaming endpoint - EXACTLY like agent-builder
+        // One key per turn: a resubmitted turn attaches to the running execution
         const response = await fetch(`${apiBase}/chat/workflow/stream`, {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            nodes: selectedAgent.nodes,
-            connections: selectedAgent.connections || [],
-            input: messageText,
-            files: fileIds,
-            session_id: `chat_${selectedAgent.id}_${Date.now()}`,
-            conversation_history: conversationHistory.map(msg => ({
-              role: msg.type === 'user' ? 'user' : 'assistant',
-              content: msg.content
-            }))
-          })
+          headers: { 'Content-Type': 'application/json', 'Idempotency-Key': turn.idempotencyKey },
+          body: turn.body
         })
         
         if (!response.ok) throw new Error('Streaming request failed')
@@ -458,18 +479,8 @@ function ChatInterface() {
         // Handle non-streaming - EXACTLY like agent-builder
         const response = await fetch(`${apiBase}/chat/workflow`, {
           method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({
-            nodes: selectedAgent.nodes,
-            connections: selectedAgent.connections || [],
-            input: messageText,
-            files: fileIds,
-            session_id: `chat_${selectedAgent.id}_${Date.now()}`,
-            conversation_history: conversationHistory.map(msg => ({
-              role: msg.type === 'user' ? 'user' : 'assistant',
-              content: msg.content
-            }))
-          })
+          headers: { 'Content-Type': 'application/json', 'Idempotency-Key': turn.idempotencyKey },
+          body: turn.body
         })
         
         if (!response.ok) throw new Error('Request failed')
@@ -482,15 +493,18 @@ function ChatInterface() {
           content: result.response || result.content || 'No response'
         })
       }
+      pendingTurnRef.current = null
     } catch (error) {
       console.error('Error:', error)
       
-      // Add error message
+      // Add error message; the turn stays pending and its text is restored for a retry
       addMessage({
         type: 'assistant',
-        content: 'Sorry, an error occurred. Please try again.'
+        content: 'Sorry, an error occurred. Send the message again to retry.'
       })
+      setInput(messageText)
     } finally {
+      sendingRef.current = false
       setIsExecuting(false)
       setCurrentStatus(null) // Clear status when execution finishes
     }